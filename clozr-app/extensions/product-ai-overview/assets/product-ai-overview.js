@@ -65,7 +65,7 @@ document.addEventListener("DOMContentLoaded", async () => {
     // 2️⃣ Fetch product summary from CLOZR Engine
     const engineUrl = `${CLOZR_ENGINE_URL}/shopify/products/${encodeURIComponent(
       productId
-    )}/summary`;
+    )}/summary?shop=${encodeURIComponent(shop)}`;
 
     let aiRes;
     try {
@@ -6,43 +6,56 @@ import requests
 from pathlib import Path
 from fastapi import APIRouter, Request, HTTPException, Query
 from server.session_store import get_token
+from server.shopify_catalog import ShopifyFetchError, iter_product_pages, push_page_to_engine
 
 router = APIRouter()
 
-API_VERSION = "2024-10"  # safe stable version
-
 # Directory to store exported product JSON files
 DATA_DIR = Path(__file__).parent.parent / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
 
-def save_products_to_json(shop: str, products_data: dict):
-    """
-    Save products data to a JSON file for local import into clozr-engine.
-    File format matches what clozr-engine expects: {"products": [...]}
-    """
+def export_path(shop: str) -> Path:
     # Sanitize shop domain for filename (replace dots and special chars)
     safe_shop_name = shop.replace(".", "_").replace("-", "_")
-    filename = f"products_{safe_shop_name}.json"
-    filepath = DATA_DIR / filename
-
-    # Ensure the data is in the correct format
-    export_data = {
-        "products": products_data.get("products", []),
-        "shop": shop,
-        "exported_at": products_data.get("exported_at")  # Will be added if not present
-    }
-
-    # Add timestamp if not present
-    if "exported_at" not in export_data:
-        from datetime import datetime
-        export_data["exported_at"] = datetime.now().isoformat()
+    return DATA_DIR / f"products_{safe_shop_name}.json"
+
+
+class ProductExportWriter:
+    """
+    Writes the export file page by page for local import into clozr-engine.
+    File format matches what clozr-engine expects: {"products": [...], ...}
+    with "products" first so the engine's streaming importer can read it
+    without loading the whole file.
+    """
 
-    # Write to file
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(export_data, f, indent=2, ensure_ascii=False)
+    def __init__(self, shop: str):
+        self.shop = shop
+        self.filepath = export_path(shop)
+        self._tmp = self.filepath.with_suffix(".json.tmp")
+        self._f = open(self._tmp, "w", encoding="utf-8")
+        self._f.write('{"products": [')
+        self.count = 0
+
+    def write_page(self, products: list):
+        for product in products:
+            if self.count:
+                self._f.write(",")
+            self._f.write("\n")
+            json.dump(product, self._f, ensure_ascii=False)
+            self.count += 1
+
+    def close(self):
+        from datetime import datetime
+        self._f.write("\n],\n")
+        self._f.write(f'"shop": {json.dumps(self.shop)},\n')
+        self._f.write(f'"exported_at": {json.dumps(datetime.now().isoformat())}}}\n')
+        self._f.close()
+        self._tmp.replace(self.filepath)
 
-    return filepath
+    def abort(self):
+        self._f.close()
+        self._tmp.unlink(missing_ok=True)
 
 
 @router.get("/products")
@@ -51,11 +64,12 @@ def get_products(
     mode: str = Query("summary", description="summary (default) or full"),
 ):
     """
-    Fetch products for a shop.
+    Fetch every product for a shop (all pages, not just the first 50).
     - mode=summary (default): returns just a count (used by frontend)
     - mode=full: returns the full Shopify products JSON
     
-    Products are automatically saved to a JSON file in server/data/ for local import into clozr-engine.
+    Products are written page by page to a JSON file in server/data/ for local import into clozr-engine,
+    and pushed to the engine's bulk ingest as they arrive when CLOZR_ENGINE_URL is set.
     """
     shop = request.query_params.get("shop")
 
@@ -75,54 +89,50 @@ def get_products(
     
     print(f"✅ Token found for shop: {shop}")
 
-    # Build Admin API URL
-    url = f"https://{shop}/admin/api/{API_VERSION}/products.json"
-
-    headers = {
-        "X-Shopify-Access-Token": token,
-        "Content-Type": "application/json"
-    }
-
-    try:
-        response = requests.get(url, headers=headers, timeout=30)
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Network error calling Shopify API: {str(e)}",
-        )
-
-    if response.status_code != 200:
-        error_detail = f"Shopify API request failed: {response.status_code}"
-        try:
-            error_body = response.json()
-            error_detail += f" - {error_body}"
-        except:
-            error_detail += f" - {response.text[:500]}"  # Limit error text length
-        raise HTTPException(
-            status_code=500,
-            detail=error_detail,
-        )
-
+    writer = None
     try:
-        products_data = response.json()
-    except json.JSONDecodeError as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Invalid JSON response from Shopify API: {str(e)}",
-        )
+        writer = ProductExportWriter(shop)
+    except OSError as e:
+        print(f"⚠️  Warning: Failed to open products JSON file: {e}")
+        # Don't fail the request if file save fails
 
-    # Save products to JSON file for clozr-engine import
+    all_products = [] if mode == "full" else None
+    count = 0
     try:
-        filepath = save_products_to_json(shop, products_data)
-        print(f"✅ Saved {len(products_data.get('products', []))} products to {filepath}")
+        for page in iter_product_pages(shop, token):
+            count += len(page)
+            if writer:
+                try:
+                    writer.write_page(page)
+                except OSError as e:
+                    print(f"⚠️  Warning: Failed to write products JSON file: {e}")
+                    writer.abort()
+                    writer = None
+            if all_products is not None:
+                all_products.extend(page)
+            try:
+                push_page_to_engine(shop, page)
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️  Warning: Failed to push page to clozr-engine: {e}")
     except Exception as e:
-        print(f"⚠️  Warning: Failed to save products to JSON file: {e}")
-        # Don't fail the request if file save fails
+        # never leave a half-written .json.tmp (or its open handle) behind
+        if writer:
+            writer.abort()
+        if isinstance(e, ShopifyFetchError):
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        raise
+
+    if writer:
+        try:
+            writer.close()
+            print(f"✅ Saved {count} products to {writer.filepath}")
+        except OSError as e:
+            print(f"⚠️  Warning: Failed to save products JSON file: {e}")
+            writer.abort()
 
     # Full JSON for export/sharing
     if mode == "full":
-        return products_data
+        return {"products": all_products}
 
     # Default: just a count (for dashboard)
-    products_list = products_data.get("products", [])
-    return {"count": len(products_list)}
+    return {"count": count}
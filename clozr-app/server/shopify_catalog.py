@@ -0,0 +1,118 @@
+# server/shopify_catalog.py
+"""
+Paginated Shopify catalog fetch for the admin app.
+
+products.json only returns one page per call, so this follows the
+`Link: rel="next"` page_info cursors, watches X-Shopify-Shop-Api-Call-Limit
+to stay under the leaky-bucket limit, retries 429/5xx with backoff, and
+reuses one pooled HTTP session. Pages can be forwarded to the CLOZR engine's
+bulk ingest endpoint as they arrive (set CLOZR_ENGINE_URL).
+
+The admin server is deployed without clozr-engine, so this mirrors the
+throttle/retry rules of the engine's app/shopify_client.py rather than
+importing them; keep the two in step.
+"""
+
+import os
+import time
+from typing import Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_VERSION = "2024-10"
+PAGE_SIZE = 250
+CALL_LIMIT_HEADER = "X-Shopify-Shop-Api-Call-Limit"
+MAX_RETRIES = 5
+
+CLOZR_ENGINE_URL = os.getenv("CLOZR_ENGINE_URL")
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+
+class ShopifyFetchError(Exception):
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _throttle(response: requests.Response, sleep=time.sleep) -> None:
+    """
+    Sleep once the call bucket is 80% full, long enough for it to leak back
+    under that line (REST buckets leak bucket/20 calls per second).
+    """
+    value = response.headers.get(CALL_LIMIT_HEADER, "")
+    try:
+        used, bucket = (int(v) for v in value.split("/", 1))
+    except ValueError:
+        return
+    threshold = bucket * 0.8
+    if used >= threshold:
+        sleep((used - threshold + 1) / (bucket / 20))
+
+
+def _get(url: str, token: str, params: Optional[dict], sleep=time.sleep) -> requests.Response:
+    headers = {"X-Shopify-Access-Token": token, "Content-Type": "application/json"}
+    for attempt in range(MAX_RETRIES + 1):
+        backoff = min(2 ** attempt * 0.5, 30)
+        try:
+            response = _session.get(url, headers=headers, params=params, timeout=30)
+        except requests.exceptions.RequestException as e:
+            if attempt == MAX_RETRIES:
+                raise ShopifyFetchError(f"Network error calling Shopify API: {str(e)}")
+            sleep(backoff)
+            continue
+
+        if response.status_code == 200:
+            _throttle(response, sleep)
+            return response
+
+        if (response.status_code == 429 or response.status_code >= 500) and attempt < MAX_RETRIES:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                sleep(float(retry_after) if retry_after else backoff)
+            except ValueError:
+                sleep(backoff)
+            continue
+
+        raise ShopifyFetchError(
+            f"Shopify API request failed: {response.status_code} - {response.text[:500]}"
+        )
+
+    raise ShopifyFetchError("Shopify API request failed after retries")
+
+
+def iter_product_pages(shop: str, token: str, page_size: int = PAGE_SIZE, sleep=time.sleep) -> Iterator[List[dict]]:
+    """
+    Yields every page of products for the shop, following page_info cursors.
+    `sleep` is used for throttling and retry waits.
+    """
+    url: Optional[str] = f"https://{shop}/admin/api/{API_VERSION}/products.json"
+    params: Optional[dict] = {"limit": page_size}
+    while url:
+        response = _get(url, token, params, sleep)
+        try:
+            products = response.json().get("products", [])
+        except ValueError as e:
+            raise ShopifyFetchError(f"Invalid JSON response from Shopify API: {str(e)}")
+        yield products
+        url = response.links.get("next", {}).get("url")
+        params = None  # next link already carries limit + page_info
+
+
+def push_page_to_engine(shop: str, products: List[dict]) -> None:
+    """
+    Send one page to the engine's idempotent bulk ingest (no-op when
+    CLOZR_ENGINE_URL is not configured).
+    """
+    if not CLOZR_ENGINE_URL or not products:
+        return
+    payload = {
+        "merchant_domain": shop,
+        "products": [{"shop_product_id": str(p["id"]), "raw_json": p} for p in products],
+    }
+    response = _session.post(f"{CLOZR_ENGINE_URL.rstrip('/')}/products/ingest/bulk", json=payload, timeout=120)
+    response.raise_for_status()
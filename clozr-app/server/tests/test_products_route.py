@@ -0,0 +1,54 @@
+# server/tests/test_products_route.py
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# server.routes imports the OAuth module, which needs these at import time
+for name in ("SHOPIFY_API_KEY", "SHOPIFY_API_SECRET", "HOST"):
+    os.environ.setdefault(name, "test")
+
+from server.routes import products  # noqa: E402
+from server.session_store import delete_token, save_token  # noqa: E402
+from server.shopify_catalog import ShopifyFetchError  # noqa: E402
+
+SHOP = "test-shop.myshopify.com"
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(products, "DATA_DIR", tmp_path)
+    save_token(SHOP, "token")
+    app = FastAPI()
+    app.include_router(products.router)
+    try:
+        yield TestClient(app, raise_server_exceptions=False)
+    finally:
+        delete_token(SHOP)
+
+
+def _pages(*pages):
+    def iter_product_pages(shop, token):
+        for page in pages:
+            if isinstance(page, Exception):
+                raise page
+            yield page
+
+    return iter_product_pages
+
+
+def test_export_is_written_on_success(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(products, "iter_product_pages", _pages([{"id": 1}], [{"id": 2}]))
+    assert client.get("/products", params={"shop": SHOP}).json() == {"count": 2}
+    assert [p.name for p in tmp_path.iterdir()] == [products.export_path(SHOP).name]
+
+
+@pytest.mark.parametrize(
+    "error, status",
+    [(ShopifyFetchError("throttled", status_code=429), 429), (KeyError("products"), 500)],
+)
+def test_failed_fetch_leaves_no_export_behind(client, monkeypatch, tmp_path, error, status):
+    monkeypatch.setattr(products, "iter_product_pages", _pages([{"id": 1}], error))
+    assert client.get("/products", params={"shop": SHOP}).status_code == status
+    assert list(tmp_path.iterdir()) == []
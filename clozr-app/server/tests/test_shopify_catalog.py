@@ -0,0 +1,97 @@
+# server/tests/test_shopify_catalog.py
+import pytest
+import requests
+
+from server import shopify_catalog
+from server.shopify_catalog import CALL_LIMIT_HEADER, ShopifyFetchError, _get, _throttle, iter_product_pages
+
+
+class FakeSession:
+    """
+    Replays scripted responses (or exceptions) in order.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _response(status: int, headers: dict | None = None, body: bytes = b"{}") -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = body
+    return response
+
+
+@pytest.fixture
+def sleeps():
+    return []
+
+
+def _fetch(monkeypatch, sleeps, *responses):
+    session = FakeSession(*responses)
+    monkeypatch.setattr(shopify_catalog, "_session", session)
+    return _get("https://shop.example/products.json", "token", None, sleep=sleeps.append), session
+
+
+def test_throttle_sleeps_only_near_the_call_limit(sleeps):
+    _throttle(_response(200, {CALL_LIMIT_HEADER: "10/40"}), sleeps.append)
+    _throttle(_response(200, {CALL_LIMIT_HEADER: "garbage"}), sleeps.append)
+    _throttle(_response(200), sleeps.append)
+    assert sleeps == []
+
+    # 80% of 40 is 32; 36 used -> 5 calls over, leaking 2 per second
+    _throttle(_response(200, {CALL_LIMIT_HEADER: "36/40"}), sleeps.append)
+    assert sleeps == [2.5]
+
+
+def test_429_waits_for_retry_after(monkeypatch, sleeps):
+    response, session = _fetch(
+        monkeypatch,
+        sleeps,
+        _response(429, {"Retry-After": "2.0"}),
+        _response(429, {"Retry-After": "soon"}),  # unparseable: exponential backoff
+        _response(200, {CALL_LIMIT_HEADER: "39/40"}),
+    )
+    assert response.status_code == 200 and session.calls == 3
+    assert sleeps == [2.0, 1.0, 4.0]  # Retry-After, backoff, then the call-limit throttle
+
+
+def test_server_and_network_errors_are_retried_then_raised(monkeypatch, sleeps):
+    response, _ = _fetch(
+        monkeypatch, sleeps, requests.exceptions.ConnectionError("reset"), _response(503), _response(200)
+    )
+    assert response.status_code == 200 and sleeps == [0.5, 1.0]
+
+    failures = [_response(500)] * (shopify_catalog.MAX_RETRIES + 1)
+    with pytest.raises(ShopifyFetchError, match="500"):
+        _fetch(monkeypatch, [], *failures)
+
+
+def test_client_errors_are_not_retried(monkeypatch, sleeps):
+    with pytest.raises(ShopifyFetchError, match="401"):
+        _fetch(monkeypatch, sleeps, _response(401, body=b"bad token"))
+    assert sleeps == []
+
+
+def test_page_walk_retries_and_throttles_with_the_given_sleep(monkeypatch, sleeps):
+    next_page = '<https://shop.example/admin/api/2024-10/products.json?limit=250&page_info=abc>; rel="next"'
+    session = FakeSession(
+        _response(429, {"Retry-After": "3"}),
+        _response(200, {CALL_LIMIT_HEADER: "36/40", "Link": next_page}, b'{"products": [{"id": 1}]}'),
+        _response(200, {CALL_LIMIT_HEADER: "1/40"}, b'{"products": [{"id": 2}]}'),
+    )
+    monkeypatch.setattr(shopify_catalog, "_session", session)
+
+    pages = list(iter_product_pages("shop.example", "token", sleep=sleeps.append))
+    assert pages == [[{"id": 1}], [{"id": 2}]]
+    assert session.calls == 3
+    assert sleeps == [3.0, 2.5]  # Retry-After, then the call-limit throttle
@@ -1,77 +1,326 @@
 # app/attributes.py
 
-# from typing import Dict, Any
-
-from typing import List, Optional
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
 from typing import Dict, Any
 
-# import re
+# Keyword rules, in priority order (the first category with a match wins).
+# Keywords match whole words, plurals included ("jean" ~ "jeans"); a
+# trailing "*" matches any word starting with it ("jog*" ~ "joggers").
+CATEGORY_RULES = (
+    ("jacket", ("puffer", "parka", "jacket", "shell", "coat")),
+    ("hoodie", ("hoodie", "hooded", "fleece", "pullover", "crewneck", "sweatshirt")),
+    ("t-shirt", ("t-shirt", "t shirt", "tee", "graphic tee")),
+    ("shirt", ("long sleeve", "flannel", "oxford", "button down", "shirt")),
+    ("pants", ("pants", "trouser", "jog*", "chino", "jean")),
+    ("sweater", ("sweater", "cardigan", "knit*")),
+)
 
-def infer_category(title: str, product_type: Optional[str], tags: List[str]) -> Optional[str]:
-    text = " ".join(
-        [title or "", product_type or "", " ".join(tags or [])]
-    ).lower()
+PRIMARY_USE_RULES = (
+    ("winter", ("winter", "snow*", "cold", "fleece", "parka", "puffer")),
+    ("campus", ("campus", "class", "classroom", "college", "everyday", "daily")),
+    ("training", ("running", "jog*", "training", "gym")),
+)
+
+WARMTH_BY_USE = {"winter": "high"}
 
-    # Jackets / outerwear
-    if any(k in text for k in ["puffer", "parka", "jacket", "shell", "coat"]):
-        return "jacket"
+# Most specific fabric first: "cashmere wool blend" is cashmere.
+MATERIAL_RULES = (
+    ("cashmere", ("cashmere",)),
+    ("merino wool", ("merino",)),
+    ("wool", ("wool", "lambswool")),
+    ("down", ("goose down", "duck down", "down fill*", "down insulat*")),
+    ("leather", ("leather", "suede")),
+    ("denim", ("denim",)),
+    ("linen", ("linen",)),
+    ("silk", ("silk",)),
+    ("fleece", ("fleece", "sherpa")),
+    ("nylon", ("nylon", "ripstop")),
+    ("polyester", ("polyester",)),
+    ("organic cotton", ("organic cotton",)),
+    ("cotton", ("cotton",)),
+)
 
-    # Hoodies / sweatshirts
-    if any(k in text for k in ["hoodie", "hooded", "fleece", "pullover", "crewneck", "sweatshirt"]):
-        return "hoodie"
+STYLE_RULES = (
+    ("graphic", ("graphic", "graphic tee", "print", "printed", "logo")),
+    ("athletic", ("athletic", "performance", "activewear", "sport", "sporty")),
+    ("outdoor", ("outdoor", "hiking", "trail", "waterproof")),
+    ("vintage", ("vintage", "retro", "washed")),
+    ("streetwear", ("streetwear",)),
+    ("classic", ("classic", "heritage", "timeless")),
+    ("minimal", ("minimal*", "essential*", "basic*")),
+)
 
-    # T-shirts
-    if any(k in text for k in ["t-shirt", "t shirt", "tee", "graphic tee"]):
-        return "t-shirt"
+FIT_RULES = (
+    ("oversized", ("oversized", "oversize", "boxy")),
+    ("relaxed", ("relaxed", "loose", "baggy")),
+    ("slim", ("slim", "skinny", "fitted", "tailored")),
+    ("cropped", ("cropped",)),
+    ("regular", ("regular fit", "standard fit")),
+)
 
-    # Long sleeves / shirts
-    if any(k in text for k in ["long sleeve", "flannel", "oxford", "button down", "shirt"]):
-        return "shirt"
+# option names (lower-cased) read as the product's fits / sizes
+FIT_OPTION_NAMES = {"fit", "cut"}
+SIZE_OPTION_NAMES = {"size", "sizes"}
+_PLACEHOLDER_OPTION_VALUES = {"", "default title"}
 
-    # Pants
-    if any(k in text for k in ["pants", "trouser", "jogger", "chino", "jean"]):
-        return "pants"
+# price_band labels, cheapest first; thresholds come from the merchant's own
+# price distribution (see app/services/price_band_services.py)
+PRICE_BANDS = ("$", "$$", "$$$")
 
-    # Sweaters
-    if any(k in text for k in ["sweater", "cardigan", "knit"]):
-        return "sweater"
 
-    return None
+def _trie_pattern(keywords: Dict[str, str]) -> str:
+    """
+    Regex trie over {keyword: pattern that must follow it}: "c(?:oat|old)"
+    rather than "coat|cold", so a position is rejected after a character
+    test or two. The result is a bare top-level alternation whose branches
+    all start with a literal, which lets the re engine skip ahead to
+    candidate first letters; the word boundary before a keyword is checked
+    right after its first letter for the same reason.
+    """
+    trie: Dict[str, dict] = {}
+    for keyword, suffix in keywords.items():
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = suffix
+
+    def branches(node: dict, first: bool = False) -> List[str]:
+        alternatives = [
+            re.escape(char) + (r"(?<!\w.)" if first else "") + build(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if "" in node:
+            alternatives.append(node[""])  # after the longer keywords, e.g. "class" after "classroom"
+        return alternatives
 
+    def build(node: dict) -> str:
+        alternatives = branches(node)
+        return alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
 
-def extract_product_attributes(raw: dict) -> dict:
-    title = raw.get("title", "")
-    product_type = raw.get("product_type")
-    tags_raw = raw.get("tags") or ""
-    tags = [t.strip() for t in tags_raw.split(",") if t.strip()]
+    return "|".join(branches(trie, first=True))
 
-    category = infer_category(title, product_type, tags)
 
-    primary_use: List[str] = []
-    text = " ".join([title or "", raw.get("body_html") or "", tags_raw]).lower()
+# Joins a batch's texts into one string for a single scan; the pattern
+# matches it too, which is how matches are attributed to items.
+_SEPARATOR = "\x00"
+# HTML tags are blanked out before scanning, so attribute names like
+# class="..." never count as words; a tag never spans two items.
+_TAG_RE = re.compile(r"<[^<>\x00]*>")
+
+
+class KeywordMatcher:
+    """
+    All rules compiled into one regex, so a single scan of a text (or of a
+    whole batch of texts) finds every rule that matches instead of one
+    substring scan per keyword.
+    """
+
+    def __init__(self, rules: Dict[str, tuple]) -> None:
+        self._labels = {dimension: [label for label, _ in dimension_rules] for dimension, dimension_rules in rules.items()}
+        # keyword -> [(dimension, rule bit), ...]; "fleece" is both a hoodie and winter wear
+        self._targets: Dict[str, List[tuple]] = {}
+        prefixes = set()
+        for dimension, dimension_rules in rules.items():
+            for rank, (_, keywords) in enumerate(dimension_rules):
+                for keyword in keywords:
+                    if keyword.endswith("*"):
+                        keyword = keyword[:-1]
+                        prefixes.add(keyword)
+                    self._targets.setdefault(keyword, []).append((dimension, 1 << rank))
 
-    if any(k in text for k in ["winter", "snow", "cold", "fleece", "parka", "puffer"]):
-        primary_use.append("winter")
-    if any(k in text for k in ["campus", "class", "college", "everyday", "daily"]):
-        primary_use.append("campus")
-    if any(k in text for k in ["running", "jog", "training", "gym"]):
-        primary_use.append("training")
+        self._prefixes = sorted(prefixes, key=len, reverse=True)
+        # matched text -> targets, plurals included; prefix matches are resolved in _lookup()
+        self._forms = {
+            form: targets
+            for k, targets in self._targets.items()
+            if k not in prefixes
+            for form in (k, k + "s", k + "es")
+        }
+        self.pattern = re.compile(
+            _SEPARATOR + "|" + _trie_pattern({k: r"\w*" if k in prefixes else r"(?:e?s)?\b" for k in self._targets})
+        )
+        self._label_cache: Dict[tuple, tuple] = {}
 
+    def _lookup(self, word: str) -> List[tuple]:
+        targets = self._forms.get(word)
+        if targets is None:
+            targets = self._targets[next(p for p in self._prefixes if word.startswith(p))]
+        return targets
+
+    def _labels_for(self, dimension: str, mask: int) -> tuple:
+        key = (dimension, mask)
+        labels = self._label_cache.get(key)
+        if labels is None:
+            labels = tuple(label for rank, label in enumerate(self._labels[dimension]) if mask >> rank & 1)
+            self._label_cache[key] = labels
+        return labels
+
+    def match_columns(self, fields: List[tuple], size: int) -> Dict[str, List[tuple]]:
+        """
+        Column-wise match over `size` items. fields are (texts, dimensions)
+        with one text per item; a field's matches only count for its
+        dimensions. Returns {dimension: [labels in rule order, per item]}.
+        Each field is one lower() and one regex scan for the whole batch.
+        """
+        masks = {dimension: [0] * size for dimension in self._labels}
+        for texts, dimensions in fields:
+            joined = _SEPARATOR.join(texts)
+            if joined.count(_SEPARATOR) != size - 1:
+                # a text contains the separator itself
+                joined = _SEPARATOR.join(text.replace(_SEPARATOR, " ") for text in texts)
+            if "<" in joined:
+                joined = _TAG_RE.sub(" ", joined)
+            i = 0
+            for word in self.pattern.findall(joined.lower()):
+                if word == _SEPARATOR:
+                    i += 1
+                    continue
+                for dimension, bit in self._lookup(word):
+                    if dimension in dimensions:
+                        masks[dimension][i] |= bit
+        return {dimension: [self._labels_for(dimension, m) for m in column] for dimension, column in masks.items()}
+
+    def match(self, segments: List[tuple]) -> Dict[str, List[str]]:
+        """
+        {dimension: [label, ...] in rule order} for (text, dimensions)
+        segments of a single item.
+        """
+        columns = self.match_columns([([text], dimensions) for text, dimensions in segments], 1)
+        return {dimension: list(column[0]) for dimension, column in columns.items()}
+
+
+_matcher = KeywordMatcher(
+    {
+        "category": CATEGORY_RULES,
+        "primary_use": PRIMARY_USE_RULES,
+        "style": STYLE_RULES,
+        "fit": FIT_RULES,
+        # the title/tags name the main fabric; the body is only a fallback
+        "material": MATERIAL_RULES,
+        "body_material": MATERIAL_RULES,
+    }
+)
+
+
+def min_variant_price(raw: dict) -> Optional[float]:
+    """
+    The product's "from" price: lowest parseable variant price.
+    """
+    prices = []
+    for variant in raw.get("variants") or []:
+        try:
+            prices.append(float(variant.get("price")))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return min(prices) if prices else None
+
+
+def price_band(price: Optional[float], thresholds: Optional[Tuple[float, float]]) -> Optional[str]:
+    """
+    PRICE_BANDS label for price given the merchant's (low_max, high_min)
+    percentile thresholds.
+    """
+    if price is None or thresholds is None:
+        return None
+    low_max, high_min = thresholds
+    if price <= low_max:
+        return PRICE_BANDS[0]
+    if price >= high_min:
+        return PRICE_BANDS[2]
+    return PRICE_BANDS[1]
+
+
+def _option_values(raw: dict, names: set) -> List[str]:
+    for option in raw.get("options") or []:
+        if isinstance(option, dict) and str(option.get("name") or "").strip().lower() in names:
+            return [
+                str(v).strip()
+                for v in option.get("values") or []
+                if str(v).strip().lower() not in _PLACEHOLDER_OPTION_VALUES
+            ]
+    return []
+
+
+def infer_category(title: str, product_type: Optional[str], tags: List[str]) -> Optional[str]:
+    text = " ".join([title or "", product_type or "", " ".join(tags or [])])
+    categories = _matcher.match([(text, ("category",))])["category"]
+    return categories[0] if categories else None
+
+
+def _first(labels: tuple) -> Optional[str]:
+    return labels[0] if labels else None
+
+
+def extract_attributes_batch(
+    raws: Iterable[dict],
+    price_bands: Optional[Sequence[Optional[Tuple[float, float]]]] = None,
+) -> Dict[str, list]:
+    """
+    Attributes of many raw Shopify products, column-wise:
+    {"category": [...], "primary_use": [...], ...}, one entry per product
+    in input order. Each text field of the whole batch is scanned once, so
+    per-product cost is a few list appends rather than a full extraction.
+
+    price_bands holds each product's merchant (low_max, high_min) price
+    thresholds (None: no price_band); fit and sizes come from the Shopify
+    options, falling back to fit words in the text.
+    """
+    raws = [raw or {} for raw in raws]
+    size = len(raws)
+    found = _matcher.match_columns(
+        [
+            (
+                [f"{raw.get('title') or ''} {raw.get('tags') or ''}" for raw in raws],
+                ("category", "primary_use", "style", "fit", "material"),
+            ),
+            ([raw.get("product_type") or "" for raw in raws], ("category", "style")),
+            ([raw.get("body_html") or "" for raw in raws], ("primary_use", "fit", "body_material")),
+        ],
+        size,
+    )
+    uses = found["primary_use"]
+    warmth = {labels: next((WARMTH_BY_USE[u] for u in labels if u in WARMTH_BY_USE), None) for labels in set(uses)}
+
+    fits, extra_metadata = [], []
+    for raw, fit_words in zip(raws, found["fit"]):
+        option_fits = _option_values(raw, FIT_OPTION_NAMES)
+        sizes = _option_values(raw, SIZE_OPTION_NAMES)
+        metadata = {}
+        if sizes:
+            metadata["sizes"] = sizes
+        if len(option_fits) > 1:
+            # sold in several fits; none of them is "the" fit
+            metadata["fits"] = option_fits
+            fits.append(None)
+        else:
+            fits.append(option_fits[0].lower() if option_fits else _first(fit_words))
+        extra_metadata.append(metadata)
+
+    thresholds = price_bands if price_bands is not None else [None] * size
     return {
-        "category": category,
-        "style": None,
-        "warmth_level": "high" if "winter" in primary_use else None,
-        "fit": None,
-        "material_main": None,
-        "price_band": None,
-        "primary_use": primary_use or None,
-        "extra_metadata": {},
+        "category": [_first(labels) for labels in found["category"]],
+        "style": [_first(labels) for labels in found["style"]],
+        "warmth_level": [warmth[labels] for labels in uses],
+        "fit": fits,
+        "material_main": [
+            _first(title_labels) or _first(body_labels)
+            for title_labels, body_labels in zip(found["material"], found["body_material"])
+        ],
+        "price_band": [price_band(min_variant_price(raw), t) for raw, t in zip(raws, thresholds)],
+        "primary_use": [list(labels) or None for labels in uses],
+        "extra_metadata": extra_metadata,
     }
 
 
+def extract_product_attributes(raw: dict, price_bands: Optional[Tuple[float, float]] = None) -> dict:
+    return {field: values[0] for field, values in extract_attributes_batch([raw], [price_bands]).items()}
+
+
 def extract_attributes_from_raw(raw_json: Dict[str, Any]) -> Dict[str, Any]:
     """
     Backwards-compatible wrapper used by the enrichment pipeline.
     Internally delegates to extract_product_attributes.
     """
-    return extract_product_attributes(raw_json)
\ No newline at end of file
+    return extract_product_attributes(raw_json)
@@ -1,9 +1,11 @@
 from app.db import engine, Base
+from app.migrations import run_migrations
 import app.models
 
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
 
 
 if __name__ == "__main__":
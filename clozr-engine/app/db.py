@@ -1,15 +1,63 @@
 # app/db.py
+import asyncio
+
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from app.config import settings
 
 class Base(DeclarativeBase):
     pass
 
-engine = create_engine(settings.DATABASE_URL, echo=False, future=True)
+# async driver per sync driver, for ASYNC_DATABASE_URL's default
+_ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def engine_options(url: str) -> dict:
+    """
+    create_engine / create_async_engine keyword arguments for url: the pool
+    settings from Settings, except for SQLite (a local file, nothing to pool).
+    """
+    options = {"echo": False}
+    if make_url(url).get_backend_name() == "sqlite":
+        return options
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def async_database_url(url: str) -> str:
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No async driver known for {parsed.drivername}; set ASYNC_DATABASE_URL")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+engine = create_engine(settings.DATABASE_URL, future=True, **engine_options(settings.DATABASE_URL))
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+def dialect_insert(db):
+    """
+    INSERT construct with .on_conflict_do_update() for the dialect `db` (a
+    Session or Connection) is bound to.
+    """
+    dialect = db.dialect if hasattr(db, "dialect") else db.get_bind().dialect
+    if dialect.name == "postgresql":
+        return pg_insert
+    return sqlite_insert
+
+
 def get_db():
     from sqlalchemy.orm import Session
     db: Session = SessionLocal()
@@ -17,3 +65,65 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Created on first use: the async driver (asyncpg) and greenlet are only
+# needed when USE_ASYNC_DB is on.
+_async_sessionmaker = None
+
+
+def get_async_sessionmaker():
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        try:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+            url = async_database_url(settings.DATABASE_URL)
+            async_engine = create_async_engine(url, **engine_options(url))
+        except ImportError as e:
+            raise RuntimeError(
+                "USE_ASYNC_DB needs the async driver (asyncpg) and greenlet installed"
+            ) from e
+        # loaded objects are read after the session closes
+        _async_sessionmaker = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def run_async_read(fn, *args, **kwargs):
+    """
+    fn(session, *args, **kwargs) on a pooled AsyncSession. fn is ordinary
+    sync ORM code (run through AsyncSession.run_sync), so the storefront
+    reads are shared with the threadpool path rather than written twice.
+    """
+    async with get_async_sessionmaker()() as session:
+        return await session.run_sync(fn, *args, **kwargs)
+
+
+async def dispose_async_engine() -> None:
+    global _async_sessionmaker
+    if _async_sessionmaker is not None:
+        await _async_sessionmaker.kw["bind"].dispose()
+        _async_sessionmaker = None
+
+
+def _release_after(db, fn, *args, **kwargs):
+    """
+    Run a read and hand the session's connection back to the pool in the
+    same worker thread, so async routes never hold a connection across an
+    await (loaded objects stay readable after close).
+    """
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def storefront_read(db, fn, *args, **kwargs):
+    """
+    fn(session, *args, **kwargs) for an async storefront route: on the async
+    engine when USE_ASYNC_DB is on (db is then left unused), otherwise on
+    `db` in a worker thread via _release_after.
+    """
+    if settings.USE_ASYNC_DB:
+        return await run_async_read(fn, *args, **kwargs)
+    return await asyncio.to_thread(_release_after, db, fn, *args, **kwargs)
@@ -1,44 +1,197 @@
 # app/enrich_all_products.py
+"""
+Re-run attribute inference over the whole catalog (after the heuristics in
+app/attributes.py change).
 
-from app.db import SessionLocal
+products_raw is read in (created_at, id) keyset chunks off
+ix_products_raw_created_at_id; the merchants' price bands are recomputed
+first, then each chunk's attributes, chat prompt contexts and list/search
+read model rows are computed (in worker processes with --workers) and
+written with one bulk upsert per table. Every chunk is its own transaction,
+so row locks are short and an interrupted run keeps the chunks it finished.
+Memory stays bounded by chunk size times the number of chunks in flight,
+whatever the catalog size.
+
+    python -m app.enrich_all_products --workers 8 --chunk-size 2000
+"""
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from sqlalchemy import select, tuple_
+
+from app.db import SessionLocal, engine
 from app import models
-from app.attributes import extract_attributes_from_raw
+from app.services.listing_services import listing_row, upsert_listings
+from app.services.merchant_services import resolve_merchant_id
+from app.services.price_band_services import ensure_price_bands
+from app.services.product_services import ATTRIBUTE_COLUMNS, attribute_rows, upsert_attributes
+from app.services.prompt_context_services import prompt_context_row, upsert_prompt_contexts
+from app.services.response_cache import invalidate_product_responses
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+@dataclass
+class EnrichStats:
+    products: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def products_per_second(self) -> float:
+        return self.products / self.seconds if self.seconds else 0.0
+
+
+class EnrichRow(NamedTuple):
+    product_id: UUID
+    merchant_id: UUID
+    shop_domain: str
+    shop_product_id: str
+    created_at: Optional[datetime]
+    raw_json: dict
+    price_bands: Optional[tuple[float, float]]
+
+
+def enrich_chunk(rows: list[EnrichRow]) -> tuple[list[dict], list[dict], list[dict]]:
+    """
+    (attribute rows, prompt context rows, listing rows) for a chunk of
+    products. Pure CPU, so it runs in the pool.
+    """
+    attr_rows = attribute_rows([r.product_id for r in rows], [r.raw_json for r in rows], [r.price_bands for r in rows])
+    # the chat prompt context and the listing embed the attributes
+    context_rows = [
+        prompt_context_row(r.product_id, r.shop_domain, r.shop_product_id, r.raw_json, {c: a[c] for c in ATTRIBUTE_COLUMNS})
+        for r, a in zip(rows, attr_rows)
+    ]
+    listing_rows = [
+        listing_row(r.product_id, r.merchant_id, r.shop_product_id, r.created_at, r.raw_json, a)
+        for r, a in zip(rows, attr_rows)
+    ]
+    return attr_rows, context_rows, listing_rows
 
 
-def enrich_all_products() -> None:
+def _worker_init() -> None:
+    engine.dispose(close=False)
+
+
+def enrich_all_products(
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 0,
+    shop_domain: Optional[str] = None,
+) -> EnrichStats:
+    """
+    Re-enrich every product (or one shop's). workers=0 extracts in this
+    process; otherwise chunks are spread over that many processes while this
+    one keeps streaming and writing.
+    """
+    stats = EnrichStats()
+    started = time.perf_counter()
+    # workers fork on the first submit(), after this process has opened
+    # connections; each drops its inherited copy of the pool without
+    # closing the parent's sockets
+    pool = ProcessPoolExecutor(workers, initializer=_worker_init) if workers else None
     db = SessionLocal()
     try:
-        products = db.query(models.ProductRaw).all()
-        print(f"Found {len(products)} products in products_raw")
-
-        for p in products:
-            attrs_dict = extract_attributes_from_raw(p.raw_json or {})
-
-            # either update existing row or insert a new one
-            existing = (
-                db.query(models.ProductAttributes)
-                .filter(models.ProductAttributes.product_id == p.id)
-                .one_or_none()
-            )
-
-            if existing:
-                for k, v in attrs_dict.items():
-                    setattr(existing, k, v)
-                print(f"Updated attributes for product {p.id}")
-            else:
-                new_attrs = models.ProductAttributes(
-                    product_id=p.id,
-                    **attrs_dict,
+        shop_domains = dict(db.query(models.Merchant.id, models.Merchant.shop_domain).all())
+        stmt = select(
+            models.ProductRaw.id,
+            models.ProductRaw.merchant_id,
+            models.ProductRaw.shop_product_id,
+            models.ProductRaw.raw_json,
+            models.ProductRaw.created_at,
+        )
+        if shop_domain:
+            merchant_id = resolve_merchant_id(db, shop_domain)
+            if merchant_id is None:
+                print(f"No merchant {shop_domain}")
+                return stats
+            stmt = stmt.where(models.ProductRaw.merchant_id == merchant_id)
+            shop_domains = {merchant_id: shop_domain}
+        # rebuilt from the current catalog so every product is banded alike
+        price_bands = {merchant_id: ensure_price_bands(db, merchant_id, refresh=True) for merchant_id in shop_domains}
+        db.commit()
+        stmt = stmt.order_by(models.ProductRaw.created_at, models.ProductRaw.id).limit(chunk_size)
+
+        def read_chunk(after: Optional[tuple]) -> list[EnrichRow]:
+            chunk_stmt = stmt
+            if after is not None:
+                chunk_stmt = stmt.where(
+                    tuple_(models.ProductRaw.created_at, models.ProductRaw.id) > tuple_(*after)
+                )
+            return [
+                EnrichRow(
+                    r.id,
+                    r.merchant_id,
+                    shop_domains[r.merchant_id],
+                    r.shop_product_id,
+                    r.created_at,
+                    r.raw_json or {},
+                    price_bands[r.merchant_id],
                 )
-                db.add(new_attrs)
-                print(f"Created attributes for product {p.id}")
+                for r in db.execute(chunk_stmt)
+            ]
 
-        db.commit()
-        print("✅ Done enriching all products.")
+        def write(attr_rows: list[dict], context_rows: list[dict], listing_rows: list[dict]) -> None:
+            upsert_attributes(db, attr_rows)
+            upsert_prompt_contexts(db, context_rows)
+            upsert_listings(db, listing_rows)
+            db.commit()
+            invalidate_product_responses(row["shop_product_id"] for row in listing_rows)
+            stats.products += len(attr_rows)
+            stats.chunks += 1
+            rate = stats.products / (time.perf_counter() - started)
+            print(f"Enriched {stats.products} products ({rate:.0f}/s)")
+
+        pending = deque()
+        after = None
+        while True:
+            rows = read_chunk(after)
+            # end the read transaction before the chunk is processed
+            db.commit()
+            if not rows:
+                break
+            after = (rows[-1].created_at, rows[-1].product_id)
+            if pool is None:
+                write(*enrich_chunk(rows))
+                continue
+            pending.append(pool.submit(enrich_chunk, rows))
+            # a couple of chunks queued per worker keeps them busy without
+            # pulling the whole catalog into memory
+            while len(pending) >= 2 * workers:
+                write(*pending.popleft().result())
+        while pending:
+            write(*pending.popleft().result())
+
+        stats.seconds = time.perf_counter() - started
+        print(
+            f"✅ Done enriching {stats.products} products in {stats.seconds:.1f}s "
+            f"({stats.products_per_second:.0f} products/s)."
+        )
+        return stats
 
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-run attribute inference over the catalog.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=0, help="extraction processes (0 = in this process)")
+    parser.add_argument("--shop", help="only this merchant's products")
+    args = parser.parse_args()
+    enrich_all_products(chunk_size=args.chunk_size, workers=args.workers, shop_domain=args.shop)
 
 
 if __name__ == "__main__":
-    enrich_all_products()
+    main()
@@ -1,10 +1,8 @@
 
-import json
-import uuid
 from sqlalchemy import text
 
 from app.db import SessionLocal
-from app import models
+from app.streaming_import import import_products_stream, read_file_chunks
 
 DEV_STORE_DOMAIN = "clozr-dev-store.myshopify.com"
 
@@ -20,48 +18,15 @@ def load_sample_products(reset: bool = True) -> None:
             db.execute(text("TRUNCATE TABLE product_attributes, products_raw RESTART IDENTITY CASCADE;"))
             db.commit()
 
-        # Ensure merchant exists
-        merchant = (
-            db.query(models.Merchant)
-            .filter(models.Merchant.shop_domain == DEV_STORE_DOMAIN)
-            .first()
+        # Stream the export in chunks (merchant is created on the first chunk)
+        stats = import_products_stream(
+            db,
+            DEV_STORE_DOMAIN,
+            read_file_chunks(JSON_PATH),
+            on_chunk=lambda s: print(f"Imported {s.imported} products (last: {s.last_shop_product_id})"),
         )
 
-        if not merchant:
-            merchant = models.Merchant(
-                id=uuid.uuid4(),
-                # name="CLOZR Dev Store",
-                shop_domain=DEV_STORE_DOMAIN,
-            )
-            db.add(merchant)
-            db.commit()
-            db.refresh(merchant)
-
-        print(f"Using merchant: {merchant.id}")
-
-        # Load JSON
-        with open(JSON_PATH, "r") as f:
-            data = json.load(f)
-
-        products = data.get("products", data)
-        print(f"Found {len(products)} products in the JSON file.")
-
-        # Insert into DB
-        for p in products:
-            shop_product_id = str(p.get("id"))
-
-            product = models.ProductRaw(
-                id=uuid.uuid4(),
-                merchant_id=merchant.id,
-                shop_product_id=shop_product_id,
-                raw_json=p,
-            )
-
-            db.add(product)
-            print(f"Imported product {shop_product_id}: {p.get('title')}")
-
-        db.commit()
-        print("✔ Finished loading products.")
+        print(f"✔ Finished loading products: {stats.imported} imported, {stats.failed} failed.")
 
     finally:
         db.close()
@@ -1,21 +1,56 @@
 # app/main.py
-from fastapi import FastAPI, Depends, HTTPException
+import hashlib
+import json
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from uuid import UUID
+from contextlib import asynccontextmanager
+from dataclasses import asdict
 from typing import List, Optional
-from app import models
 
-from app.db import get_db
-from app.schemas import ProductIngestPayload, ProductIntelligenceResponse, ProductDetailResponse, ProductListItem, ProductOverviewResponse, ProductSummaryResponse, ProductChatRequest, ProductChatResponse
+from app.db import dispose_async_engine, get_db, storefront_read
+from app.schemas import ProductIngestPayload, BulkProductIngestPayload, BulkProductIngestResponse, StreamIngestResponse, ProductIntelligenceResponse, ProductDetailResponse, ProductListItem, ProductOverviewResponse, ProductSummaryResponse, ProductChatRequest, ProductChatResponse
 from app.services import product_services
-from app.services.product_services import (get_product_with_attributes, list_products_with_attributes, search_products_with_attributes, build_product_sales_summary)
-from app.services.ai_overview_services import get_or_generate_ai_overview
+from app.services.product_services import (get_product_with_attributes, get_product_by_shop_id, list_listings_page, search_listings_page, build_product_sales_summary)
+from app.services.pagination import InvalidCursor
+from app.services.response_cache import (
+    CHAT_CACHE_TTL_SECONDS,
+    SUMMARY_CACHE_TTL_SECONDS,
+    get_cache,
+    get_cached,
+    get_or_compute,
+    product_tag,
+    set_cached,
+    versioned_key,
+)
+from app.services.ai_overview_services import attrs_to_dict, get_or_generate_ai_overview
 from app.services.product_services import build_product_customer_overview_payload
-from app.services.openai_overview import generate_chat_response
+from app.services.openai_overview import (
+    CHAT_FALLBACK_RESPONSE,
+    build_chat_context,
+    chat_context_hash,
+    close_async_client,
+    generate_chat_response,
+    stream_chat_response,
+)
+from app.services.chat_answer_services import answer_product_question, stream_product_answer
+from app.services.merchant_services import merchant_cache
+from app.services.prompt_context_services import get_prompt_context
+from app.streaming_import import DEFAULT_CHUNK_SIZE, ProductStreamImporter, ProductStreamParser
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # release the pooled LLM connections on shutdown
+    await close_async_client()
+    await dispose_async_engine()
 
-app = FastAPI(title="CLOZR Product Intelligence Engine")
+
+app = FastAPI(title="CLOZR Product Intelligence Engine", lifespan=lifespan)
 
 # Add CORS middleware to allow requests from Shopify stores
 app.add_middleware(
@@ -32,6 +67,16 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/cache/stats")
+def cache_stats():
+    """
+    Hit/miss counters of the response cache (summary + chat), plus eviction
+    and memory figures for the in-process backend, and of the shop_domain ->
+    merchant_id cache.
+    """
+    return {"responses": get_cache().stats(), "merchants": merchant_cache.stats()}
+
+
 @app.post("/products/ingest")
 def ingest_product(payload: ProductIngestPayload, db: Session = Depends(get_db)):
     product = product_services.ingest_product(
@@ -43,6 +88,61 @@ def ingest_product(payload: ProductIngestPayload, db: Session = Depends(get_db))
     return {"status": "stored", "product_id": str(product.id)}
 
 
+@app.post("/products/ingest/bulk", response_model=BulkProductIngestResponse)
+def ingest_products_bulk(payload: BulkProductIngestPayload, db: Session = Depends(get_db)):
+    """
+    Idempotent catalog sync: thousands of products per call, one transaction,
+    re-sent products update their existing rows.
+    """
+    product_ids = product_services.bulk_upsert_products(
+        db=db,
+        merchant_domain=payload.merchant_domain,
+        products=[(p.shop_product_id, p.raw_json) for p in payload.products],
+    )
+    return {"status": "stored", "count": len(product_ids), "product_ids": product_ids}
+
+
+@app.post("/products/ingest/stream", response_model=StreamIngestResponse)
+async def ingest_products_stream(
+    request: Request,
+    merchant_domain: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    resume_after: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Full-catalog import from a streamed request body (NDJSON, JSON array or
+    {"products": [...]}). Products are parsed as bytes arrive and committed
+    every chunk_size rows, so the body is never held in memory.
+    """
+    parser = ProductStreamParser()
+    importer = ProductStreamImporter(db, merchant_domain, chunk_size=chunk_size, resume_after=resume_after)
+
+    def add_all(products: list[dict]) -> None:
+        for product in products:
+            importer.add(product)
+
+    parse_error = None
+    try:
+        async for data in request.stream():
+            products = parser.feed(data)
+            if products:
+                await run_in_threadpool(add_all, products)
+        await run_in_threadpool(add_all, parser.close())
+    except ValueError as e:
+        parse_error = str(e)
+
+    stats = await run_in_threadpool(importer.finish, parser.bad_rows)
+    if parse_error:
+        # Everything before the malformed part is committed; the client can
+        # fix the payload and resume after last_shop_product_id.
+        raise HTTPException(
+            status_code=400,
+            detail={"error": parse_error, **StreamIngestResponse(status="partial", **asdict(stats)).model_dump()},
+        )
+    return StreamIngestResponse(status="stored", **asdict(stats))
+
+
 @app.get("/products/{product_id}/intelligence", response_model=ProductIntelligenceResponse)
 def get_product_intelligence(product_id: UUID):
     # TODO: replace with real DB-backed intelligence
@@ -62,65 +162,66 @@ def get_product_intelligence(product_id: UUID):
         },
     )
 
+# Pagination: pass ?cursor=<X-Next-Cursor from the previous page> for keyset
+# paging (constant cost per page); offset is still accepted for the first
+# page / old clients. X-Next-Cursor is omitted on the last page.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _list_item(listing) -> ProductListItem:
+    return ProductListItem(
+        id=listing.id,
+        shop_product_id=listing.shop_product_id,
+        title=listing.title or "Untitled product",
+        category=listing.category,
+        primary_use=listing.primary_use,
+    )
+
+
 @app.get("/products", response_model=List[ProductListItem])
 def list_products(
+    response: Response,
     limit: int = 20,
     offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
-    rows = list_products_with_attributes(db, limit=limit, offset=offset)
-
-    items: List[ProductListItem] = []
-    for product, attrs in rows:
-        raw = product.raw_json or {}
-        title = raw.get("title", "Untitled product")
-
-        items.append(
-            ProductListItem(
-                id=product.id,
-                shop_product_id=product.shop_product_id,
-                title=title,
-                category=(attrs.category if attrs else None),
-                primary_use=(attrs.primary_use if attrs else None),
-            )
-        )
+    try:
+        listings, next_cursor = list_listings_page(db, limit=limit, offset=offset, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
-    return items
+    return [_list_item(listing) for listing in listings]
 
 @app.get("/products/search", response_model=List[ProductListItem])
 def search_products(
+    response: Response,
     q: Optional[str] = None,
     category: Optional[str] = None,
     primary_use: Optional[str] = None,
     limit: int = 20,
     offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
-    rows = search_products_with_attributes(
-        db,
-        q=q,
-        category=category,
-        primary_use=primary_use,
-        limit=limit,
-        offset=offset,
-    )
-
-    items: List[ProductListItem] = []
-    for product, attrs in rows:
-        raw = product.raw_json or {}
-        title = raw.get("title", "Untitled product")
-
-        items.append(
-            ProductListItem(
-                id=product.id,
-                shop_product_id=product.shop_product_id,
-                title=title,
-                category=(attrs.category if attrs else None),
-                primary_use=(attrs.primary_use if attrs else None),
-            )
+    try:
+        listings, next_cursor = search_listings_page(
+            db,
+            q=q,
+            category=category,
+            primary_use=primary_use,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
         )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
-    return items
+    return [_list_item(listing) for listing in listings]
 
 
 @app.get("/products/{product_id}", response_model=ProductDetailResponse)
@@ -154,32 +255,80 @@ def get_product_summary(
 
 
 @app.get("/shopify/products/{shop_product_id}/summary", response_model=ProductOverviewResponse)
-def get_product_summary_by_shop_id(
+async def get_product_summary_by_shop_id(
     shop_product_id: str,
+    shop: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
-    # Fetch product + attributes by Shopify product id
-    result = (
-        db.query(models.ProductRaw, models.ProductAttributes)
-        .outerjoin(
-            models.ProductAttributes,
-            models.ProductAttributes.product_id == models.ProductRaw.id,
-        )
-        .filter(models.ProductRaw.shop_product_id == shop_product_id)
-        .first()
+    if not shop:
+        # Shopify product ids are only unique per shop; older storefront
+        # scripts that omit ?shop= get told what to send instead of a 422
+        raise HTTPException(status_code=400, detail="Missing required query parameter: shop (the store's myshopify.com domain)")
+
+    async def build_summary() -> bytes:
+        # Fetch product + attributes by Shopify product id, scoped to the shop
+        result = await storefront_read(db, get_product_by_shop_id, shop_product_id, shop_domain=shop)
+
+        if result is None:
+            raise HTTPException(status_code=404, detail="Product not found for this Shopify id")
+
+        product, attrs = result
+
+        overview, questions = await get_or_generate_ai_overview(db, product, attrs)  # return both
+        payload = ProductOverviewResponse(**build_product_customer_overview_payload(product, overview, questions))
+        return payload.model_dump_json().encode("utf-8")
+
+    # Hot products are served from the response cache without touching the DB
+    body = await get_or_compute(
+        versioned_key("summary", shop, shop_product_id),
+        build_summary,
+        SUMMARY_CACHE_TTL_SECONDS,
+        tags=[product_tag(shop_product_id)],
     )
+    return Response(content=body, media_type="application/json")
 
-    if result is None:
-        raise HTTPException(status_code=404, detail="Product not found for this Shopify id")
 
-    product, attrs = result
+def _load_chat_context(db: Session, payload: ProductChatRequest) -> tuple[Optional[UUID], str, str]:
+    """
+    (product_id, product_context, context_hash) for the chat prompt. Normally
+    one indexed read of the context rendered on ingest; products without
+    one (never re-ingested since) are rendered from product + attributes.
+    """
+    stored = get_prompt_context(db, payload.shop_domain, payload.product_id)
+    if stored is not None:
+        return stored.product_id, stored.context, stored.context_hash
+
+    product_id = None
+    raw_json = {}
+    attrs_dict = {}
 
-    overview, questions = get_or_generate_ai_overview(db, product, attrs)  # return both
-    return build_product_customer_overview_payload(product, overview, questions)
+    result = get_product_by_shop_id(db, payload.product_id, shop_domain=payload.shop_domain)
+    if result:
+        product, attrs = result
+        product_id = product.id
+        raw_json = product.raw_json or {}
+        attrs_dict = attrs_to_dict(attrs)
+        print(f"Product found without a stored prompt context: {raw_json.get('title', 'Unknown')}")
+    else:
+        print(f"Product not found: product_id={payload.product_id}, shop_domain={payload.shop_domain}")
+
+    product_context = build_chat_context(raw_json, attrs_dict)
+    return product_id, product_context, chat_context_hash(product_context)
+
+
+CHAT_FALLBACK_BODY = CHAT_FALLBACK_RESPONSE.encode("utf-8")
+
+
+def _chat_cache_key(payload: ProductChatRequest) -> str:
+    # case/whitespace variants of the same question share an answer; the
+    # overview is part of the prompt, so it is part of the key too
+    question = " ".join(payload.question.lower().split())
+    question_hash = hashlib.sha256(f"{question}\n{payload.initial_overview}".encode("utf-8")).hexdigest()[:32]
+    return versioned_key("chat", payload.shop_domain, payload.product_id, question_hash)
 
 
 @app.post("/shopify/products/chat", response_model=ProductChatResponse)
-def chat_about_product(
+async def chat_about_product(
     payload: ProductChatRequest,
     db: Session = Depends(get_db),
 ):
@@ -191,56 +340,42 @@ def chat_about_product(
     try:
         print(f"Chat request received: product_id={payload.product_id}, shop={payload.shop_domain}, question={payload.question[:50]}...")
         
-        # Fetch merchant first
-        merchant = db.query(models.Merchant).filter(
-            models.Merchant.shop_domain == payload.shop_domain
-        ).first()
-
-        raw_json = {}
-        attrs_dict = {}
-        
-        if merchant:
-            # Fetch product + attributes for additional context
-            result = (
-                db.query(models.ProductRaw, models.ProductAttributes)
-                .outerjoin(
-                    models.ProductAttributes,
-                    models.ProductAttributes.product_id == models.ProductRaw.id,
+        async def answer() -> str:
+            # the LLM call is awaited on the event loop without holding a pooled connection
+            product_id, product_context, context_hash = await storefront_read(db, _load_chat_context, payload)
+
+            if product_id is not None:
+                # stored answer for this or a near-identical question, else the LLM
+                response = await answer_product_question(
+                    product_id=product_id,
+                    context_hash=context_hash,
+                    product_context=product_context,
+                    shop_domain=payload.shop_domain,
+                    shop_product_id=payload.product_id,
+                    initial_overview=payload.initial_overview,
+                    question=payload.question,
                 )
-                .filter(models.ProductRaw.shop_product_id == payload.product_id)
-                .filter(models.ProductRaw.merchant_id == merchant.id)
-                .first()
-            )
-
-            if result:
-                product, attrs = result
-                raw_json = product.raw_json or {}
-                if attrs:
-                    attrs_dict = {
-                        "category": attrs.category,
-                        "style": attrs.style,
-                        "warmth_level": attrs.warmth_level,
-                        "fit": attrs.fit,
-                        "material_main": attrs.material_main,
-                        "price_band": attrs.price_band,
-                        "primary_use": attrs.primary_use,
-                        "extra_metadata": attrs.extra_metadata,
-                    }
-                print(f"Product found: {raw_json.get('title', 'Unknown')}")
             else:
-                print(f"Product not found: product_id={payload.product_id}, merchant_id={merchant.id}")
-        else:
-            print(f"Merchant not found: shop_domain={payload.shop_domain}")
-
-        # Generate LLM response with context
-        response = generate_chat_response(
-            product_id=payload.product_id,
-            shop_domain=payload.shop_domain,
-            initial_overview=payload.initial_overview,
-            question=payload.question,
-            raw_json=raw_json,
-            attrs=attrs_dict,
+                # Generate LLM response with context
+                response = await generate_chat_response(
+                    product_id=payload.product_id,
+                    shop_domain=payload.shop_domain,
+                    initial_overview=payload.initial_overview,
+                    question=payload.question,
+                    product_context=product_context,
+                )
+            return response.encode("utf-8")
+
+        # Repeat questions about the same product (suggested questions especially)
+        # are answered once per model/prompt version; LLM failures are never cached
+        body = await get_or_compute(
+            _chat_cache_key(payload),
+            answer,
+            CHAT_CACHE_TTL_SECONDS,
+            tags=[product_tag(payload.product_id)],
+            cacheable=lambda value: value != CHAT_FALLBACK_BODY,
         )
+        response = body.decode("utf-8")
 
         print(f"Chat response generated: {response[:50]}...")
         return ProductChatResponse(response=response)
@@ -251,3 +386,73 @@ def chat_about_product(
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/shopify/products/chat/stream")
+async def stream_chat_about_product(
+    payload: ProductChatRequest,
+    db: Session = Depends(get_db),
+):
+    """
+    Streaming variant of /shopify/products/chat (same request body) as
+    Server-Sent Events, so the storefront can render the answer while the
+    model is still writing it:
+
+        event: delta   data: {"text": "..."}       # repeated
+        event: done    data: {"response": "..."}   # the full answer, as /chat returns it
+        event: error   data: {"detail": "..."}     # instead of done, if the LLM fails mid-answer
+
+    Cached answers arrive as a single delta. Completed answers are stored in
+    the same caches /chat reads from.
+    """
+    print(f"Chat stream request received: product_id={payload.product_id}, shop={payload.shop_domain}, question={payload.question[:50]}...")
+    cache_key = _chat_cache_key(payload)
+    cached = await get_cached(cache_key)
+
+    if cached is not None:
+        deltas = None
+    else:
+        # same rule as /chat: no pooled connection is held while the model streams
+        product_id, product_context, context_hash = await storefront_read(db, _load_chat_context, payload)
+        if product_id is not None:
+            deltas = stream_product_answer(
+                product_id=product_id,
+                context_hash=context_hash,
+                product_context=product_context,
+                initial_overview=payload.initial_overview,
+                question=payload.question,
+            )
+        else:
+            deltas = stream_chat_response(payload.initial_overview, payload.question, product_context)
+
+    async def events():
+        if deltas is None:
+            response = cached.decode("utf-8")
+            yield _sse("delta", {"text": response})
+            yield _sse("done", {"response": response})
+            return
+
+        parts = []
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield _sse("delta", {"text": delta})
+        except Exception as e:
+            print(f"Error in stream_chat_about_product: {e.__class__.__name__}: {e}")
+            yield _sse("error", {"detail": "Chat error: the answer was interrupted"})
+            return
+
+        response = "".join(parts).strip()
+        if response != CHAT_FALLBACK_RESPONSE:
+            await set_cached(cache_key, response.encode("utf-8"), CHAT_CACHE_TTL_SECONDS, tags=[product_tag(payload.product_id)])
+        yield _sse("done", {"response": response})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # proxies (nginx) must not buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
@@ -0,0 +1,329 @@
+# app/migrations.py
+"""
+Small, ordered schema migrations for databases created before a column or
+index existed. `create_all` only creates missing tables, so every schema
+change to an existing table gets a revision here.
+
+Each revision runs once, inside its own transaction, and is recorded in the
+`schema_migrations` table. Revisions must be idempotent so they are safe on
+a fresh database where `create_all` already built the new columns.
+"""
+import json
+import uuid
+from typing import Callable, List, Tuple
+
+from sqlalchemy import TIMESTAMP, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+
+def _columns(conn: Connection, table: str) -> set[str]:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _add_column_if_missing(conn: Connection, table: str, column: str, ddl_type: str) -> None:
+    if column not in _columns(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _is_postgres(conn: Connection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+def _backfill_from_raw(conn: Connection, columns: List[str]) -> None:
+    """
+    Fills newly added products_raw columns from raw_json, 1000 rows at a
+    time (keeps memory flat on big catalogs). Rows are picked up by
+    `columns[0] IS NULL`.
+    """
+    from app.services.product_services import product_columns_from_raw
+
+    assignments = ", ".join(f"{c} = :{c}" for c in columns)
+    last_id = None
+    while True:
+        sql = f"SELECT id, raw_json FROM products_raw WHERE {columns[0]} IS NULL"
+        params = {}
+        if last_id is not None:
+            sql += " AND id > :last_id"
+            params["last_id"] = last_id
+        rows = conn.execute(text(sql + " ORDER BY id LIMIT 1000"), params).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            raw = row.raw_json
+            if isinstance(raw, str):
+                raw = json.loads(raw)
+            cols = product_columns_from_raw(raw or {})
+            conn.execute(
+                text(f"UPDATE products_raw SET {assignments} WHERE id = :id"),
+                {**{c: cols[c] for c in columns}, "id": row.id},
+            )
+        last_id = rows[-1].id
+
+
+# ---------------------------------------------------------------------------
+# Revisions
+# ---------------------------------------------------------------------------
+
+def _0001_product_search_columns(conn: Connection) -> None:
+    """
+    Title/tags copied out of raw_json plus indexes for SQL-side search.
+    """
+    _add_column_if_missing(conn, "products_raw", "title", "VARCHAR")
+    _add_column_if_missing(conn, "products_raw", "tags", "VARCHAR")
+
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_product_attributes_category_lower "
+        "ON product_attributes (lower(category))"
+    ))
+
+    _backfill_from_raw(conn, ["title", "tags"])
+
+    if _is_postgres(conn):
+        # Trigram indexes make `ILIKE '%q%'` on title/tags an index scan,
+        # and the jsonb GIN index serves `primary_use @> '["winter"]'`.
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_products_raw_title_trgm "
+            "ON products_raw USING gin (lower(title) gin_trgm_ops)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_products_raw_tags_trgm "
+            "ON products_raw USING gin (lower(tags) gin_trgm_ops)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_product_attributes_primary_use_gin "
+            "ON product_attributes USING gin ((primary_use::jsonb) jsonb_path_ops)"
+        ))
+
+
+def _0002_product_full_text_search(conn: Connection) -> None:
+    """
+    search_text (product_type, vendor, stripped body) and, on Postgres, a
+    weighted tsvector column with a GIN index for ranked search.
+    """
+    _add_column_if_missing(conn, "products_raw", "search_text", "TEXT")
+    _backfill_from_raw(conn, ["search_text"])
+
+    if _is_postgres(conn):
+        conn.execute(text(
+            "ALTER TABLE products_raw ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(tags, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(search_text, '')), 'C')"
+            ") STORED"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_products_raw_search_vector "
+            "ON products_raw USING gin (search_vector)"
+        ))
+
+
+def _0003_products_keyset_index(conn: Connection) -> None:
+    """
+    Composite (created_at, id) index for cursor pagination.
+    """
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_products_raw_created_at_id "
+        "ON products_raw (created_at, id)"
+    ))
+
+
+def _0004_products_merchant_scoped_unique(conn: Connection) -> None:
+    """
+    One products_raw row per (merchant_id, shop_product_id). Earlier ingests
+    always inserted, so duplicates are collapsed first, keeping the most
+    recently ingested copy.
+    """
+    rows = conn.execute(text(
+        "SELECT p.id, p.merchant_id, p.shop_product_id FROM products_raw p "
+        "JOIN (SELECT merchant_id, shop_product_id FROM products_raw "
+        "      GROUP BY merchant_id, shop_product_id HAVING count(*) > 1) d "
+        "  ON d.merchant_id = p.merchant_id AND d.shop_product_id = p.shop_product_id "
+        "ORDER BY p.merchant_id, p.shop_product_id, p.created_at DESC, p.id DESC"
+    )).fetchall()
+
+    seen = set()
+    losers = []
+    for row in rows:
+        key = (row.merchant_id, row.shop_product_id)
+        if key in seen:
+            losers.append(row.id)
+        else:
+            seen.add(key)
+
+    # Dependent rows are deleted explicitly: SQLite does not enforce ON DELETE CASCADE by default
+    for start in range(0, len(losers), 500):
+        ids = {f"id{i}": pid for i, pid in enumerate(losers[start : start + 500])}
+        in_clause = ", ".join(f":{k}" for k in ids)
+        for table, column in (
+            ("product_ai_overviews", "product_id"),
+            ("product_attributes", "product_id"),
+            ("products_raw", "id"),
+        ):
+            conn.execute(text(f"DELETE FROM {table} WHERE {column} IN ({in_clause})"), ids)
+    if losers:
+        print(f"Removed {len(losers)} duplicate products_raw rows")
+
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_products_raw_merchant_shop_product "
+        "ON products_raw (merchant_id, shop_product_id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_products_raw_shop_product_id "
+        "ON products_raw (shop_product_id)"
+    ))
+
+
+def _0005_ai_overview_input_hash(conn: Connection) -> None:
+    """
+    Staleness columns for cached overviews. Existing rows keep NULL, which
+    reads as stale: they regenerate on their next request or pre-generation
+    run.
+    """
+    _add_column_if_missing(conn, "product_ai_overviews", "prompt_version", "VARCHAR")
+    _add_column_if_missing(conn, "product_ai_overviews", "input_hash", "VARCHAR(64)")
+
+
+def _0006_product_prompt_contexts(conn: Connection) -> None:
+    """
+    Renders the chat prompt context for products ingested before
+    product_prompt_contexts existed (create_all has made the table), 500 at
+    a time.
+    """
+    from app.services.product_services import ATTRIBUTE_COLUMNS
+    from app.services.prompt_context_services import prompt_context_row, upsert_prompt_contexts
+
+    def _json(value):
+        return json.loads(value) if isinstance(value, str) else value
+
+    JSON_COLUMNS = ("primary_use", "extra_metadata")
+    attr_select = ", ".join(f"a.{c}" for c in ATTRIBUTE_COLUMNS)
+    while True:
+        rows = conn.execute(text(
+            f"SELECT p.id, p.shop_product_id, p.raw_json, m.shop_domain, a.id AS attrs_id, {attr_select} "
+            "FROM products_raw p "
+            "JOIN merchants m ON m.id = p.merchant_id "
+            "LEFT JOIN product_attributes a ON a.product_id = p.id "
+            "LEFT JOIN product_prompt_contexts c ON c.product_id = p.id "
+            "WHERE c.product_id IS NULL ORDER BY p.id LIMIT 500"
+        )).fetchall()
+        if not rows:
+            break
+        upsert_prompt_contexts(conn, [
+            prompt_context_row(
+                row.id if isinstance(row.id, uuid.UUID) else uuid.UUID(str(row.id)),
+                row.shop_domain,
+                row.shop_product_id,
+                _json(row.raw_json) or {},
+                # no attributes row -> {} as in attrs_to_dict
+                {c: _json(getattr(row, c)) if c in JSON_COLUMNS else getattr(row, c) for c in ATTRIBUTE_COLUMNS}
+                if row.attrs_id is not None else {},
+            )
+            for row in rows
+        ])
+
+
+def _0007_product_min_price(conn: Connection) -> None:
+    """
+    Lowest variant price per product, read by the per-merchant price bands
+    (merchant_price_bands is new, so create_all makes it; bands are computed
+    on the next ingest or enrich run).
+    """
+    _add_column_if_missing(conn, "products_raw", "min_price", "FLOAT")
+    _backfill_from_raw(conn, ["min_price"])
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_products_raw_merchant_min_price "
+        "ON products_raw (merchant_id, min_price)"
+    ))
+
+
+def _0008_product_listings(conn: Connection) -> None:
+    """
+    Fills the product_listings read model (create_all has made the table)
+    for products ingested before it existed, 500 at a time.
+    """
+    from app.services.listing_services import listing_row, upsert_listings
+
+    def _json(value):
+        return json.loads(value) if isinstance(value, str) else value
+
+    def _uuid(value):
+        return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+    if _is_postgres(conn):
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_product_listings_primary_use_gin "
+            "ON product_listings USING gin ((primary_use::jsonb) jsonb_path_ops)"
+        ))
+    while True:
+        rows = conn.execute(text(
+            "SELECT p.id, p.merchant_id, p.shop_product_id, p.created_at, p.raw_json, a.category, a.primary_use "
+            "FROM products_raw p "
+            "LEFT JOIN product_attributes a ON a.product_id = p.id "
+            "LEFT JOIN product_listings l ON l.id = p.id "
+            "WHERE l.id IS NULL ORDER BY p.id LIMIT 500"
+        ).columns(created_at=TIMESTAMP(timezone=True))).fetchall()
+        if not rows:
+            break
+        upsert_listings(conn, [
+            listing_row(
+                _uuid(row.id),
+                _uuid(row.merchant_id),
+                row.shop_product_id,
+                row.created_at,
+                _json(row.raw_json) or {},
+                {"category": row.category, "primary_use": _json(row.primary_use)},
+            )
+            for row in rows
+        ])
+
+
+def _0009_price_band_change_counter(conn: Connection) -> None:
+    """
+    Priced products written since the merchant's bands were computed, so
+    ingest no longer re-counts the catalog to decide on a recompute.
+    """
+    _add_column_if_missing(conn, "merchant_price_bands", "changes_since", "INTEGER NOT NULL DEFAULT 0")
+
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_product_search_columns", _0001_product_search_columns),
+    ("0002_product_full_text_search", _0002_product_full_text_search),
+    ("0003_products_keyset_index", _0003_products_keyset_index),
+    ("0004_products_merchant_scoped_unique", _0004_products_merchant_scoped_unique),
+    ("0005_ai_overview_input_hash", _0005_ai_overview_input_hash),
+    ("0006_product_prompt_contexts", _0006_product_prompt_contexts),
+    ("0007_product_min_price", _0007_product_min_price),
+    ("0008_product_listings", _0008_product_listings),
+    ("0009_price_band_change_counter", _0009_price_band_change_counter),
+]
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """
+    Applies every revision not yet recorded in schema_migrations.
+    Returns the list of revisions applied in this run.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "revision VARCHAR PRIMARY KEY, "
+            "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        done = {r[0] for r in conn.execute(text("SELECT revision FROM schema_migrations"))}
+
+    applied: List[str] = []
+    for revision, upgrade in MIGRATIONS:
+        if revision in done:
+            continue
+        with engine.begin() as conn:
+            upgrade(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (revision) VALUES (:r)"),
+                {"r": revision},
+            )
+        print(f"Applied migration {revision}")
+        applied.append(revision)
+
+    return applied
@@ -1,5 +1,5 @@
 # app/models.py
-from sqlalchemy import Column, String, JSON, TIMESTAMP, text, ForeignKey, DateTime, func
+from sqlalchemy import Column, String, Text, JSON, TIMESTAMP, text, ForeignKey, DateTime, func, Index, Integer, Float
 from sqlalchemy.dialects.postgresql import UUID
 from app.db import Base
 import uuid
@@ -15,6 +15,25 @@ class Merchant(Base):
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"))
 
 
+class MerchantPriceBands(Base):
+    """
+    The merchant's price_band thresholds (33rd / 67th percentile of product
+    min_price), computed on ingest rather than per request.
+    """
+    __tablename__ = "merchant_price_bands"
+
+    merchant_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("merchants.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    low_max = Column(Float, nullable=False)   # price <= low_max -> "$"
+    high_min = Column(Float, nullable=False)  # price >= high_min -> "$$$"
+    product_count = Column(Integer, nullable=False)  # priced products the bands were computed from
+    changes_since = Column(Integer, nullable=False, server_default=text("0"))  # priced products written since
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"))
+
+
 class ProductRaw(Base):
     __tablename__ = "products_raw"
 
@@ -22,6 +41,13 @@ class ProductRaw(Base):
     merchant_id = Column(UUID(as_uuid=True), ForeignKey("merchants.id", ondelete="CASCADE"), nullable=False)
     shop_product_id = Column(String, nullable=False)
     raw_json = Column(JSON, nullable=False)
+
+    # Copied out of raw_json on ingest so search can filter in SQL
+    title = Column(String, nullable=True)
+    tags = Column(String, nullable=True)
+    search_text = Column(Text, nullable=True)  # product_type, vendor, HTML-stripped body
+    min_price = Column(Float, nullable=True)  # lowest variant price, for price bands
+
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"))
     updated_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"))
 
@@ -32,6 +58,16 @@ class ProductRaw(Base):
         cascade="all, delete-orphan",
     )
 
+    __table_args__ = (
+        # keyset pagination: ORDER BY created_at, id / WHERE (created_at, id) > (...)
+        Index("ix_products_raw_created_at_id", "created_at", "id"),
+        # storefront lookups: one row per Shopify product per merchant
+        Index("uq_products_raw_merchant_shop_product", "merchant_id", "shop_product_id", unique=True),
+        Index("ix_products_raw_shop_product_id", "shop_product_id"),
+        # per-merchant price percentiles read min_price in order
+        Index("ix_products_raw_merchant_min_price", "merchant_id", "min_price"),
+    )
+
 class ProductAttributes(Base):
     __tablename__ = "product_attributes"
 
@@ -57,6 +93,10 @@ class ProductAttributes(Base):
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"))
     updated_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"))
 
+    __table_args__ = (
+        Index("ix_product_attributes_category_lower", func.lower(category)),
+    )
+
 
 class ProductAIOverview(Base):
     __tablename__ = "product_ai_overviews"
@@ -68,6 +108,10 @@ class ProductAIOverview(Base):
     )
     overview = Column(String, nullable=False)  # short paragraph
     model = Column(String, nullable=True)
+    prompt_version = Column(String, nullable=True)
+    # sha256 of the exact LLM inputs (facts + prompts) + PROMPT_VERSION + MODEL;
+    # the row is stale as soon as this no longer matches
+    input_hash = Column(String(64), nullable=True)
     updated_at = Column(
         DateTime(timezone=True),
         server_default=func.now(),
@@ -80,4 +124,100 @@ class ProductAIOverview(Base):
     product = relationship("ProductRaw", back_populates="ai_overview_row")
 
 
+class ProductAIOverviewLease(Base):
+    """
+    Cross-worker lease on one product's overview generation: a row with an
+    expiry, claimed and deleted in short transactions, so no pooled
+    connection stays checked out during the LLM call.
+    """
+    __tablename__ = "product_ai_overview_leases"
+
+    product_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("products_raw.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    holder = Column(String(32), nullable=False)  # the holding caller's token
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)  # free to take over after this
+
+
+class ProductChatAnswer(Base):
+    """
+    Answered shopper questions per product, reused for exact and
+    near-duplicate questions while the product's prompt inputs are unchanged.
+    """
+    __tablename__ = "product_chat_answers"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    product_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("products_raw.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    # chat_context_hash of the product context the answer was generated from
+    input_hash = Column(String(64), nullable=False)
+    question = Column(Text, nullable=False)             # normalized question text
+    question_hash = Column(String(64), nullable=False)  # sha256 of `question`
+    embedding = Column(JSON, nullable=False)            # sparse hashed vector: [[bucket, weight], ...]
+    answer = Column(Text, nullable=False)
+    source = Column(String, nullable=False, server_default="chat")  # "chat" | "suggested"
+    created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"))
+
+    __table_args__ = (
+        Index("uq_product_chat_answers_question", "product_id", "input_hash", "question_hash", unique=True),
+    )
+
+
+class ProductPromptContext(Base):
+    """
+    The product's chat prompt context, rendered on ingest so a chat request
+    is one keyed read: (shop_domain, shop_product_id) -> ready-to-send text.
+    """
+    __tablename__ = "product_prompt_contexts"
+
+    product_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("products_raw.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # denormalized from merchants/products_raw so the lookup needs no join
+    shop_domain = Column(String, nullable=False)
+    shop_product_id = Column(String, nullable=False)
+    context = Column(Text, nullable=False)            # build_chat_context() output
+    context_hash = Column(String(64), nullable=False)  # chat_context_hash(context)
+    token_count = Column(Integer, nullable=False)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"))
 
+    __table_args__ = (
+        Index("uq_product_prompt_contexts_shop_product", "shop_domain", "shop_product_id", unique=True),
+    )
+
+
+
+class ProductListing(Base):
+    """
+    Read model for GET /products and /products/search: the few fields a
+    list item shows, copied from products_raw / product_attributes on
+    ingest so listing never loads raw_json (see listing_services).
+    """
+    __tablename__ = "product_listings"
+
+    id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("products_raw.id", ondelete="CASCADE"),
+        primary_key=True,
+    )  # = products_raw.id
+    merchant_id = Column(UUID(as_uuid=True), ForeignKey("merchants.id", ondelete="CASCADE"), nullable=False)
+    shop_product_id = Column(String, nullable=False)
+    title = Column(String, nullable=True)
+    category = Column(String, nullable=True)
+    primary_use = Column(JSON, nullable=True)
+    price = Column(Float, nullable=True)  # lowest variant price
+    created_at = Column(TIMESTAMP(timezone=True), nullable=True)  # products_raw.created_at
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"))
+
+    __table_args__ = (
+        # same keyset pagination as products_raw
+        Index("ix_product_listings_created_at_id", "created_at", "id"),
+        Index("ix_product_listings_category_lower", func.lower(category)),
+    )
@@ -0,0 +1,355 @@
+# app/pregenerate_overviews.py
+"""
+Warm a merchant's catalog before launch: walk products_raw in id order, find
+products whose ProductAIOverview row is missing or stale (its input_hash no
+longer matches the product's prompt inputs, PROMPT_VERSION or MODEL) and
+generate them with bounded concurrency and per-product retries, committing
+each row as it lands (then pre-answering its suggested questions for the chat
+cache). Progress is checkpointed per page, so an interrupted run resumes.
+
+    python -m app.pregenerate_overviews --shop my-store.myshopify.com --concurrency 8 \\
+        --checkpoint overviews.ckpt --resume
+
+Or go through the OpenAI Batch API (half price, 24h turnaround):
+
+    python -m app.pregenerate_overviews --shop my-store.myshopify.com --write-batch batch_input.jsonl
+    # upload + create the batch with endpoint /v1/responses, download its output file, then
+    python -m app.pregenerate_overviews --apply-batch batch_output.jsonl
+"""
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from uuid import UUID
+
+from app import models
+from app.db import SessionLocal
+from app.services import chat_answer_services
+from app.services.merchant_services import resolve_merchant_id
+from app.services.response_cache import invalidate_product_responses
+from app.services.ai_overview_services import attrs_to_dict, is_current, store_ai_overview
+from app.services.openai_overview import (
+    MODEL,
+    OVERVIEW_TEMPERATURE,
+    PROMPT_VERSION,
+    QUESTIONS_TEMPERATURE,
+    build_overview_input,
+    build_questions_input,
+    close_async_client,
+    generate_short_overview,
+    generate_suggested_questions,
+    overview_input_hash,
+    parse_suggested_questions,
+)
+from app.streaming_import import read_checkpoint, write_checkpoint
+
+DEFAULT_CONCURRENCY = 8
+PAGE_SIZE = 200
+MAX_ATTEMPTS = 3
+BATCH_HASH_CHARS = 16
+
+
+@dataclass
+class PregenStats:
+    generated: int = 0
+    failed: int = 0      # still failing after MAX_ATTEMPTS; left stale for the next run
+    pages: int = 0
+    checked: int = 0     # products scanned, including ones that were already current
+    last_product_id: Optional[str] = None
+
+
+@dataclass
+class _StaleProduct:
+    product_id: UUID
+    raw_json: dict
+    attrs: dict
+    input_hash: str
+
+
+def _load_page(shop_domain: str, after: Optional[UUID], page_size: int) -> tuple[List[_StaleProduct], Optional[UUID], int]:
+    """
+    Next page of the merchant's products after `after`, in id order.
+    Returns (stale products, last id scanned, products scanned). Staleness is
+    decided by comparing input hashes, which needs the prompts built in
+    Python, so every product is scanned.
+    """
+    db = SessionLocal()
+    try:
+        merchant_id = resolve_merchant_id(db, shop_domain)
+        if merchant_id is None:
+            return [], None, 0
+        query = (
+            db.query(models.ProductRaw, models.ProductAttributes, models.ProductAIOverview)
+            .outerjoin(models.ProductAttributes, models.ProductAttributes.product_id == models.ProductRaw.id)
+            .outerjoin(models.ProductAIOverview, models.ProductAIOverview.product_id == models.ProductRaw.id)
+            .filter(models.ProductRaw.merchant_id == merchant_id)
+        )
+        if after is not None:
+            query = query.filter(models.ProductRaw.id > after)
+        rows = query.order_by(models.ProductRaw.id).limit(page_size).all()
+
+        stale = []
+        for product, attrs, overview in rows:
+            raw_json = product.raw_json or {}
+            attrs_dict = attrs_to_dict(attrs)
+            input_hash = overview_input_hash(raw_json, attrs_dict)
+            if not is_current(overview, input_hash):
+                stale.append(_StaleProduct(product.id, raw_json, attrs_dict, input_hash))
+        return stale, (rows[-1][0].id if rows else None), len(rows)
+    finally:
+        db.close()
+
+
+def _store(product_id: UUID, overview: str, questions: list[str], input_hash: str) -> None:
+    """
+    Store a generated overview and drop the product's cached summary, which
+    would otherwise keep serving the old one until it expires.
+    """
+    db = SessionLocal()
+    try:
+        shop_product_id = db.query(models.ProductRaw.shop_product_id).filter_by(id=product_id).scalar()
+        store_ai_overview(
+            db,
+            models.ProductAIOverview(
+                product_id=product_id,
+                overview=overview,
+                suggested_questions=questions,
+                model=MODEL,
+                prompt_version=PROMPT_VERSION,
+                input_hash=input_hash,
+            ),
+        )
+    finally:
+        db.close()
+    if shop_product_id is not None:
+        invalidate_product_responses([shop_product_id])
+
+
+async def _generate_one(item: _StaleProduct, semaphore: asyncio.Semaphore, max_attempts: int) -> bool:
+    async with semaphore:
+        for attempt in range(1, max_attempts + 1):
+            try:
+                overview, questions = await asyncio.gather(
+                    generate_short_overview(item.raw_json, item.attrs),
+                    generate_suggested_questions(item.raw_json, item.attrs, strict=True),
+                )
+                if not overview:
+                    raise ValueError("empty overview")
+                await asyncio.to_thread(_store, item.product_id, overview, questions, item.input_hash)
+                break
+            except Exception as e:
+                print(f"Product {item.product_id} attempt {attempt}/{max_attempts} failed: {e.__class__.__name__}: {e}")
+                if attempt < max_attempts:
+                    await asyncio.sleep(min(2 ** attempt, 30))
+        else:
+            return False
+
+        if chat_answer_services.PREANSWER_SUGGESTED_QUESTIONS:
+            # best effort: unanswered questions just fall through to the LLM at chat time
+            try:
+                await chat_answer_services.preanswer_suggested_questions(
+                    item.product_id, overview, questions, item.raw_json, item.attrs
+                )
+            except Exception as e:
+                print(f"Product {item.product_id} pre-answering failed: {e.__class__.__name__}: {e}")
+        return True
+
+
+async def pregenerate_overviews(
+    shop_domain: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    page_size: int = PAGE_SIZE,
+    max_attempts: int = MAX_ATTEMPTS,
+    resume_after: Optional[str] = None,
+    limit: Optional[int] = None,
+    on_page: Optional[Callable[[PregenStats], None]] = None,
+) -> PregenStats:
+    stats = PregenStats()
+    semaphore = asyncio.Semaphore(concurrency)
+    after = UUID(resume_after) if resume_after else None
+
+    while limit is None or stats.generated + stats.failed < limit:
+        page, last_id, scanned = await asyncio.to_thread(_load_page, shop_domain, after, page_size)
+        if last_id is None:
+            break
+        if limit is not None and len(page) > limit - stats.generated - stats.failed:
+            # stop mid-page: checkpoint at the last product we actually handled
+            page = page[: limit - stats.generated - stats.failed]
+            last_id = page[-1].product_id
+            scanned = None
+
+        results = await asyncio.gather(*(_generate_one(item, semaphore, max_attempts) for item in page))
+        stats.generated += sum(results)
+        stats.failed += len(results) - sum(results)
+        stats.checked += scanned if scanned is not None else len(page)
+        stats.pages += 1
+        after = last_id
+        stats.last_product_id = str(after)
+        if on_page:
+            on_page(stats)
+
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# OpenAI Batch API
+# ---------------------------------------------------------------------------
+
+def write_batch_requests(shop_domain: str, path: str, page_size: int = PAGE_SIZE) -> int:
+    """
+    Two /v1/responses requests per stale product, custom_id
+    "<product_id>:overview:<hash>" and "<product_id>:questions:<hash>" (hash =
+    first 16 hex chars of the input hash, to stay under the 64-char limit).
+    Returns the number of products written.
+    """
+    count = 0
+    after = None
+    with open(path, "w", encoding="utf-8") as f:
+        while True:
+            page, after, _ = _load_page(shop_domain, after, page_size)
+            if after is None:
+                break
+            for item in page:
+                for kind, input, temperature in (
+                    ("overview", build_overview_input(item.raw_json, item.attrs), OVERVIEW_TEMPERATURE),
+                    ("questions", build_questions_input(item.raw_json, item.attrs), QUESTIONS_TEMPERATURE),
+                ):
+                    request = {
+                        "custom_id": f"{item.product_id}:{kind}:{item.input_hash[:BATCH_HASH_CHARS]}",
+                        "method": "POST",
+                        "url": "/v1/responses",
+                        "body": {"model": MODEL, "input": input, "temperature": temperature},
+                    }
+                    f.write(json.dumps(request) + "\n")
+                count += 1
+    return count
+
+
+def _batch_output_text(line: dict) -> Optional[str]:
+    response = line.get("response") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        return None
+    texts = []
+    for output in (response.get("body") or {}).get("output") or []:
+        if output.get("type") != "message":
+            continue
+        for content in output.get("content") or []:
+            if content.get("type") == "output_text" and content.get("text") is not None:
+                texts.append(content["text"])
+    return "".join(texts).strip()
+
+
+def _current_input_hashes(product_ids: List[UUID]) -> dict[UUID, str]:
+    db = SessionLocal()
+    try:
+        hashes = {}
+        for i in range(0, len(product_ids), PAGE_SIZE):
+            rows = (
+                db.query(models.ProductRaw, models.ProductAttributes)
+                .outerjoin(models.ProductAttributes, models.ProductAttributes.product_id == models.ProductRaw.id)
+                .filter(models.ProductRaw.id.in_(product_ids[i : i + PAGE_SIZE]))
+                .all()
+            )
+            for product, attrs in rows:
+                hashes[product.id] = overview_input_hash(product.raw_json or {}, attrs_to_dict(attrs))
+        return hashes
+    finally:
+        db.close()
+
+
+def apply_batch_results(path: str) -> PregenStats:
+    """
+    Store every product whose overview and questions requests both succeeded
+    in a Batch API output file. Products whose prompt inputs changed since
+    the batch was written are skipped (they are stale again already).
+    """
+    stats = PregenStats()
+    parts: dict[tuple[UUID, str], dict[str, Optional[str]]] = defaultdict(dict)
+    with open(path, encoding="utf-8") as f:
+        for raw_line in f:
+            if not raw_line.strip():
+                continue
+            try:
+                line = json.loads(raw_line)
+                product_id, kind, hash_prefix = str(line.get("custom_id") or "").split(":")
+                if kind not in ("overview", "questions"):
+                    raise ValueError(f"unknown request kind {kind!r}")
+                parts[(UUID(product_id), hash_prefix)][kind] = _batch_output_text(line)
+            except (AttributeError, ValueError) as e:
+                # error lines, or lines from some other batch
+                stats.failed += 1
+                print(f"Skipping batch output line: {e}")
+
+    current = _current_input_hashes(list({product_id for product_id, _ in parts}))
+
+    for (product_id, hash_prefix), result in parts.items():
+        overview, questions_raw = result.get("overview"), result.get("questions")
+        try:
+            input_hash = current.get(product_id)
+            if input_hash is None or input_hash[:BATCH_HASH_CHARS] != hash_prefix:
+                raise ValueError("product deleted or changed since the batch was written")
+            if not overview or questions_raw is None:
+                raise ValueError("missing or failed request in batch output")
+            _store(product_id, overview, parse_suggested_questions(questions_raw), input_hash)
+            stats.generated += 1
+        except ValueError as e:
+            stats.failed += 1
+            print(f"Skipping product {product_id}: {e}")
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-generate AI overviews for a merchant's catalog.")
+    parser.add_argument("--shop", help="merchant shop domain, e.g. my-store.myshopify.com")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--limit", type=int, help="stop after this many products")
+    parser.add_argument("--checkpoint", help="file recording the last processed product id")
+    parser.add_argument("--resume", action="store_true", help="continue after the checkpoint")
+    parser.add_argument("--write-batch", metavar="PATH", help="write an OpenAI Batch API input file instead of calling the API")
+    parser.add_argument("--apply-batch", metavar="PATH", help="store results from an OpenAI Batch API output file")
+    args = parser.parse_args()
+
+    if args.apply_batch:
+        stats = apply_batch_results(args.apply_batch)
+        print(f"✔ Stored {stats.generated} overviews from batch output, {stats.failed} failed")
+        return
+    if not args.shop:
+        parser.error("--shop is required")
+    if args.write_batch:
+        count = write_batch_requests(args.shop, args.write_batch)
+        print(f"✔ Wrote {count * 2} requests for {count} products to {args.write_batch}")
+        return
+
+    resume_after = None
+    if args.resume:
+        if not args.checkpoint:
+            parser.error("--resume needs --checkpoint")
+        resume_after = read_checkpoint(args.checkpoint, "last_product_id")
+        if resume_after:
+            print(f"Resuming after product {resume_after}")
+
+    def on_page(stats: PregenStats) -> None:
+        if args.checkpoint:
+            write_checkpoint(args.checkpoint, stats)
+        print(f"Page {stats.pages}: {stats.generated} generated, {stats.failed} failed")
+
+    async def run() -> PregenStats:
+        try:
+            return await pregenerate_overviews(
+                args.shop,
+                concurrency=args.concurrency,
+                resume_after=resume_after,
+                limit=args.limit,
+                on_page=on_page,
+            )
+        finally:
+            await close_async_client()
+
+    stats = asyncio.run(run())
+    print(f"✔ Finished: {stats.generated} generated, {stats.failed} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# app/prompts/product_facts.py
+"""
+Product facts for the overview, suggested-questions and chat prompts.
+
+Shopify JSON is noisy for a model: body_html carries markup, merchants paste
+the same sentence twice, options come with ids and positions, and empty
+attributes still cost tokens. extract_product_facts() keeps what a shopper
+would care about, strips the HTML, drops duplicate description sentences
+and packs the description into a token budget (counted locally with
+text_utils.count_tokens) instead of cutting raw HTML at a character count.
+"""
+import json
+import os
+import re
+from typing import Iterable, List, Optional
+
+from app.text_utils import count_tokens, html_blocks, tokenize
+
+# Whole-facts budgets (JSON included) per prompt
+OVERVIEW_FACT_TOKENS = int(os.getenv("OVERVIEW_FACT_TOKENS", "400"))
+QUESTIONS_FACT_TOKENS = int(os.getenv("QUESTIONS_FACT_TOKENS", "350"))
+CHAT_FACT_TOKENS = int(os.getenv("CHAT_FACT_TOKENS", "350"))
+
+# A sentence that only fits partially is cut at a word boundary if at least
+# this many tokens of it fit; otherwise packing stops before it.
+MIN_PARTIAL_TOKENS = 8
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+_PLACEHOLDER_VALUES = {"", "default title"}
+
+
+def description_sentences(body_html: Optional[str], skip: Iterable[str] = ()) -> List[str]:
+    """
+    Plain-text sentences of a body_html, in order, without repeats (compared
+    case- and punctuation-insensitively) or sentences that just restate one
+    of `skip` (e.g. the title).
+    """
+    seen = {" ".join(tokenize(s)) for s in skip}
+    sentences = []
+    for sentence in (s for block in html_blocks(body_html) for s in _SENTENCE_END_RE.split(block)):
+        sentence = sentence.strip()
+        key = " ".join(tokenize(sentence))
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        sentences.append(sentence)
+    return sentences
+
+
+def pack_sentences(sentences: Iterable[str], budget_tokens: int) -> str:
+    """
+    As many whole sentences as fit in budget_tokens, in order.
+    """
+    packed: List[str] = []
+    used = 0
+    for sentence in sentences:
+        cost = count_tokens(sentence)
+        if used + cost <= budget_tokens:
+            packed.append(sentence)
+            used += cost
+            continue
+        remaining = budget_tokens - used
+        if remaining >= MIN_PARTIAL_TOKENS:
+            words = []
+            for word in sentence.split():
+                if count_tokens(" ".join(words + [word])) > remaining - 1:  # leave room for the ellipsis
+                    break
+                words.append(word)
+            if words:
+                packed.append(" ".join(words) + "…")
+        break
+    return " ".join(packed)
+
+
+def _options(raw_json: dict) -> list[dict]:
+    options = []
+    for option in raw_json.get("options") or []:
+        if not isinstance(option, dict):
+            continue
+        values = [v for v in option.get("values") or [] if str(v).strip().lower() not in _PLACEHOLDER_VALUES]
+        if values:
+            options.append({"name": option.get("name"), "values": values})
+    return options
+
+
+def _example_variant(raw_json: dict) -> dict:
+    variants = raw_json.get("variants") or []
+    v0 = variants[0] if variants else {}
+    variant = {"title": v0.get("title"), "price": v0.get("price")}
+    if str(variant["title"] or "").strip().lower() in _PLACEHOLDER_VALUES:
+        variant.pop("title")
+    return {k: v for k, v in variant.items() if v not in (None, "")}
+
+
+def _attributes(attrs: Optional[dict]) -> dict:
+    return {k: v for k, v in (attrs or {}).items() if v not in (None, "", [], {})}
+
+
+def extract_product_facts(
+    raw_json: Optional[dict],
+    attrs: Optional[dict],
+    budget_tokens: int,
+    include_tags: bool = False,
+    include_options: bool = False,
+) -> dict:
+    """
+    Facts dict for a prompt, at most ~budget_tokens when serialized with
+    facts_json(). Fixed fields come first; the description gets whatever
+    budget they leave.
+    """
+    raw_json = raw_json or {}
+    title = raw_json.get("title") or ""
+
+    facts = {
+        "title": title,
+        "vendor": raw_json.get("vendor") or "",
+        "product_type": raw_json.get("product_type") or "",
+    }
+    if include_tags:
+        facts["tags"] = raw_json.get("tags") or ""
+    facts["description"] = ""
+    if include_options:
+        options = _options(raw_json)
+        if options:
+            facts["options"] = options
+    variant = _example_variant(raw_json)
+    if variant:
+        facts["example_variant"] = variant
+    attributes = _attributes(attrs)
+    if attributes:
+        facts["inferred_attributes"] = attributes
+
+    facts = {k: v for k, v in facts.items() if v or k == "description"}
+    remaining = budget_tokens - count_tokens(facts_json(facts))
+    facts["description"] = pack_sentences(description_sentences(raw_json.get("body_html"), skip=[title]), remaining)
+    if not facts["description"]:
+        del facts["description"]
+    return facts
+
+
+def facts_json(facts: dict) -> str:
+    return json.dumps(facts, ensure_ascii=False, default=str)
@@ -12,6 +12,31 @@ class ProductIngestPayload(BaseModel):
     raw_json: dict
 
 
+class BulkProductItem(BaseModel):
+    shop_product_id: str
+    raw_json: dict
+
+
+class BulkProductIngestPayload(BaseModel):
+    merchant_domain: str
+    products: List[BulkProductItem]
+
+
+class BulkProductIngestResponse(BaseModel):
+    status: str
+    count: int
+    product_ids: Dict[str, UUID]  # shop_product_id -> product_id
+
+
+class StreamIngestResponse(BaseModel):
+    status: str
+    imported: int
+    skipped: int
+    failed: int
+    chunks: int
+    last_shop_product_id: Optional[str] = None  # pass back as resume_after to continue
+
+
 class ProductIntelligenceResponse(BaseModel):
     product_id: UUID
     summary: str
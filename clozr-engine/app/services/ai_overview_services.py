@@ -1,45 +1,222 @@
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.orm import Session
 from app import models
-from app.services.openai_overview import generate_short_overview, MODEL
-from app.services.openai_overview import generate_suggested_questions
+from app.db import SessionLocal, dialect_insert, engine, storefront_read
+from app.services.chat_answer_services import schedule_preanswer
+from app.services.openai_overview import generate_short_overview, MODEL, PROMPT_VERSION
+from app.services.openai_overview import generate_suggested_questions, overview_input_hash
+from app.services.openai_overview import LLM_MAX_RETRIES, LLM_TIMEOUT_SECONDS
+
+# How long a worker waits for another worker's generation of the same
+# product before giving up on the lease and generating itself.
+LEASE_TIMEOUT_MS = 30_000
+# How often a waiting worker retries the lease; it holds no connection
+# while it sleeps.
+LEASE_POLL_SECONDS = 0.2
+# A lease outlives the slowest generation (every LLM attempt timing out,
+# twice over) so it only expires when its holder died mid-generation.
+LEASE_TTL_SECONDS = 2 * LLM_TIMEOUT_SECONDS * (LLM_MAX_RETRIES + 1)
+
+# (product_id, input_hash) -> the one in-flight generation in this process
+_inflight: dict[tuple[UUID, str], asyncio.Task] = {}
+
+
+
+def attrs_to_dict(attrs: models.ProductAttributes | None) -> dict:
+    if not attrs:
+        return {}
+    return {
+        "category": attrs.category,
+        "style": attrs.style,
+        "warmth_level": attrs.warmth_level,
+        "fit": attrs.fit,
+        "material_main": attrs.material_main,
+        "price_band": attrs.price_band,
+        "primary_use": attrs.primary_use,
+        "extra_metadata": attrs.extra_metadata,
+    }
+
+
+def store_ai_overview(db: Session, row: models.ProductAIOverview) -> None:
+    try:
+        db.merge(row)
+        db.commit()
+    except IntegrityError:
+        # another worker inserted it between our get and insert; now it's an update
+        db.rollback()
+        db.merge(row)
+        db.commit()
+
+
+def _get_overview(db: Session, product_id: UUID) -> models.ProductAIOverview | None:
+    return db.get(models.ProductAIOverview, product_id)
+
+
+def is_current(row: models.ProductAIOverview | None, input_hash: str) -> bool:
+    """
+    Complete and generated from exactly these inputs, prompt version and model.
+    """
+    return bool(row and row.overview and row.suggested_questions and row.input_hash == input_hash)
+
+
+def _load_current_overview(product_id: UUID, input_hash: str) -> tuple[str, list[str]] | None:
+    db = SessionLocal()
+    try:
+        existing = db.get(models.ProductAIOverview, product_id)
+        if is_current(existing, input_hash):
+            return existing.overview, existing.suggested_questions
+        return None
+    finally:
+        db.close()
+
 
+def _try_acquire_lease(product_id: UUID, token: str) -> bool:
+    """
+    Claims the product's lease row for `token` unless another caller holds
+    an unexpired one. One short transaction.
+    """
+    now = datetime.now(timezone.utc)
+    table = models.ProductAIOverviewLease.__table__
+    with engine.begin() as conn:
+        stmt = dialect_insert(conn)(table).values(
+            product_id=product_id, holder=token, expires_at=now + timedelta(seconds=LEASE_TTL_SECONDS)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["product_id"],
+            set_={"holder": stmt.excluded.holder, "expires_at": stmt.excluded.expires_at},
+            where=table.c.expires_at < now,
+        )
+        conn.execute(stmt)
+        holder = conn.scalar(select(table.c.holder).where(table.c.product_id == product_id))
+    return holder == token
 
 
-def get_or_generate_ai_overview(
+def _release_lease(product_id: UUID, token: str) -> None:
+    # only our own lease: after an expiry another caller may hold it
+    table = models.ProductAIOverviewLease.__table__
+    with engine.begin() as conn:
+        conn.execute(delete(table).where(table.c.product_id == product_id, table.c.holder == token))
+
+
+@asynccontextmanager
+async def _generation_lease(product_id: UUID):
+    """
+    Cross-worker lease: a product_ai_overview_leases row, so the holder
+    keeps no connection checked out while the LLM runs. Waiters poll every
+    LEASE_POLL_SECONDS until the holder has stored its row and released,
+    then find it cached; after LEASE_TIMEOUT_MS (or if the lease table is
+    unavailable) they generate without it.
+    """
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + LEASE_TIMEOUT_MS / 1000
+    held = False
+    try:
+        while not (held := await asyncio.to_thread(_try_acquire_lease, product_id, token)):
+            if time.monotonic() >= deadline:
+                print(f"AI overview lease for {product_id} timed out, generating without it")
+                break
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+    except DBAPIError as e:
+        print(f"AI overview lease for {product_id} unavailable, generating without it: {e.__class__.__name__}")
+    try:
+        yield
+    finally:
+        if held:
+            await asyncio.to_thread(_release_lease, product_id, token)
+
+
+async def _generate_ai_overview(
+    product_id: UUID,
+    raw_json: dict,
+    attrs_dict: dict,
+    input_hash: str,
+    existing_overview: str | None,
+) -> tuple[str, list[str]]:
+    async with _generation_lease(product_id):
+        # whoever held the lease before us may have just written it
+        cached = await asyncio.to_thread(_load_current_overview, product_id, input_hash)
+        if cached:
+            return cached
+
+        # Generate missing pieces; overview and questions are independent calls, so
+        # a cold miss costs one LLM round-trip instead of two
+        if existing_overview:
+            overview = existing_overview
+            questions = await generate_suggested_questions(raw_json, attrs_dict)
+        else:
+            overview, questions = await asyncio.gather(
+                generate_short_overview(raw_json, attrs_dict),
+                generate_suggested_questions(raw_json, attrs_dict),
+            )
+
+        row = models.ProductAIOverview(
+            product_id=product_id,
+            overview=overview,
+            suggested_questions=questions,
+            model=MODEL,
+            prompt_version=PROMPT_VERSION,
+            input_hash=input_hash,
+        )
+        db = SessionLocal()
+        try:
+            await asyncio.to_thread(store_ai_overview, db, row)
+        finally:
+            db.close()
+
+    # answer the suggested questions in the background so clicking one is a DB read
+    schedule_preanswer(product_id, overview, questions, raw_json, attrs_dict)
+    return overview, questions
+
+
+async def get_or_generate_ai_overview(
     db: Session,
     product: models.ProductRaw,
     attrs: models.ProductAttributes | None,
 ) -> tuple[str, list[str]]:
-    existing = db.get(models.ProductAIOverview, product.id)
+    """
+    Cached overview + questions, generating whatever is missing or stale.
+    A row is reused only while its input_hash matches the current facts,
+    prompts, PROMPT_VERSION and MODEL, so a catalog re-sync costs LLM calls
+    only for products whose prompt inputs actually changed. Database work
+    runs off the event loop (worker thread or AsyncSession) so the loop is
+    only ever waiting on the LLM.
+
+    Concurrent misses for the same product are coalesced: one generation
+    runs per process (and, through the lease row, per database) and every
+    other caller awaits its result.
+    """
+    # a storefront read like the product lookup (AsyncSession with
+    # USE_ASYNC_DB); either way no pooled connection is held while waiting
+    # on the LLM or on another caller's generation
+    existing = await storefront_read(db, _get_overview, product.id)
 
-    # If cached and complete, return both
-    if existing and existing.overview and existing.suggested_questions:
+    raw_json = product.raw_json or {}
+    attrs_dict = attrs_to_dict(attrs)
+    input_hash = overview_input_hash(raw_json, attrs_dict)
+
+    # If cached, complete and generated from these inputs, return both
+    if is_current(existing, input_hash):
         return existing.overview, (existing.suggested_questions or [])
 
-    attrs_dict = {}
-    if attrs:
-        attrs_dict = {
-            "category": attrs.category,
-            "style": attrs.style,
-            "warmth_level": attrs.warmth_level,
-            "fit": attrs.fit,
-            "material_main": attrs.material_main,
-            "price_band": attrs.price_band,
-            "primary_use": attrs.primary_use,
-            "extra_metadata": attrs.extra_metadata,
-        }
-
-    # Generate missing pieces
-    overview = existing.overview if (existing and existing.overview) else generate_short_overview(product.raw_json or {}, attrs_dict)
-    questions = generate_suggested_questions(product.raw_json or {}, attrs_dict)
-
-    row = models.ProductAIOverview(
-        product_id=product.id,
-        overview=overview,
-        suggested_questions=questions,
-        model=MODEL,
-    )
-    db.merge(row)
-    db.commit()
+    # Same inputs but questions missing: keep the overview, generate questions only
+    existing_overview = existing.overview if (existing and existing.input_hash == input_hash) else None
 
-    return overview, questions
+    key = (product.id, input_hash)
+    task = _inflight.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.create_task(
+            _generate_ai_overview(product.id, raw_json, attrs_dict, input_hash, existing_overview)
+        )
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+
+    # shield: one caller disconnecting must not cancel the generation the others are waiting on
+    return await asyncio.shield(task)
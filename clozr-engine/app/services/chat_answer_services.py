@@ -0,0 +1,361 @@
+# app/services/chat_answer_services.py
+"""
+Per-product answer cache for /shopify/products/chat.
+
+Shoppers keep asking the same few things ("what size should I get?", "how do
+I wash it?"). Answers are stored in product_chat_answers against the hash of
+the product's chat prompt context and looked up before calling the LLM:
+
+1. exact match on the normalized question (lower-cased alphanumeric tokens);
+2. otherwise the most similar stored question by cosine similarity of a
+   locally computed hashed bag-of-words embedding (content words plus their
+   character trigrams), if it clears CHAT_SIMILARITY_THRESHOLD and both
+   questions have the same content words (stemmed, so "washing" ~ "wash";
+   negations and numbers included). Wording may differ ("which size should
+   I order?" ~ "what size should I get?"), substance may not: "on high
+   heat?" never matches "on low heat?", nor "200 pounds" "150 pounds", nor
+   "is it washable?" "is it not washable?".
+
+Answers generated from other facts, prompts or models (a different
+context hash) are never served and are dropped when a new answer is stored.
+The suggested questions are answered right after an overview is generated,
+so clicking one is a database read rather than an LLM call.
+
+The client-supplied initial_overview is part of the LLM prompt but not of
+the answer key: it is generated from the same product facts the context
+hash covers, so an answer stored under one overview is served whatever
+overview a later request sends.
+"""
+import asyncio
+import hashlib
+import math
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import SessionLocal
+from app.services.openai_overview import (
+    CHAT_FALLBACK_RESPONSE,
+    build_chat_context,
+    chat_context_hash,
+    generate_chat_response,
+    stream_chat_response,
+)
+from app.text_utils import tokenize
+
+CHAT_SIMILARITY_THRESHOLD = float(os.getenv("CHAT_SIMILARITY_THRESHOLD", "0.85"))
+PREANSWER_SUGGESTED_QUESTIONS = os.getenv("PREANSWER_SUGGESTED_QUESTIONS", "1") == "1"
+EMBEDDING_BUCKETS = 1 << 16
+# similarity search only looks at the newest answers of a product
+MAX_ANSWERS_PER_PRODUCT = 200
+
+# Words that carry no meaning for matching questions about a product.
+# Negations ("not", "without") are deliberately kept: content words must
+# agree exactly for a similarity match (see _content_words).
+_STOPWORDS = frozenset(
+    "a an and any are as at be buy can could do does for from get go have how i if "
+    "in is it its me my of on or order pick choose should so that the there this "
+    "to was what which will with would you your".split()
+)
+_TRIGRAM_WEIGHT = 0.5
+
+# "isn't" tokenizes to "isn", "t"
+_NEGATED_CONTRACTIONS = frozenset(
+    "isn aren wasn weren doesn don didn won wouldn can couldn shouldn hasn haven hadn ain mustn needn".split()
+)
+
+# background pre-answer tasks, kept referenced until they finish
+_background: set[asyncio.Task] = set()
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(tokenize(question))
+
+
+def question_hash(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _stem(token: str) -> str:
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            return token[: -len(suffix)]
+    return token
+
+
+def _content_words(normalized: str) -> frozenset:
+    """
+    Stemmed non-stopword tokens of a normalized question, numbers included;
+    negated contractions ("isn't") count as "not", other single letters
+    ("it's") are dropped.
+    """
+    tokens = normalized.split()
+    found = set()
+    for i, token in enumerate(tokens):
+        if token in _NEGATED_CONTRACTIONS and tokens[i + 1 : i + 2] == ["t"]:
+            found.add("not")
+        elif token not in _STOPWORDS and (len(token) > 1 or token.isdigit()):
+            found.add(_stem(token))
+    return frozenset(found)
+
+
+def _bucket(feature: str) -> int:
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") % EMBEDDING_BUCKETS
+
+
+def embed_question(normalized: str) -> list[list[float]]:
+    """
+    Sparse, L2-normalized [[bucket, weight], ...] embedding of a normalized
+    question; empty when it has no content words.
+    """
+    weights: dict[int, float] = defaultdict(float)
+    for token in normalized.split():
+        if token in _STOPWORDS:
+            continue
+        word = _stem(token)
+        weights[_bucket(f"w:{word}")] += 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            weights[_bucket(f"c:{padded[i:i + 3]}")] += _TRIGRAM_WEIGHT
+
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    if not norm:
+        return []
+    return [[bucket, w / norm] for bucket, w in sorted(weights.items())]
+
+
+def cosine(a: Iterable, b: Iterable) -> float:
+    # both vectors are already unit length
+    a_weights = {int(bucket): w for bucket, w in a}
+    return sum(a_weights.get(int(bucket), 0.0) * w for bucket, w in b)
+
+
+def question_similarity(a: str, b: str) -> float:
+    """
+    Cosine similarity of two normalized questions; 0.0 when their content
+    words differ, however close the wording.
+    """
+    if _content_words(a) != _content_words(b):
+        return 0.0
+    return cosine(embed_question(a), embed_question(b))
+
+
+def find_cached_answer(db: Session, product_id: UUID, input_hash: str, question: str) -> Optional[str]:
+    normalized = normalize_question(question)
+    if not normalized:
+        return None
+
+    exact = (
+        db.query(models.ProductChatAnswer.answer)
+        .filter_by(product_id=product_id, input_hash=input_hash, question_hash=question_hash(normalized))
+        .first()
+    )
+    if exact:
+        return exact.answer
+
+    embedding = embed_question(normalized)
+    if not embedding:
+        return None
+
+    content_words = _content_words(normalized)
+    candidates = (
+        db.query(models.ProductChatAnswer.question, models.ProductChatAnswer.embedding, models.ProductChatAnswer.answer)
+        .filter_by(product_id=product_id, input_hash=input_hash)
+        .order_by(models.ProductChatAnswer.created_at.desc())
+        .limit(MAX_ANSWERS_PER_PRODUCT)
+        .all()
+    )
+    best_score, best_answer = 0.0, None
+    for row in candidates:
+        if _content_words(row.question) != content_words:
+            continue
+        score = cosine(embedding, row.embedding)
+        if score > best_score:
+            best_score, best_answer = score, row.answer
+    return best_answer if best_score >= CHAT_SIMILARITY_THRESHOLD else None
+
+
+def store_answer(
+    db: Session,
+    product_id: UUID,
+    input_hash: str,
+    question: str,
+    answer: str,
+    source: str = "chat",
+) -> None:
+    normalized = normalize_question(question)
+    if not normalized or not answer or answer == CHAT_FALLBACK_RESPONSE:
+        return
+
+    # answers about the product's previous facts can never be served again
+    db.query(models.ProductChatAnswer).filter(
+        models.ProductChatAnswer.product_id == product_id,
+        models.ProductChatAnswer.input_hash != input_hash,
+    ).delete(synchronize_session=False)
+    db.add(
+        models.ProductChatAnswer(
+            product_id=product_id,
+            input_hash=input_hash,
+            question=normalized,
+            question_hash=question_hash(normalized),
+            embedding=embed_question(normalized),
+            answer=answer,
+            source=source,
+        )
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        # another worker answered the same question first; theirs is as good
+        db.rollback()
+
+
+def _find_and_release(product_id: UUID, input_hash: str, question: str) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        return find_cached_answer(db, product_id, input_hash, question)
+    finally:
+        db.close()
+
+
+def _store_and_release(product_id: UUID, input_hash: str, question: str, answer: str, source: str) -> None:
+    db = SessionLocal()
+    try:
+        store_answer(db, product_id, input_hash, question, answer, source)
+    finally:
+        db.close()
+
+
+async def answer_product_question(
+    product_id: UUID,
+    context_hash: str,
+    product_context: str,
+    shop_domain: str,
+    shop_product_id: str,
+    initial_overview: str,
+    question: str,
+) -> str:
+    """
+    Stored answer for this (or a near-identical) question, else a fresh LLM
+    answer that is stored for the next shopper. initial_overview only feeds
+    the prompt of a fresh answer (see the module docstring).
+    """
+    cached = await asyncio.to_thread(_find_and_release, product_id, context_hash, question)
+    if cached is not None:
+        return cached
+
+    answer = await generate_chat_response(
+        product_id=shop_product_id,
+        shop_domain=shop_domain,
+        initial_overview=initial_overview,
+        question=question,
+        product_context=product_context,
+    )
+    await asyncio.to_thread(_store_and_release, product_id, context_hash, question, answer, "chat")
+    return answer
+
+
+async def stream_product_answer(
+    product_id: UUID,
+    context_hash: str,
+    product_context: str,
+    initial_overview: str,
+    question: str,
+) -> AsyncIterator[str]:
+    """
+    Streaming answer_product_question: a stored answer is yielded in one
+    piece, otherwise model deltas are passed through as they arrive and the
+    full answer is stored once the stream completes.
+    """
+    cached = await asyncio.to_thread(_find_and_release, product_id, context_hash, question)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async for delta in stream_chat_response(initial_overview, question, product_context):
+        parts.append(delta)
+        yield delta
+    await asyncio.to_thread(_store_and_release, product_id, context_hash, question, "".join(parts).strip(), "chat")
+
+
+def _unanswered(product_id: UUID, input_hash: str, questions: list[str]) -> list[str]:
+    db = SessionLocal()
+    try:
+        hashes = {question_hash(normalize_question(q)): q for q in questions}
+        answered = {
+            row.question_hash
+            for row in db.query(models.ProductChatAnswer.question_hash)
+            .filter_by(product_id=product_id, input_hash=input_hash)
+            .filter(models.ProductChatAnswer.question_hash.in_(list(hashes)))
+        }
+        return [q for h, q in hashes.items() if h not in answered]
+    finally:
+        db.close()
+
+
+async def preanswer_suggested_questions(
+    product_id: UUID,
+    overview: str,
+    questions: list[str],
+    raw_json: dict,
+    attrs: dict,
+) -> int:
+    """
+    Answers the suggested questions that have no stored answer yet.
+    Returns how many were answered.
+    """
+    # same context ingest stored for the product, so chat lookups match these answers
+    product_context = build_chat_context(raw_json, attrs)
+    context_hash = chat_context_hash(product_context)
+    todo = await asyncio.to_thread(_unanswered, product_id, context_hash, questions)
+    shop_product_id = str(raw_json.get("id", ""))
+    answers = await asyncio.gather(
+        *(
+            generate_chat_response(
+                product_id=shop_product_id,
+                shop_domain="",
+                initial_overview=overview,
+                question=q,
+                product_context=product_context,
+            )
+            for q in todo
+        )
+    )
+    stored = 0
+    for question, answer in zip(todo, answers):
+        if answer and answer != CHAT_FALLBACK_RESPONSE:
+            await asyncio.to_thread(_store_and_release, product_id, context_hash, question, answer, "suggested")
+            stored += 1
+    return stored
+
+
+def schedule_preanswer(
+    product_id: UUID,
+    overview: str,
+    questions: list[str],
+    raw_json: dict,
+    attrs: dict,
+) -> None:
+    """
+    Fire-and-forget preanswer_suggested_questions, so the summary response
+    that triggered the generation isn't held up by it.
+    """
+    if not PREANSWER_SUGGESTED_QUESTIONS or not questions:
+        return
+
+    async def run():
+        try:
+            await preanswer_suggested_questions(product_id, overview, questions, raw_json, attrs)
+        except Exception as e:
+            print(f"Pre-answering suggested questions for {product_id} failed: {e.__class__.__name__}: {e}")
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
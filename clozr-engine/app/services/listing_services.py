@@ -0,0 +1,63 @@
+# app/services/listing_services.py
+"""
+Product read model for list/search responses (product_listings).
+
+GET /products and /products/search only show id, shop_product_id, title,
+category and primary_use, but reading them from products_raw +
+product_attributes loads and deserializes every row's raw Shopify JSON.
+Ingest and re-enrichment write one compact product_listings row per
+product in the same transaction, so those endpoints read narrow rows and
+never touch raw_json.
+"""
+from datetime import datetime
+from typing import Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import func
+
+from app import models
+from app.attributes import min_variant_price
+from app.db import dialect_insert
+
+LISTING_COLUMNS = ("merchant_id", "shop_product_id", "title", "category", "primary_use", "price", "created_at")
+
+
+def listing_row(
+    product_id: UUID,
+    merchant_id: UUID,
+    shop_product_id: str,
+    created_at: Optional[datetime],
+    raw_json: dict,
+    attrs: dict,
+) -> dict:
+    return {
+        "id": product_id,
+        "merchant_id": merchant_id,
+        "shop_product_id": str(shop_product_id),
+        "title": raw_json.get("title"),
+        "category": attrs.get("category"),
+        "primary_use": attrs.get("primary_use"),
+        "price": min_variant_price(raw_json),
+        # the product's own created_at, so listing order and cursors match
+        # the catalog's
+        "created_at": created_at,
+    }
+
+
+def upsert_listings(db, rows: Iterable[dict]) -> None:
+    """
+    Insert or refresh listing_row() rows, keyed on the product id. Takes a
+    Session or Connection and leaves the commit to the caller.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    stmt = dialect_insert(db)(models.ProductListing.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={
+            **{c: stmt.excluded[c] for c in LISTING_COLUMNS},
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt, rows)
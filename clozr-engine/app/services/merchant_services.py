@@ -0,0 +1,139 @@
+# app/services/merchant_services.py
+"""
+shop_domain -> merchant_id resolution without a merchants query per request.
+
+Merchant ids never change once created, so resolved ids are cached for the
+life of the process. Unknown domains are cached too, for
+MERCHANT_NEGATIVE_TTL_SECONDS, so storefront traffic for a shop that was
+never ingested (or a typo'd domain) doesn't hit the database on every call;
+creating the merchant clears its negative entry in this process once the
+creating transaction commits, and in other processes when the TTL runs out.
+
+Creation is an INSERT ... ON CONFLICT DO NOTHING followed by a read, so two
+workers ingesting a new shop at once both end up with the same row instead
+of one failing on the unique constraint. It runs in the caller's
+transaction; the new id is only cached after that transaction commits.
+"""
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import dialect_insert
+
+MERCHANT_NEGATIVE_TTL_SECONDS = float(os.getenv("MERCHANT_NEGATIVE_TTL_SECONDS", "30"))
+
+
+class MerchantCache:
+    def __init__(self, negative_ttl_seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._ids: dict[str, UUID] = {}
+        self._missing: dict[str, float] = {}  # shop_domain -> expires_at
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def lookup(self, shop_domain: str) -> tuple[bool, Optional[UUID]]:
+        """
+        (known, merchant_id): known=False means ask the database.
+        """
+        with self._lock:
+            merchant_id = self._ids.get(shop_domain)
+            if merchant_id is not None:
+                self.hits += 1
+                return True, merchant_id
+            expires_at = self._missing.get(shop_domain)
+            if expires_at is not None:
+                if expires_at > self._clock():
+                    self.negative_hits += 1
+                    return True, None
+                del self._missing[shop_domain]
+            self.misses += 1
+            return False, None
+
+    def store(self, shop_domain: str, merchant_id: Optional[UUID]) -> None:
+        with self._lock:
+            if merchant_id is None:
+                self._missing[shop_domain] = self._clock() + self.negative_ttl_seconds
+            else:
+                self._ids[shop_domain] = merchant_id
+                self._missing.pop(shop_domain, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids.clear()
+            self._missing.clear()
+            self.hits = self.negative_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "merchants": len(self._ids),
+                "missing": len(self._missing),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+            }
+
+
+merchant_cache = MerchantCache(MERCHANT_NEGATIVE_TTL_SECONDS)
+
+
+def reset_merchant_cache() -> None:
+    """
+    Forget every cached resolution (tests, or after merchants were deleted).
+    """
+    merchant_cache.clear()
+
+
+def resolve_merchant_id(db: Session, shop_domain: str) -> Optional[UUID]:
+    known, merchant_id = merchant_cache.lookup(shop_domain)
+    if known:
+        return merchant_id
+    row = db.query(models.Merchant.id).filter_by(shop_domain=shop_domain).first()
+    merchant_id = row.id if row else None
+    merchant_cache.store(shop_domain, merchant_id)
+    return merchant_id
+
+
+# session.info key: {shop_domain: merchant_id} created in the open transaction
+_PENDING_KEY = "created_merchants"
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_merchants(session: Session) -> None:
+    for shop_domain, merchant_id in session.info.pop(_PENDING_KEY, {}).items():
+        merchant_cache.store(shop_domain, merchant_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back_merchants(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def get_or_create_merchant_id(db: Session, shop_domain: str) -> UUID:
+    """
+    Merchant id for shop_domain, inserting the merchant if needed. The insert
+    is part of the caller's transaction and is not committed here.
+    """
+    _, merchant_id = merchant_cache.lookup(shop_domain)
+    if merchant_id is not None:
+        return merchant_id
+
+    db.execute(
+        dialect_insert(db)(models.Merchant.__table__)
+        .values(id=uuid.uuid4(), shop_domain=shop_domain)
+        .on_conflict_do_nothing(index_elements=["shop_domain"])
+    )
+    # ours or the row a concurrent worker inserted first
+    merchant_id = db.query(models.Merchant.id).filter_by(shop_domain=shop_domain).one().id
+    db.info.setdefault(_PENDING_KEY, {})[shop_domain] = merchant_id
+    return merchant_id
@@ -1,45 +1,100 @@
+import asyncio
+import hashlib
 import os
-from openai import OpenAI
+from typing import AsyncIterator
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
 from app.prompts.render_overview_prompt import render_overview_system_prompt
+from app.prompts.product_facts import (
+    CHAT_FACT_TOKENS,
+    OVERVIEW_FACT_TOKENS,
+    QUESTIONS_FACT_TOKENS,
+    extract_product_facts,
+    facts_json,
+)
 import json
 
 
 
+# Checked when the first client is built, not on import: ingest, migrations
+# and the CLIs import this module (prompt rendering / hashing) without a key.
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise RuntimeError("OPENAI_API_KEY is not set")
-client = OpenAI(api_key=OPENAI_API_KEY)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. a local stub server for load tests
 
 MODEL = os.getenv("OPENAI_OVERVIEW_MODEL", "gpt-4o-mini")
 
+# Max LLM calls in flight per process; extra callers wait on the semaphore
+# instead of piling up sockets against the rate limit.
+LLM_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
 
 
-PROMPT_VERSION = "v1.0"
 
+PROMPT_VERSION = "v1.1"
 
 
-def generate_short_overview(raw_json: dict, attrs: dict | None) -> str:
-    raw_json = raw_json or {}
-    attrs = attrs or {}
+class _AsyncLLMState:
+    """
+    One AsyncOpenAI client (and its keep-alive connection pool) plus one
+    semaphore per event loop. uvicorn runs a single loop per worker, so in
+    practice this is created once per process.
+    """
 
-    title = raw_json.get("title", "") or ""
-    vendor = raw_json.get("vendor", "") or ""
-    product_type = raw_json.get("product_type", "") or ""
-    body = (raw_json.get("body_html", "") or "")[:1200]
-    variants = raw_json.get("variants") or []
+    def __init__(self) -> None:
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.client: AsyncOpenAI | None = None
+        self.semaphore: asyncio.Semaphore | None = None
 
-    v0 = variants[0] if variants else {}
-    price = v0.get("price")
-    variant_title = v0.get("title")
 
-    facts = {
-        "title": title,
-        "vendor": vendor,
-        "product_type": product_type,
-        "description": body,
-        "example_variant": {"title": variant_title, "price": price},
-        "inferred_attributes": attrs,
-    }
+_llm = _AsyncLLMState()
+
+
+def get_async_client() -> tuple[AsyncOpenAI, asyncio.Semaphore]:
+    loop = asyncio.get_running_loop()
+    if _llm.loop is not loop:
+        if not OPENAI_API_KEY:
+            raise RuntimeError("OPENAI_API_KEY is not set")
+        _llm.client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            timeout=Timeout(LLM_TIMEOUT_SECONDS, connect=5.0),
+            max_retries=LLM_MAX_RETRIES,
+            http_client=DefaultAsyncHttpxClient(),
+        )
+        _llm.semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        _llm.loop = loop
+    return _llm.client, _llm.semaphore
+
+
+async def close_async_client() -> None:
+    if _llm.client is not None:
+        await _llm.client.close()
+    _llm.loop = _llm.client = _llm.semaphore = None
+
+
+async def _create_response(input: list[dict], temperature: float):
+    client, semaphore = get_async_client()
+    async with semaphore:
+        return await client.responses.create(model=MODEL, input=input, temperature=temperature)
+
+
+OVERVIEW_TEMPERATURE = 0.2
+QUESTIONS_TEMPERATURE = 0.2
+
+CHAT_TEMPERATURE = 0.3
+# bump when build_chat_context / build_chat_input change; stored chat answers are keyed on it
+CHAT_PROMPT_VERSION = "chat-v3"
+
+CHAT_FALLBACK_RESPONSE = "I apologize, but I'm having trouble processing your question right now. Please try again in a moment."
+
+SUGGESTED_QUESTIONS_FALLBACK = [
+    "What size/fit should I choose?",
+    "What materials is this made from and how do I care for it?",
+]
+
+
+def build_overview_input(raw_json: dict, attrs: dict | None) -> list[dict]:
+    facts = extract_product_facts(raw_json, attrs, OVERVIEW_FACT_TOKENS)
 
     # system = (
     #     "You are CLOZR. Write a customer-friendly overview paragraph for a product page. "
@@ -50,19 +105,22 @@ def generate_short_overview(raw_json: dict, attrs: dict | None) -> str:
     system_prompt = render_overview_system_prompt()
 
     user_message = f"""FACTS:
-{json.dumps(facts, indent=2)}
+{facts_json(facts)}
 
 Select ONE concrete, product-specific fact from the above data.
 Write a 1-sentence overview (15-25 words) that highlights this fact.
 Use simple, neutral language. No marketing words."""
 
-    resp = client.responses.create(
-        model=MODEL,
-        input=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message},
-        ],
-        temperature=0.2,
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message},
+    ]
+
+
+async def generate_short_overview(raw_json: dict, attrs: dict | None) -> str:
+    resp = await _create_response(
+        input=build_overview_input(raw_json, attrs),
+        temperature=OVERVIEW_TEMPERATURE,
     )
 
     text = (resp.output_text or "").strip()
@@ -70,43 +128,24 @@ Use simple, neutral language. No marketing words."""
     return text
 
 
-def generate_chat_response(
-    product_id: str,
-    shop_domain: str,
-    initial_overview: str,
-    question: str,
-    raw_json: dict | None = None,
-    attrs: dict | None = None,
-) -> str:
+def build_chat_context(raw_json: dict | None, attrs: dict | None) -> str:
     """
-    Generate a product-aware chat response using LLM.
-    Context includes the initial overview and product details.
-    """
-    raw_json = raw_json or {}
-    attrs = attrs or {}
-
-    title = raw_json.get("title", "") or ""
-    vendor = raw_json.get("vendor", "") or ""
-    product_type = raw_json.get("product_type", "") or ""
-    tags = raw_json.get("tags", "") or ""
-    body = (raw_json.get("body_html", "") or "")[:800]  # Shorter for chat context
-    variants = raw_json.get("variants") or []
-
-    v0 = variants[0] if variants else {}
-    price = v0.get("price")
-    variant_title = v0.get("title")
-
-    # Build product context
-    product_context = {
-        "title": title,
-        "vendor": vendor,
-        "product_type": product_type,
-        "tags": tags,
-        "description": body,
-        "example_variant": {"title": variant_title, "price": price},
-        "inferred_attributes": attrs,
-    }
+    The "Product Context" block of the chat prompt, rendered once per product
+    on ingest (see prompt_context_services) rather than on every question.
+    """
+    return facts_json(extract_product_facts(raw_json, attrs, CHAT_FACT_TOKENS, include_tags=True))
+
 
+def chat_context_hash(product_context: str) -> str:
+    """
+    Fingerprint of a rendered chat context plus the chat prompt version and
+    model; stored chat answers are only reused while it matches.
+    """
+    encoded = f"{CHAT_PROMPT_VERSION}\n{MODEL}\n{product_context}"
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def build_chat_input(initial_overview: str, question: str, product_context: str) -> list[dict]:
     system = (
         "You are CLOZR, a helpful product assistant for an ecommerce store. "
         "Answer the customer's question about the product based on the provided context. "
@@ -122,15 +161,32 @@ def generate_chat_response(
         f"Answer the customer's question about this product."
     )
 
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user_message},
+    ]
+
+
+async def generate_chat_response(
+    product_id: str,
+    shop_domain: str,
+    initial_overview: str,
+    question: str,
+    raw_json: dict | None = None,
+    attrs: dict | None = None,
+    product_context: str | None = None,
+) -> str:
+    """
+    Generate a product-aware chat response using LLM.
+    Context includes the initial overview and product details: the
+    precomputed product_context when given, else built from raw_json/attrs.
+    """
+    if product_context is None:
+        product_context = build_chat_context(raw_json, attrs)
     try:
-        # Use the same API pattern as generate_short_overview
-        resp = client.responses.create(
-            model=MODEL,
-            input=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_message},
-            ],
-            temperature=0.3,
+        resp = await _create_response(
+            input=build_chat_input(initial_overview, question, product_context),
+            temperature=CHAT_TEMPERATURE,
         )
 
         text = (resp.output_text or "").strip()
@@ -142,41 +198,47 @@ def generate_chat_response(
         print(f"Error in generate_chat_response: {str(e)}")
         print(traceback.format_exc())
         # Fallback response if LLM fails
-        return f"I apologize, but I'm having trouble processing your question right now. Please try again in a moment."  # noqa: F541
-    
+        return CHAT_FALLBACK_RESPONSE
 
-def generate_suggested_questions(raw_json: dict, attrs: dict | None) -> list[str]:
-
-    raw_json = raw_json or {}
-    attrs = attrs or {}
-
-    title = raw_json.get("title", "") or ""
-    vendor = raw_json.get("vendor", "") or ""
-    product_type = raw_json.get("product_type", "") or ""
-    body = (raw_json.get("body_html", "") or "")[:900]
-    tags = raw_json.get("tags", "") or ""
-    variants = raw_json.get("variants") or []
-    options = raw_json.get("options") or []
-
-    v0 = variants[0] if variants else {}
-    price = v0.get("price")
-    variant_title = v0.get("title")
-
-    facts = {
-        "title": title,
-        "vendor": vendor,
-        "product_type": product_type,
-        "tags": tags,
-        "description": body,
-        "options": options,
-        "example_variant": {"title": variant_title, "price": price},
-        "inferred_attributes": attrs,
-    }
 
-    fallback = [
-        "What size/fit should I choose?",
-        "What materials is this made from and how do I care for it?",
-    ]
+async def stream_chat_response(
+    initial_overview: str,
+    question: str,
+    product_context: str,
+) -> AsyncIterator[str]:
+    """
+    Same prompt as generate_chat_response, but yields text deltas as the
+    model produces them. If the call fails before the first token the
+    fallback answer is yielded instead (as generate_chat_response would
+    return it); a failure mid-answer is raised to the caller.
+    """
+    client, semaphore = get_async_client()
+    sent = False
+    try:
+        # the semaphore is held for the whole stream: it is one LLM call in flight
+        async with semaphore:
+            stream = await client.responses.create(
+                model=MODEL,
+                input=build_chat_input(initial_overview, question, product_context),
+                temperature=CHAT_TEMPERATURE,
+                stream=True,
+            )
+            async with stream:
+                async for event in stream:
+                    if event.type == "response.output_text.delta" and event.delta:
+                        sent = True
+                        yield event.delta
+                    elif event.type in ("response.failed", "error"):
+                        raise RuntimeError(f"LLM stream failed: {event.type}")
+    except Exception as e:
+        print(f"Error in stream_chat_response: {e.__class__.__name__}: {e}")
+        if sent:
+            raise
+        yield CHAT_FALLBACK_RESPONSE
+    
+
+def build_questions_input(raw_json: dict, attrs: dict | None) -> list[dict]:
+    facts = extract_product_facts(raw_json, attrs, QUESTIONS_FACT_TOKENS, include_tags=True, include_options=True)
 
     system = """
 You generate shopper questions for a product page.
@@ -189,32 +251,63 @@ Rules:
 - No bullets, no extra text, no markdown.
 """.strip()
 
-    try:
-        resp = client.responses.create(
-            model=MODEL,
-            input=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": f"FACTS:\n{facts}\n\nReturn the JSON array now."},
-            ],
-            temperature=0.2,
-        )
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": f"FACTS:\n{facts_json(facts)}\n\nReturn the JSON array now."},
+    ]
+
+
+def parse_suggested_questions(raw: str) -> list[str]:
+    """
+    Model output -> exactly 2 questions, topped up from the fallback.
+    Raises ValueError if the output is not a JSON array.
+    """
+    fallback = SUGGESTED_QUESTIONS_FALLBACK
+    raw = (raw or "").strip()
+    if not raw:
+        return list(fallback)
 
-        raw = (resp.output_text or "").strip()
-        if not raw:
-            return fallback
+    questions = json.loads(raw)
 
-        questions = json.loads(raw)
+    if not isinstance(questions, list):
+        raise ValueError("suggested questions output is not a JSON array")
 
-        if not isinstance(questions, list):
-            return fallback
+    questions = [q.strip() for q in questions if isinstance(q, str) and q.strip()]
+    if len(questions) < 2:
+        questions += [q for q in fallback if q not in questions]
+    return questions[:2]
 
-        questions = [q.strip() for q in questions if isinstance(q, str) and q.strip()]
-        if len(questions) < 2:
-            questions += [q for q in fallback if q not in questions]
-        return questions[:2]
+
+async def generate_suggested_questions(raw_json: dict, attrs: dict | None, strict: bool = False) -> list[str]:
+    """
+    strict=True raises on LLM / parse errors instead of returning the
+    generic fallback (batch jobs retry rather than store the fallback).
+    """
+    try:
+        resp = await _create_response(
+            input=build_questions_input(raw_json, attrs),
+            temperature=QUESTIONS_TEMPERATURE,
+        )
+        return parse_suggested_questions(resp.output_text)
 
     except Exception as e:
+        if strict:
+            raise
         print("QUESTION GEN ERROR:", repr(e))
-        return fallback
+        return list(SUGGESTED_QUESTIONS_FALLBACK)
 
 
+def overview_input_hash(raw_json: dict, attrs: dict | None) -> str:
+    """
+    Fingerprint of everything the overview + questions calls send to the
+    model. Unchanged hash -> the cached generation is still valid, even if
+    raw_json changed in fields the prompts don't use.
+    """
+    payload = {
+        "prompt_version": PROMPT_VERSION,
+        "model": MODEL,
+        "overview": build_overview_input(raw_json, attrs),
+        "questions": build_questions_input(raw_json, attrs),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
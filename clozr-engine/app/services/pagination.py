@@ -0,0 +1,76 @@
+# app/services/pagination.py
+"""
+Opaque keyset cursors.
+
+A cursor is the sort key of the last row on a page, tagged with the kind of
+ordering it belongs to, JSON-encoded and base64url'd. Clients treat it as an
+opaque string and send it back as ?cursor=... to get the next page.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List
+from uuid import UUID
+
+# Cursor kinds
+CREATED = "c"  # (created_at, id) – catalog order
+RANKED = "r"   # (score, id)      – search relevance order
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def encode_cursor(kind: str, *values: Any) -> str:
+    payload = json.dumps([kind, *(_to_json(v) for v in values)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str) -> List[Any]:
+    """
+    Returns the raw sort-key values; raises InvalidCursor for anything that
+    was not produced by encode_cursor with the same kind.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+    if not isinstance(payload, list) or not payload or payload[0] != kind:
+        raise InvalidCursor("Cursor does not belong to this listing")
+    return payload[1:]
+
+
+def encode_created_cursor(created_at: datetime, product_id: UUID) -> str:
+    return encode_cursor(CREATED, created_at, product_id)
+
+
+def decode_created_cursor(cursor: str) -> tuple[datetime, UUID]:
+    values = decode_cursor(cursor, CREATED)
+    try:
+        created_at, product_id = values
+        return datetime.fromisoformat(created_at), UUID(product_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+
+def encode_ranked_cursor(score: float, product_id: UUID) -> str:
+    return encode_cursor(RANKED, float(score), product_id)
+
+
+def decode_ranked_cursor(cursor: str) -> tuple[float, UUID]:
+    values = decode_cursor(cursor, RANKED)
+    try:
+        score, product_id = values
+        return float(score), UUID(product_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
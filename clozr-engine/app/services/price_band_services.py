@@ -0,0 +1,98 @@
+# app/services/price_band_services.py
+"""
+Per-merchant price_band thresholds.
+
+A product's band ("$", "$$", "$$$") depends on where its lowest variant
+price sits in its own merchant's catalog: at or under the 33rd percentile
+is "$", at or over the 67th is "$$$". The percentiles are stored in
+merchant_price_bands and recomputed on ingest only once the priced
+products written since outnumber PRICE_BANDS_REFRESH_GROWTH of the
+catalog they came from, so extraction never scans a catalog per product
+or per request. A sync bands all its products against the catalog
+including the whole sync; products ingested before a recompute keep their
+band until the next enrich_all_products run.
+"""
+import math
+import os
+from typing import Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+PRICE_BAND_PERCENTILES = (0.33, 0.67)
+PRICE_BANDS_REFRESH_GROWTH = float(os.getenv("PRICE_BANDS_REFRESH_GROWTH", "0.1"))
+
+
+def _priced_products(merchant_id: UUID):
+    return select(models.ProductRaw.min_price).where(
+        models.ProductRaw.merchant_id == merchant_id,
+        models.ProductRaw.min_price.is_not(None),
+    )
+
+
+def _percentile(db: Session, merchant_id: UUID, count: int, q: float) -> float:
+    # linear interpolation between the two closest ranks; reading them with
+    # OFFSET walks ix_products_raw_merchant_min_price instead of loading
+    # every price
+    position = q * (count - 1)
+    lower = math.floor(position)
+    values = db.scalars(
+        _priced_products(merchant_id).order_by(models.ProductRaw.min_price).offset(lower).limit(2)
+    ).all()
+    if len(values) == 1:
+        return values[0]
+    return values[0] + (values[1] - values[0]) * (position - lower)
+
+
+def compute_price_bands(db: Session, merchant_id: UUID) -> Optional[Tuple[float, float, int]]:
+    """
+    (low_max, high_min, priced product count) from products_raw.min_price,
+    or None when the merchant has no priced products.
+    """
+    count = db.scalar(select(func.count()).select_from(_priced_products(merchant_id).subquery()))
+    if not count:
+        return None
+    low_max, high_min = (_percentile(db, merchant_id, count, q) for q in PRICE_BAND_PERCENTILES)
+    return low_max, high_min, count
+
+
+def ensure_price_bands(
+    db: Session,
+    merchant_id: UUID,
+    changed: int = 0,
+    refresh: bool = False,
+) -> Optional[Tuple[float, float]]:
+    """
+    The merchant's (low_max, high_min) thresholds after `changed` priced
+    products were written. The stored thresholds are kept until the writes
+    since they were computed exceed PRICE_BANDS_REFRESH_GROWTH of the
+    catalog they were computed from, so a steady stream of single-product
+    ingests costs one primary-key read each, not a catalog scan. Does not
+    commit.
+    """
+    bands = db.get(models.MerchantPriceBands, merchant_id)
+    if not refresh:
+        if bands is None and not changed:
+            return None
+        if bands is not None:
+            bands.changes_since = (bands.changes_since or 0) + changed
+            if bands.changes_since <= PRICE_BANDS_REFRESH_GROWTH * bands.product_count:
+                return bands.low_max, bands.high_min
+
+    computed = compute_price_bands(db, merchant_id)
+    if computed is None:
+        if bands is not None:
+            db.delete(bands)
+        return None
+    low_max, high_min, count = computed
+    if bands is None:
+        bands = models.MerchantPriceBands(merchant_id=merchant_id)
+        db.add(bands)
+    bands.low_max, bands.high_min, bands.product_count = low_max, high_min, count
+    bands.changes_since = 0
+    bands.updated_at = func.now()
+    db.flush()
+    return low_max, high_min
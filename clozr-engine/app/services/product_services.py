@@ -1,51 +1,253 @@
 # app/services/product_services.py
+from sqlalchemy import String, cast, func, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Session
 from app import models
-from app.attributes import extract_attributes_from_raw
-from typing import Optional, List, Tuple
+from app.attributes import extract_attributes_batch, min_variant_price
+from app.db import dialect_insert
+from app.services.pagination import (
+    decode_created_cursor,
+    decode_ranked_cursor,
+    encode_created_cursor,
+    encode_ranked_cursor,
+)
+from app.services.listing_services import listing_row, upsert_listings
+from app.services.merchant_services import get_or_create_merchant_id, resolve_merchant_id
+from app.services.price_band_services import ensure_price_bands
+from app.services.prompt_context_services import prompt_context_row, upsert_prompt_contexts
+from app.services.response_cache import invalidate_product_responses
+from app.services.search_services import ranked_search
+from app.text_utils import strip_html
+from typing import Any, Dict, Iterable, NamedTuple, Optional, List, Tuple
 from uuid import UUID
+import uuid
+
+# Rows per multi-VALUES upsert statement (keeps SQLite under its bind-parameter cap)
+UPSERT_CHUNK_SIZE = 1000
+
+ATTRIBUTE_COLUMNS = (
+    "category",
+    "style",
+    "warmth_level",
+    "fit",
+    "material_main",
+    "price_band",
+    "primary_use",
+    "extra_metadata",
+)
 
 
 def get_or_create_merchant(db: Session, shop_domain: str) -> models.Merchant:
-    merchant = db.query(models.Merchant).filter_by(shop_domain=shop_domain).first()
-    if merchant:
-        return merchant
-    merchant = models.Merchant(shop_domain=shop_domain)
-    db.add(merchant)
-    db.commit()
-    db.refresh(merchant)
-    return merchant
+    return db.get(models.Merchant, get_or_create_merchant_id(db, shop_domain))
 
 
-def ingest_product(db: Session, merchant_domain: str, shop_product_id: str, raw_json: dict) -> models.ProductRaw:
-    merchant = get_or_create_merchant(db, merchant_domain)
-    product = models.ProductRaw(
-        merchant_id=merchant.id,
-        shop_product_id=shop_product_id,
-        raw_json=raw_json,
-    )
-    db.add(product)
-    db.commit()
-    db.refresh(product)
-
-    # 2) extract attributes (V0 heuristics; later LLM)
-    attrs = extract_attributes_from_raw(raw_json)
-
-    product_attrs = models.ProductAttributes(
-        product_id=product.id,
-        category=attrs.get("category"),
-        style=attrs.get("style"),
-        warmth_level=attrs.get("warmth_level"),
-        fit=attrs.get("fit"),
-        material_main=attrs.get("material_main"),
-        price_band=attrs.get("price_band"),
-        primary_use=attrs.get("primary_use"),
-        extra_metadata=attrs.get("metadata"),
+def product_columns_from_raw(raw_json: dict) -> dict:
+    """
+    Searchable / filterable columns copied out of the Shopify JSON on ingest.
+    """
+    search_parts = [
+        raw_json.get("product_type") or "",
+        raw_json.get("vendor") or "",
+        strip_html(raw_json.get("body_html")),
+    ]
+    return {
+        "title": raw_json.get("title"),
+        "tags": raw_json.get("tags") or None,
+        "search_text": " ".join(p for p in search_parts if p) or None,
+        "min_price": min_variant_price(raw_json),
+    }
+
+
+def attribute_rows(
+    product_ids: List[UUID],
+    raws: List[dict],
+    price_bands: Optional[List[Optional[Tuple[float, float]]]] = None,
+) -> List[dict]:
+    """
+    product_attributes rows for parallel lists of product ids and raw
+    Shopify JSON, extracted in one batch. price_bands: each product's
+    merchant thresholds (see price_band_services).
+    """
+    columns = extract_attributes_batch(raws, price_bands)
+    return [
+        {"id": uuid.uuid4(), "product_id": product_id, **{c: columns[c][i] for c in ATTRIBUTE_COLUMNS}}
+        for i, product_id in enumerate(product_ids)
+    ]
+
+
+def upsert_attributes(db: Session, rows: Iterable[dict]) -> None:
+    """
+    Insert or refresh product_attributes rows (from attribute_rows()) with
+    one multi-VALUES INSERT ... ON CONFLICT (product_id) DO UPDATE. Does not
+    commit.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    stmt = dialect_insert(db)(models.ProductAttributes.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id"],
+        set_={
+            **{c: stmt.excluded[c] for c in ATTRIBUTE_COLUMNS},
+            "updated_at": func.now(),
+        },
     )
-    db.add(product_attrs)
-    db.commit()
+    db.execute(stmt, rows)
 
-    return product
+
+def bulk_upsert_products(
+    db: Session,
+    merchant_domain: str,
+    products: Iterable[Tuple[str, dict]],
+    chunk_size: int = UPSERT_CHUNK_SIZE,
+) -> Dict[str, UUID]:
+    """
+    Idempotent ingest of many (shop_product_id, raw_json) pairs.
+
+    products_raw, product_attributes, product_prompt_contexts and
+    product_listings are written with INSERT ... ON CONFLICT DO UPDATE,
+    chunk_size rows per round of statements, all inside one transaction
+    (together with the merchants row for a new shop), so a re-sync updates
+    rows in place and a failure leaves nothing half-written. If the same
+    shop_product_id appears twice, the last payload wins.
+
+    Returns {shop_product_id: product_id}.
+    """
+    insert = dialect_insert(db)
+
+    latest: Dict[str, dict] = {}
+    for shop_product_id, raw_json in products:
+        latest[str(shop_product_id)] = raw_json
+
+    # Statements are built once and executed with a list of parameter sets,
+    # so SQLAlchemy compiles them a single time and batches the rows into
+    # multi-VALUES INSERTs ("insertmanyvalues") with RETURNING.
+    raw_table = models.ProductRaw.__table__
+    raw_stmt = insert(raw_table)
+    raw_stmt = raw_stmt.on_conflict_do_update(
+        index_elements=["merchant_id", "shop_product_id"],
+        set_={
+            "raw_json": raw_stmt.excluded.raw_json,
+            "title": raw_stmt.excluded.title,
+            "tags": raw_stmt.excluded.tags,
+            "search_text": raw_stmt.excluded.search_text,
+            "min_price": raw_stmt.excluded.min_price,
+            "updated_at": func.now(),
+        },
+    ).returning(raw_table.c.id, raw_table.c.shop_product_id, raw_table.c.created_at)
+
+    ids: Dict[str, UUID] = {}
+    created: Dict[str, object] = {}
+    items = list(latest.items())
+    try:
+        merchant_id = get_or_create_merchant_id(db, merchant_domain)
+
+        # 1) raw products, every chunk first so the price bands below see
+        # the whole sync
+        priced = 0
+        for start in range(0, len(items), chunk_size):
+            raw_rows = [
+                {
+                    "id": uuid.uuid4(),
+                    "merchant_id": merchant_id,
+                    "shop_product_id": shop_product_id,
+                    "raw_json": raw_json,
+                    **product_columns_from_raw(raw_json),
+                }
+                for shop_product_id, raw_json in items[start : start + chunk_size]
+            ]
+            priced += sum(row["min_price"] is not None for row in raw_rows)
+            for row in db.execute(raw_stmt, raw_rows):
+                ids[row.shop_product_id] = row.id
+                created[row.shop_product_id] = row.created_at
+
+        bands = ensure_price_bands(db, merchant_id, changed=priced)
+
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start : start + chunk_size]
+
+            # 2) extract attributes (V0 heuristics; later LLM)
+            attr_rows = attribute_rows(
+                [ids[shop_product_id] for shop_product_id, _ in chunk],
+                [raw_json for _, raw_json in chunk],
+                [bands] * len(chunk),
+            )
+            upsert_attributes(db, attr_rows)
+
+            # 3) chat prompt context, rendered once here instead of per question
+            upsert_prompt_contexts(
+                db,
+                [
+                    prompt_context_row(
+                        row["product_id"],
+                        merchant_domain,
+                        shop_product_id,
+                        raw_json,
+                        {c: row[c] for c in ATTRIBUTE_COLUMNS},
+                    )
+                    for (shop_product_id, raw_json), row in zip(chunk, attr_rows)
+                ],
+            )
+
+            # 4) list/search read model
+            upsert_listings(
+                db,
+                [
+                    listing_row(
+                        row["product_id"],
+                        merchant_id,
+                        shop_product_id,
+                        created[shop_product_id],
+                        raw_json,
+                        row,
+                    )
+                    for (shop_product_id, raw_json), row in zip(chunk, attr_rows)
+                ],
+            )
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    # cached storefront summary/chat responses for these products may now be
+    # stale; dropped only after the commit, so a concurrent request cannot
+    # re-cache the old rows
+    invalidate_product_responses(latest.keys())
+
+    return ids
+
+
+def ingest_product(db: Session, merchant_domain: str, shop_product_id: str, raw_json: dict) -> models.ProductRaw:
+    ids = bulk_upsert_products(db, merchant_domain, [(shop_product_id, raw_json)])
+    return db.get(models.ProductRaw, ids[str(shop_product_id)], populate_existing=True)
+
+
+def get_product_by_shop_id(
+    db: Session,
+    shop_product_id: str,
+    shop_domain: Optional[str] = None,
+    merchant_id: Optional[UUID] = None,
+) -> Optional[tuple[models.ProductRaw, Optional[models.ProductAttributes]]]:
+    """
+    Storefront lookup by Shopify product id, scoped by merchant_id or
+    shop_domain (resolved through the merchant cache, no join): a probe on
+    uq_products_raw_merchant_shop_product. Shopify ids are only unique per
+    shop, so with neither given there is no match.
+    """
+    if merchant_id is None and shop_domain:
+        merchant_id = resolve_merchant_id(db, shop_domain)
+    if merchant_id is None:
+        return None
+
+    return (
+        _products_with_attributes_query(db)
+        .filter(
+            models.ProductRaw.merchant_id == merchant_id,
+            models.ProductRaw.shop_product_id == shop_product_id,
+        )
+        .first()
+    )
 
 
 def get_product_with_attributes(db: Session, product_id: UUID) -> Optional[tuple[models.ProductRaw, Optional[models.ProductAttributes]]]:
@@ -68,35 +270,151 @@ def get_product_with_attributes(db: Session, product_id: UUID) -> Optional[tuple
 
     return product, attrs
 
+class _PageColumns(NamedTuple):
+    created_at: Any
+    id: Any
+    category: Any
+    primary_use: Any
+
+
+# (ProductRaw, ProductAttributes) rows vs the product_listings read model
+_PRODUCT_COLUMNS = _PageColumns(
+    models.ProductRaw.created_at,
+    models.ProductRaw.id,
+    models.ProductAttributes.category,
+    models.ProductAttributes.primary_use,
+)
+_LISTING_COLUMNS = _PageColumns(
+    models.ProductListing.created_at,
+    models.ProductListing.id,
+    models.ProductListing.category,
+    models.ProductListing.primary_use,
+)
+
+
+def _products_with_attributes_query(db: Session):
+    return db.query(models.ProductRaw, models.ProductAttributes).outerjoin(
+        models.ProductAttributes,
+        models.ProductAttributes.product_id == models.ProductRaw.id,
+    )
+
+
+def _catalog_order_page(query, limit: int, offset: int, cursor: Optional[str], columns: _PageColumns = _PRODUCT_COLUMNS):
+    """
+    One page in (created_at, id) order plus the cursor for the next page.
+    With a cursor this is a keyset seek on the (created_at, id) index, so
+    deep pages cost the same as the first one; offset is ignored.
+    """
+    if cursor:
+        created_at, product_id = decode_created_cursor(cursor)
+        query = query.filter(tuple_(columns.created_at, columns.id) > tuple_(created_at, product_id))
+        offset = 0
+
+    rows = (
+        query.order_by(columns.created_at, columns.id)
+        .offset(offset)
+        .limit(limit + 1)
+        .only_return_tuples(True)
+        .all()
+    )
+    page = [tuple(row) for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit and page:
+        last = page[-1][0]
+        next_cursor = encode_created_cursor(last.created_at, last.id)
+    return page, next_cursor
+
+
+def list_products_page(
+    db: Session,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Tuple[models.ProductRaw, Optional[models.ProductAttributes]]], Optional[str]]:
+    """
+    Returns ([(ProductRaw, ProductAttributes | None)], next_cursor).
+    next_cursor is None on the last page.
+    """
+    return _catalog_order_page(_products_with_attributes_query(db), limit, offset, cursor)
+
+
 def list_products_with_attributes(db: Session, limit: int = 20,offset: int = 0,) -> List[tuple[models.ProductRaw, Optional[models.ProductAttributes]]]:
     """
     Returns a list of (ProductRaw, ProductAttributes | None)
     with pagination.
     """
-    products = (
-        db.query(models.ProductRaw)
-        .order_by(models.ProductRaw.created_at)
-        .offset(offset)
-        .limit(limit)
-        .all()
+    rows, _next_cursor = list_products_page(db, limit=limit, offset=offset)
+    return rows
+
+
+def _primary_use_contains(db: Session, value: str, column=models.ProductAttributes.primary_use):
+    """
+    primary_use is a JSON list. On Postgres this is a jsonb containment check
+    (served by the primary_use GIN indexes); other dialects fall back to
+    matching the quoted value in the serialized list.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(column, JSONB).contains([value])
+    return func.lower(cast(column, String)).like(f'%"{value}"%')
+
+
+def _search_page(
+    db: Session,
+    query,
+    columns: _PageColumns,
+    q: Optional[str],
+    category: Optional[str],
+    primary_use: Optional[str],
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+) -> Tuple[List[tuple], Optional[str]]:
+    if category:
+        query = query.filter(func.lower(columns.category) == category.lower())
+
+    if primary_use:
+        query = query.filter(_primary_use_contains(db, primary_use.lower(), columns.primary_use))
+
+    if not (q and q.strip()):
+        return _catalog_order_page(query, limit, offset, cursor, columns)
+
+    after = decode_ranked_cursor(cursor) if cursor else None
+    rows = ranked_search(
+        db, query, q, limit=limit + 1, offset=0 if after else offset, after=after, id_column=columns.id
     )
+    page = [row[:-1] for row in rows[:limit]]
 
-    # Fetch attributes for all product_ids in one go
-    product_ids = [p.id for p in products]
-    attrs_by_pid = {}
-    if product_ids:
-        attrs = (
-            db.query(models.ProductAttributes)
-            .filter(models.ProductAttributes.product_id.in_(product_ids))
-            .all()
-        )
-        attrs_by_pid = {a.product_id: a for a in attrs}
+    next_cursor = None
+    if len(rows) > limit and page:
+        last = rows[limit - 1]
+        next_cursor = encode_ranked_cursor(last[-1], last[0].id)
+    return page, next_cursor
+
+
+def search_products_page(
+    db: Session,
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    primary_use: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Tuple[models.ProductRaw, Optional[models.ProductAttributes]]], Optional[str]]:
+    """
+    SQL-side search:
+    - q: ranked full-text match over title, tags, product_type, vendor and
+      body (see search_services); results come back best match first
+    - category: matches attributes.category
+    - primary_use: must be contained in attributes.primary_use (list)
 
-    result: List[tuple[models.ProductRaw, Optional[models.ProductAttributes]]] = []
-    for p in products:
-        result.append((p, attrs_by_pid.get(p.id)))
+    Returns (rows, next_cursor). Without q, rows are in catalog order and
+    the cursor is a (created_at, id) keyset; with q it is (score, id).
+    """
+    return _search_page(
+        db, _products_with_attributes_query(db), _PRODUCT_COLUMNS, q, category, primary_use, limit, offset, cursor
+    )
 
-    return result
 
 def search_products_with_attributes(
     db: Session,
@@ -107,51 +425,51 @@ def search_products_with_attributes(
     offset: int = 0,
 ) -> List[Tuple[models.ProductRaw, Optional[models.ProductAttributes]]]:
     """
-    Very simple V0 search:
-    - q: case-insensitive match in title or tags
-    - category: matches attributes.category
-    - primary_use: must be contained in attributes.primary_use (list)
+    Offset-paginated search; see search_products_page.
+    """
+    rows, _next_cursor = search_products_page(
+        db, q=q, category=category, primary_use=primary_use, limit=limit, offset=offset
+    )
+    return rows
+
+def list_listings_page(
+    db: Session,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> Tuple[List[models.ProductListing], Optional[str]]:
+    """
+    list_products_page over the product_listings read model: same order
+    and cursors, without loading raw_json.
     """
-    # For now, we just reuse the list function and filter in Python.
-    # This is fine for small catalogs and keeps logic simple.
-    base_rows = list_products_with_attributes(db, limit=1000, offset=0)
-
-    q_lower = q.lower() if q else None
-    category_lower = category.lower() if category else None
-    primary_use_lower = primary_use.lower() if primary_use else None
-
-    filtered: List[Tuple[models.ProductRaw, Optional[models.ProductAttributes]]] = []
-
-    for product, attrs in base_rows:
-        raw = product.raw_json or {}
-        title = (raw.get("title") or "").lower()
-        tags = (raw.get("tags") or "").lower()
-
-        # Text filter on title + tags
-        if q_lower:
-            if q_lower not in title and q_lower not in tags:
-                continue
-
-        # Category filter
-        if category_lower:
-            if not attrs or not attrs.category:
-                continue
-            if attrs.category.lower() != category_lower:
-                continue
-
-        # primary_use filter
-        if primary_use_lower:
-            if not attrs or not attrs.primary_use:
-                continue
-            lower_uses = [u.lower() for u in attrs.primary_use]
-            if primary_use_lower not in lower_uses:
-                continue
-
-        filtered.append((product, attrs))
-
-    # Paginate in Python for now
-    sliced = filtered[offset : offset + limit]
-    return sliced
+    rows, next_cursor = _catalog_order_page(
+        db.query(models.ProductListing), limit, offset, cursor, _LISTING_COLUMNS
+    )
+    return [listing for listing, in rows], next_cursor
+
+
+def search_listings_page(
+    db: Session,
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    primary_use: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> Tuple[List[models.ProductListing], Optional[str]]:
+    """
+    search_products_page over the product_listings read model: same
+    filters, ranking and cursors, without loading raw_json.
+    """
+    query = db.query(models.ProductListing)
+    if q and q.strip() and db.get_bind().dialect.name == "postgresql":
+        # the tsvector / trigram indexes live on products_raw
+        query = query.join(models.ProductRaw, models.ProductRaw.id == models.ProductListing.id)
+    rows, next_cursor = _search_page(
+        db, query, _LISTING_COLUMNS, q, category, primary_use, limit, offset, cursor
+    )
+    return [listing for listing, in rows], next_cursor
+
 
 ## Not using yet put still wanna keep it for future use - Mughees
 
@@ -0,0 +1,65 @@
+# app/services/prompt_context_services.py
+"""
+Precompiled chat prompt context per product (product_prompt_contexts).
+
+Ingest renders each product's "Product Context" block once (HTML stripped,
+trimmed, serialized, token-counted) and stores it keyed by
+(shop_domain, shop_product_id). The chat routes then do one indexed read
+instead of merchant lookup + product/attributes join + dict shaping on
+every question.
+"""
+from typing import Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import dialect_insert
+from app.services.openai_overview import build_chat_context, chat_context_hash
+from app.text_utils import count_tokens
+
+
+def prompt_context_row(
+    product_id: UUID,
+    shop_domain: str,
+    shop_product_id: str,
+    raw_json: dict,
+    attrs: dict,
+) -> dict:
+    context = build_chat_context(raw_json, attrs)
+    return {
+        "product_id": product_id,
+        "shop_domain": shop_domain,
+        "shop_product_id": str(shop_product_id),
+        "context": context,
+        "context_hash": chat_context_hash(context),
+        "token_count": count_tokens(context),
+    }
+
+
+def upsert_prompt_contexts(db, rows: Iterable[dict]) -> None:
+    """
+    Store prompt_context_row() rows, replacing a product's previous context.
+    `db` may be a Session or Connection; nothing is committed here.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    stmt = dialect_insert(db)(models.ProductPromptContext.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["product_id"],
+        set_={
+            **{c: stmt.excluded[c] for c in ("shop_domain", "shop_product_id", "context", "context_hash", "token_count")},
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def get_prompt_context(db: Session, shop_domain: str, shop_product_id: str) -> Optional[models.ProductPromptContext]:
+    return (
+        db.query(models.ProductPromptContext)
+        .filter_by(shop_domain=shop_domain, shop_product_id=str(shop_product_id))
+        .first()
+    )
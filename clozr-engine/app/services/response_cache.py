@@ -0,0 +1,510 @@
+# app/services/response_cache.py
+"""
+Response cache for hot storefront reads (summary + chat bodies).
+
+Backends share one small interface (get / set / delete / invalidate_tags /
+acquire_lock / release_lock / stats):
+
+- MemoryCacheBackend: an in-process LRUCache. Holds serialized bodies with a
+  TTL, evicts least recently used entries once the total *byte* size passes
+  max_bytes, and is the default (and the test stand-in).
+- RedisCacheBackend: one cache shared by every uvicorn worker, selected with
+  CACHE_URL=redis://... (needs the `redis` package).
+
+Keys are versioned with PROMPT_VERSION and MODEL, so a prompt or model change
+reads from a fresh keyspace and old entries just age out. Entries carry tags
+(product:<shop_product_id>) so ingest can drop every cached response for a
+product. get_or_compute() adds stampede protection: concurrent misses for a
+key share one computation per process, and a short SET NX lock lets one
+process compute while the others wait for its result.
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional
+
+from app.services.openai_overview import MODEL, PROMPT_VERSION
+
+# rough per-entry bookkeeping cost on top of the payload (key, tuple, dict slots)
+ENTRY_OVERHEAD_BYTES = 256
+
+CACHE_URL = os.getenv("CACHE_URL")  # redis://host:6379/0 -> shared cache; unset -> in-process
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # in-process backend only
+SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "300"))
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "3600"))
+CACHE_LOCK_TTL_SECONDS = 30.0
+CACHE_LOCK_POLL_SECONDS = 0.05
+# tags per pipelined round of SMEMBERS / DEL when invalidating
+REDIS_INVALIDATE_BATCH = 500
+
+# DEL the lock only if it still holds our token: a holder whose lock expired
+# must not release the lock another worker has taken since
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LRUCache:
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, size, tags)
+        self._entries: "OrderedDict[Hashable, tuple[bytes, float, int, tuple]]" = OrderedDict()
+        self._tags: dict[Hashable, set] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(
+        self,
+        key: Hashable,
+        value: bytes,
+        tags: Iterable[Hashable] = (),
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        size = len(value) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return  # would evict everything else; not worth caching
+        tags = tuple(tags)
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._clock() + ttl, size, tags)
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_tags(self, tags: Iterable[Hashable]) -> int:
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    removed += 1
+            self.invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        """
+        Drop every entry and reset the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        # caller holds the lock
+        _, _, size, tags = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class CacheBackend(ABC):
+    """
+    What the routes need from a cache. `blocking` backends do network I/O,
+    so async callers run them on a worker thread.
+    """
+
+    name = "base"
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        ...
+
+    @abstractmethod
+    def acquire_lock(self, key: str, ttl_seconds: float) -> Optional[str]:
+        """
+        An owner token if this caller now holds the lock (it expires after
+        ttl_seconds), else None.
+        """
+
+    @abstractmethod
+    def release_lock(self, key: str, token: str) -> None:
+        """
+        Releases the lock if `token` still owns it.
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, clock: Callable[[], float] = time.monotonic) -> None:
+        self.lru = LRUCache(max_bytes, SUMMARY_CACHE_TTL_SECONDS, clock=clock)
+        self._clock = clock
+        self._locks: dict[str, tuple[float, str]] = {}  # key -> (expires_at, token)
+        self._locks_guard = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.lru.get(key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()) -> None:
+        self.lru.set(key, value, tags=tags, ttl_seconds=ttl_seconds)
+
+    def delete(self, key: str) -> None:
+        self.lru.delete(key)
+
+    def acquire_lock(self, key: str, ttl_seconds: float) -> Optional[str]:
+        now = self._clock()
+        with self._locks_guard:
+            held = self._locks.get(key)
+            if held is not None and held[0] > now:
+                return None
+            token = uuid.uuid4().hex
+            self._locks[key] = (now + ttl_seconds, token)
+            return token
+
+    def release_lock(self, key: str, token: str) -> None:
+        with self._locks_guard:
+            held = self._locks.get(key)
+            if held is not None and held[1] == token:
+                del self._locks[key]
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        return self.lru.invalidate_tags(tags)
+
+    def clear(self) -> None:
+        self.lru.clear()
+        with self._locks_guard:
+            self._locks.clear()
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self.lru.stats()}
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared cache in Redis. Tags are Redis sets of keys (expiring with the
+    longest entry they index). Redis errors are logged and treated as misses
+    / no-ops: the cache must never take a storefront request down.
+    """
+
+    name = "redis"
+    blocking = True
+
+    def __init__(self, url: Optional[str] = None, client: Any = None) -> None:
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("CACHE_URL points at Redis but the `redis` package is not installed") from e
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.client = client
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.invalidations = self.errors = 0
+
+    def _count(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def _tag_key(self, tag: str) -> str:
+        return f"clozr:tag:{tag}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            value = self.client.get(key)
+        except Exception as e:
+            self._count("errors")
+            print(f"Cache get failed ({e.__class__.__name__}): {e}")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()) -> None:
+        ttl_ms = int(ttl_seconds * 1000)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(key, value, px=ttl_ms)
+            for tag in tags:
+                pipe.sadd(self._tag_key(tag), key)
+                pipe.pexpire(self._tag_key(tag), ttl_ms)
+            pipe.execute()
+        except Exception as e:
+            self._count("errors")
+            print(f"Cache set failed ({e.__class__.__name__}): {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(key)
+        except Exception as e:
+            self._count("errors")
+            print(f"Cache delete failed ({e.__class__.__name__}): {e}")
+
+    def acquire_lock(self, key: str, ttl_seconds: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            return token if self.client.set(key, token, px=int(ttl_seconds * 1000), nx=True) else None
+        except Exception as e:
+            self._count("errors")
+            print(f"Cache lock failed ({e.__class__.__name__}): {e}")
+            return token  # behave as if we own it: compute rather than wait on a dead cache
+
+    def release_lock(self, key: str, token: str) -> None:
+        try:
+            self.client.eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
+        except Exception as e:
+            self._count("errors")
+            print(f"Cache unlock failed ({e.__class__.__name__}): {e}")
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """
+        Two pipelined round trips per REDIS_INVALIDATE_BATCH tags (all the
+        SMEMBERS, then one DEL for their keys and one for the tag sets),
+        so a big sync's invalidation isn't a round trip per product.
+        """
+        removed = 0
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        try:
+            for start in range(0, len(tag_keys), REDIS_INVALIDATE_BATCH):
+                batch = tag_keys[start : start + REDIS_INVALIDATE_BATCH]
+                pipe = self.client.pipeline(transaction=False)
+                for tag_key in batch:
+                    pipe.smembers(tag_key)
+                keys = set().union(*pipe.execute())
+
+                pipe = self.client.pipeline(transaction=False)
+                if keys:
+                    pipe.delete(*keys)
+                pipe.delete(*batch)
+                results = pipe.execute()
+                if keys:
+                    removed += results[0]
+        except Exception as e:
+            self._count("errors")
+            print(f"Cache invalidation failed ({e.__class__.__name__}): {e}")
+        self._count("invalidations", removed)
+        return removed
+
+    def clear(self) -> None:
+        # only this process's counters; flushing a shared Redis is an ops decision
+        with self._lock:
+            self.hits = self.misses = self.invalidations = self.errors = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "errors": self.errors,
+            }
+
+
+_backend: Optional[CacheBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = RedisCacheBackend(CACHE_URL) if CACHE_URL else MemoryCacheBackend()
+        return _backend
+
+
+def set_cache(backend: Optional[CacheBackend]) -> None:
+    """
+    Swap the process-wide backend (tests, or wiring a client by hand).
+    None -> rebuilt from CACHE_URL on next use.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+# ---------------------------------------------------------------------------
+# Keys, invalidation, stampede protection
+# ---------------------------------------------------------------------------
+
+def versioned_key(namespace: str, *parts: Any) -> str:
+    """
+    clozr:<namespace>:<PROMPT_VERSION>:<MODEL>:<parts...>; bumping the prompt
+    version or model moves every LLM-derived response to a fresh keyspace.
+    """
+    return ":".join(["clozr", namespace, PROMPT_VERSION, MODEL, *("" if p is None else str(p) for p in parts)])
+
+
+def product_tag(shop_product_id: str) -> str:
+    return f"product:{shop_product_id}"
+
+
+def invalidate_product_responses(shop_product_ids: Iterable[str]) -> int:
+    """
+    Drop cached summary/chat responses for these Shopify product ids, under
+    any shop key.
+    """
+    return get_cache().invalidate_tags([product_tag(str(i)) for i in shop_product_ids])
+
+
+async def _call(backend: CacheBackend, fn: Callable, *args, **kwargs):
+    if backend.blocking:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+async def get_cached(key: str) -> Optional[bytes]:
+    backend = get_cache()
+    return await _call(backend, backend.get, key)
+
+
+async def set_cached(key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()) -> None:
+    """
+    For responses produced outside get_or_compute (e.g. streamed answers).
+    """
+    backend = get_cache()
+    await _call(backend, backend.set, key, value, ttl_seconds, tuple(tags))
+
+
+# key -> in-flight computation in this process
+_computing: dict[str, asyncio.Task] = {}
+
+
+async def get_or_compute(
+    key: str,
+    compute: Callable[[], Awaitable[bytes]],
+    ttl_seconds: float,
+    tags: Iterable[str] = (),
+    cacheable: Callable[[bytes], bool] = lambda value: True,
+) -> bytes:
+    """
+    Cached value for key, or compute() it once. Concurrent misses in this
+    process await the same task; across processes a SET NX lock lets one
+    compute while the others poll for the result (until the lock expires).
+    Exceptions from compute() propagate and nothing is cached.
+    """
+    backend = get_cache()
+    value = await _call(backend, backend.get, key)
+    if value is not None:
+        return value
+
+    task = _computing.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.create_task(_compute_with_lock(backend, key, compute, ttl_seconds, tuple(tags), cacheable))
+        _computing[key] = task
+        task.add_done_callback(lambda t: _computing.pop(key, None) if _computing.get(key) is t else None)
+    return await asyncio.shield(task)
+
+
+async def _compute_with_lock(
+    backend: CacheBackend,
+    key: str,
+    compute: Callable[[], Awaitable[bytes]],
+    ttl_seconds: float,
+    tags: tuple,
+    cacheable: Callable[[bytes], bool],
+) -> bytes:
+    lock_key = f"{key}:lock"
+    token = await _call(backend, backend.acquire_lock, lock_key, CACHE_LOCK_TTL_SECONDS)
+    if token is None:
+        deadline = time.monotonic() + CACHE_LOCK_TTL_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(CACHE_LOCK_POLL_SECONDS)
+            value = await _call(backend, backend.get, key)
+            if value is not None:
+                return value
+            # previous holder gave up without a result
+            token = await _call(backend, backend.acquire_lock, lock_key, CACHE_LOCK_TTL_SECONDS)
+            if token is not None:
+                break
+
+    try:
+        value = await compute()
+        if cacheable(value):
+            await _call(backend, backend.set, key, value, ttl_seconds, tags)
+        return value
+    finally:
+        if token is not None:
+            await _call(backend, backend.release_lock, lock_key, token)
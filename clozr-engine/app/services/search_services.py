@@ -0,0 +1,276 @@
+# app/services/search_services.py
+"""
+Ranked product search.
+
+- PostgreSQL: weighted `search_vector` tsvector (title > tags > type/vendor/body)
+  ranked with ts_rank_cd, plus pg_trgm similarity on the title so typos and
+  partial words still match.
+- Anything else (SQLite test runs, local dev): an in-process inverted index
+  over the same fields, kept in sync with products_raw by re-indexing rows
+  whose updated_at moved since the last query.
+
+product_services builds the category / primary_use filtered query and
+hands it to ranked_search for the text match and ordering.
+"""
+import bisect
+import heapq
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Float, and_, cast, func, literal_column, or_
+from sqlalchemy.orm import Query, Session
+
+from app import models
+from app.text_utils import tokenize
+
+# Field weights for the in-process index (mirrors setweight A/B/C on Postgres)
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "tags": 2.0,
+    "search_text": 1.0,
+}
+
+# How many ranked candidates are checked against the SQL filters per round trip
+CANDIDATE_CHUNK = 500
+
+
+class InvertedIndex:
+    """
+    term -> {product_id: weighted term frequency}
+
+    Query terms are prefix-matched against the vocabulary ("hood" finds
+    "hoodie"), every query term must match (AND), and documents are scored
+    with a BM25-style idf * saturated tf sum.
+    """
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[UUID, float]] = defaultdict(dict)
+        self.doc_terms: Dict[UUID, Dict[str, float]] = {}
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def add(self, product_id: UUID, fields: Dict[str, Optional[str]]) -> None:
+        self.remove(product_id)
+
+        weights: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(fields.get(field)):
+                weights[term] += weight
+
+        for term, w in weights.items():
+            if term not in self.postings:
+                self._vocab_dirty = True
+            # Stored pre-saturated (BM25 k1=1.2) so queries only multiply by idf
+            self.postings[term][product_id] = (w * 2.2) / (w + 1.2)
+        self.doc_terms[product_id] = dict(weights)
+
+    def remove(self, product_id: UUID) -> None:
+        old = self.doc_terms.pop(product_id, None)
+        if not old:
+            return
+        for term in old:
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(product_id, None)
+            if not docs:
+                del self.postings[term]
+                self._vocab_dirty = True
+
+    def _expand(self, prefix: str) -> List[str]:
+        if self._vocab_dirty:
+            self._vocab = sorted(self.postings)
+            self._vocab_dirty = False
+        start = bisect.bisect_left(self._vocab, prefix)
+        out: List[str] = []
+        for term in self._vocab[start:]:
+            if not term.startswith(prefix):
+                break
+            out.append(term)
+        return out
+
+    def _term_scores(self, term: str, n_docs: int, candidates: Optional[Dict[UUID, float]]) -> Dict[UUID, float]:
+        scores: Dict[UUID, float] = {}
+        for vocab_term in self._expand(term):
+            docs = self.postings[vocab_term]
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Exact term hits outrank prefix expansions
+            factor = idf if vocab_term == term else idf * 0.5
+            if candidates is None:
+                for pid, sat_tf in docs.items():
+                    scores[pid] = scores.get(pid, 0.0) + factor * sat_tf
+            else:
+                for pid in candidates:
+                    sat_tf = docs.get(pid)
+                    if sat_tf is not None:
+                        scores[pid] = scores.get(pid, 0.0) + factor * sat_tf
+        return scores
+
+    def search(
+        self,
+        q: str,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[float, UUID]] = None,
+    ) -> List[Tuple[UUID, float]]:
+        """
+        (product_id, score) best first; only the top `limit` are ranked when
+        given. `after` is a (score, id) keyset position to resume from.
+        """
+        terms = list(dict.fromkeys(tokenize(q)))
+        if not terms:
+            return []
+
+        n_docs = max(len(self.doc_terms), 1)
+
+        # Rarest term first so later terms only score surviving candidates
+        def df(term: str) -> int:
+            return sum(len(self.postings[t]) for t in self._expand(term))
+
+        terms.sort(key=df)
+
+        scores: Optional[Dict[UUID, float]] = None
+        for term in terms:
+            term_scores = self._term_scores(term, n_docs, scores)
+            if scores is not None:
+                term_scores = {pid: scores[pid] + s for pid, s in term_scores.items()}
+            scores = term_scores
+            if not scores:
+                return []
+
+        key = lambda kv: (-kv[1], str(kv[0]))  # noqa: E731
+        if after is not None:
+            after_key = (-after[0], str(after[1]))
+            scores = {pid: s for pid, s in scores.items() if key((pid, s)) > after_key}
+        if limit is not None and limit < len(scores):
+            return heapq.nsmallest(limit, scores.items(), key=key)
+        return sorted(scores.items(), key=key)
+
+
+class _IndexState:
+    def __init__(self) -> None:
+        self.index = InvertedIndex()
+        self.watermark: Optional[datetime] = None
+        self.lock = threading.Lock()
+
+
+_state = _IndexState()
+
+
+def _index_rows(rows: Iterable) -> Optional[datetime]:
+    latest = None
+    for row in rows:
+        _state.index.add(row.id, {"title": row.title, "tags": row.tags, "search_text": row.search_text})
+        if row.updated_at is not None and (latest is None or row.updated_at > latest):
+            latest = row.updated_at
+    return latest
+
+
+def _sync_index(db: Session) -> InvertedIndex:
+    """
+    Brings the process-local index up to date: re-indexes rows whose
+    updated_at is at or past the last sync, and rebuilds from scratch when
+    the indexed doc count no longer matches the table (rows were deleted).
+    """
+    cols = (
+        models.ProductRaw.id,
+        models.ProductRaw.title,
+        models.ProductRaw.tags,
+        models.ProductRaw.search_text,
+        models.ProductRaw.updated_at,
+    )
+    count, latest = db.query(func.count(models.ProductRaw.id), func.max(models.ProductRaw.updated_at)).one()
+
+    with _state.lock:
+        if count == len(_state.index) and latest == _state.watermark:
+            return _state.index
+
+        if _state.watermark is not None:
+            newest = _index_rows(
+                db.query(*cols).filter(models.ProductRaw.updated_at >= _state.watermark).yield_per(1000)
+            )
+            if newest is not None and newest > _state.watermark:
+                _state.watermark = newest
+
+        if _state.watermark is None or len(_state.index) != count:
+            _state.index = InvertedIndex()
+            _state.watermark = _index_rows(db.query(*cols).yield_per(1000))
+
+        return _state.index
+
+
+def reset_search_index() -> None:
+    global _state
+    _state = _IndexState()
+
+
+def ranked_search(
+    db: Session,
+    query: Query,
+    q: str,
+    limit: int,
+    offset: int = 0,
+    after: Optional[Tuple[float, UUID]] = None,
+    id_column=models.ProductRaw.id,
+) -> List[Tuple]:
+    """
+    Applies the text match + relevance ordering to an already-filtered
+    query whose first entity carries the product id (id_column) and returns
+    one page of (*entities, score) rows, e.g. (product, attrs, score).
+    `after` is the (score, id) of the last row of the previous page for
+    keyset pagination. On Postgres the query must include products_raw.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        tsquery = func.websearch_to_tsquery("english", q)
+        vector = literal_column("products_raw.search_vector")
+        title_lower = func.lower(models.ProductRaw.title)
+        # both terms are float4; as float8 the score survives the round trip
+        # through the cursor exactly, so `rank == after_score` holds for ties
+        rank = cast(func.ts_rank_cd(vector, tsquery) + func.similarity(title_lower, q.lower()), Float(53))
+
+        query = query.filter(or_(vector.op("@@")(tsquery), title_lower.op("%")(q.lower())))
+        if after is not None:
+            after_score, after_id = after
+            query = query.filter(
+                or_(rank < after_score, and_(rank == after_score, models.ProductRaw.id > after_id))
+            )
+        return (
+            query.add_columns(rank)
+            .order_by(rank.desc(), models.ProductRaw.id)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+
+    # In-process index: walk the ranked ids in chunks, letting SQL apply the
+    # attribute filters, until the requested page is filled. Only the top-k
+    # matches are ranked; k grows if the filters reject too many of them.
+    index = _sync_index(db)
+    k = offset + limit + CANDIDATE_CHUNK
+    while True:
+        ranked = index.search(q, limit=k, after=after)
+        page: List[Tuple] = []
+        skipped = 0
+        for start in range(0, len(ranked), CANDIDATE_CHUNK):
+            chunk = ranked[start : start + CANDIDATE_CHUNK]
+            rows = query.filter(id_column.in_([pid for pid, _ in chunk])).only_return_tuples(True).all()
+            by_id = {row[0].id: row for row in rows}
+            for pid, score in chunk:
+                row = by_id.get(pid)
+                if row is None:
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                page.append((*row, score))
+                if len(page) >= limit:
+                    return page
+        if len(ranked) < k:
+            return page
+        k *= 4
@@ -1,36 +1,158 @@
-# # app/shopify_client.py
-# from typing import List, Dict, Any
-# import requests
-# from app.config import settings
+# app/shopify_client.py
+"""
+Shopify Admin REST catalog fetcher.
 
-# SHOPIFY_STORE_DOMAIN = settings.SHOPIFY_STORE_DOMAIN
-# SHOPIFY_ADMIN_ACCESS_TOKEN = settings.SHOPIFY_ADMIN_ACCESS_TOKEN
-# API_VERSION = "2024-01"
+- Follows `Link: <...page_info=...>; rel="next"` cursors until the catalog
+  is exhausted (products.json only ever returns one page per call).
+- Reads `X-Shopify-Shop-Api-Call-Limit` ("used/bucket") after every call and
+  sleeps just long enough for the leaky bucket to drain when it gets close
+  to full, instead of waiting to be 429'd.
+- Retries 429 (honouring Retry-After), 5xx and connection errors with
+  exponential backoff.
+- Shares one pooled requests.Session per process so paging reuses
+  keep-alive connections.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
-# class ShopifyClientError(Exception):
-#     pass
+import requests
+from requests.adapters import HTTPAdapter
 
-# def get_products(limit: int = 50) -> List[Dict[str, Any]]:
-#     if not SHOPIFY_STORE_DOMAIN or not SHOPIFY_ADMIN_ACCESS_TOKEN:
-#         raise ShopifyClientError("Missing SHOPIFY_STORE_DOMAIN or SHOPIFY_ADMIN_ACCESS_TOKEN")
+from app.config import settings
 
-#     url = f"https://{SHOPIFY_STORE_DOMAIN}/admin/api/{API_VERSION}/products.json"
-#     headers = {
-#         "X-Shopify-Access-Token": SHOPIFY_ADMIN_ACCESS_TOKEN,
-#     }
-#     params = {"limit": limit}
+API_VERSION = "2024-10"
+PAGE_SIZE = 250  # max page size for REST products.json
+CALL_LIMIT_HEADER = "X-Shopify-Shop-Api-Call-Limit"
 
-#     print("DEBUG URL:", url)
-#     print("DEBUG TOKEN PREFIX:", SHOPIFY_ADMIN_ACCESS_TOKEN[:8])
 
-#     resp = requests.get(url, headers=headers, params=params, timeout=30)
+class ShopifyClientError(Exception):
+    pass
 
-#     if resp.status_code != 200:
-#         raise ShopifyClientError(f"Shopify API error {resp.status_code}: {resp.text}")
 
-#     data = resp.json()
-#     return data.get("products", [])
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
 
 
+def get_http_session() -> requests.Session:
+    """
+    Process-wide pooled session (keep-alive connections to every shop).
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
 
 
+def parse_call_limit(value: Optional[str]) -> Optional[tuple[int, int]]:
+    """
+    "32/40" -> (32, 40)
+    """
+    if not value or "/" not in value:
+        return None
+    try:
+        used, bucket = value.split("/", 1)
+        return int(used), int(bucket)
+    except ValueError:
+        return None
+
+
+class ShopifyClient:
+    def __init__(
+        self,
+        shop_domain: str,
+        access_token: str,
+        api_version: str = API_VERSION,
+        base_url: Optional[str] = None,
+        session: Optional[requests.Session] = None,
+        page_size: int = PAGE_SIZE,
+        max_retries: int = 5,
+        throttle_ratio: float = 0.8,
+        timeout: float = 30,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if not shop_domain or not access_token:
+            raise ShopifyClientError("Missing shop domain or access token")
+        self.shop_domain = shop_domain
+        self.access_token = access_token
+        self.api_version = api_version
+        # base_url lets tests point the client at a local fake Shopify
+        self.base_url = (base_url or f"https://{shop_domain}").rstrip("/")
+        self.session = session or get_http_session()
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.throttle_ratio = throttle_ratio
+        self.timeout = timeout
+        self.sleep = sleep
+
+    @classmethod
+    def from_settings(cls, **kwargs) -> "ShopifyClient":
+        return cls(settings.SHOPIFY_STORE_DOMAIN, settings.SHOPIFY_ADMIN_ACCESS_TOKEN, **kwargs)
+
+    def _throttle(self, resp: requests.Response) -> None:
+        limit = parse_call_limit(resp.headers.get(CALL_LIMIT_HEADER))
+        if not limit:
+            return
+        used, bucket = limit
+        threshold = bucket * self.throttle_ratio
+        if used < threshold:
+            return
+        # REST buckets leak at bucket/20 calls per second (40 -> 2/s, Plus 80 -> 4/s)
+        leak_rate = bucket / 20
+        self.sleep((used - threshold + 1) / leak_rate)
+
+    def _get(self, url: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+        headers = {"X-Shopify-Access-Token": self.access_token}
+        for attempt in range(self.max_retries + 1):
+            backoff = min(2 ** attempt * 0.5, 30)
+            try:
+                resp = self.session.get(url, headers=headers, params=params, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                if attempt == self.max_retries:
+                    raise ShopifyClientError(f"Network error calling Shopify: {e}") from e
+                self.sleep(backoff)
+                continue
+
+            if resp.status_code == 200:
+                self._throttle(resp)
+                return resp
+
+            if resp.status_code == 429 or resp.status_code >= 500:
+                if attempt == self.max_retries:
+                    break
+                retry_after = resp.headers.get("Retry-After")
+                try:
+                    wait = float(retry_after) if retry_after else backoff
+                except ValueError:
+                    wait = backoff
+                self.sleep(wait)
+                continue
+
+            raise ShopifyClientError(f"Shopify API error {resp.status_code}: {resp.text[:500]}")
+
+        raise ShopifyClientError(f"Shopify API still failing after {self.max_retries} retries ({resp.status_code})")
+
+    def iter_product_pages(self, fields: Optional[List[str]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields one list of products per Admin API page, in catalog order.
+        """
+        url: Optional[str] = f"{self.base_url}/admin/api/{self.api_version}/products.json"
+        params: Optional[Dict[str, Any]] = {"limit": self.page_size}
+        if fields:
+            params["fields"] = ",".join(fields)
+
+        while url:
+            resp = self._get(url, params)
+            yield resp.json().get("products", [])
+            # The next link already carries limit/fields/page_info
+            url = resp.links.get("next", {}).get("url")
+            params = None
+
+    def iter_products(self, fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        for page in self.iter_product_pages(fields=fields):
+            yield from page
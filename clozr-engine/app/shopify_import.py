@@ -1,32 +1,35 @@
-# # app/shopify_import.py
-# import os
-# from app.db import SessionLocal
-# from app.shopify_client import get_products
-# from app.services.product_services import ingest_product
+# app/shopify_import.py
+"""
+Full-catalog import straight from the Shopify Admin API: every page the
+fetcher yields is upserted as soon as it arrives, so memory stays at one
+page and a re-run simply refreshes existing rows.
 
+    python -m app.shopify_import            # uses SHOPIFY_STORE_DOMAIN / SHOPIFY_ADMIN_ACCESS_TOKEN
+"""
+from typing import Optional
 
-# def import_products_from_shopify(limit: int = 50):
-#     db = SessionLocal()
-#     try:
-#         products = get_products(limit=limit)
-#         merchant_domain = os.getenv("SHOPIFY_STORE_DOMAIN")
+from app.db import SessionLocal
+from app.services.product_services import bulk_upsert_products
+from app.shopify_client import ShopifyClient
 
-#         print(f"Fetched {len(products)} products from Shopify")
 
-#         for p in products:
-#             shop_product_id = str(p["id"])
-#             raw_json = p
+def import_products_from_shopify(client: Optional[ShopifyClient] = None) -> int:
+    client = client or ShopifyClient.from_settings()
+    db = SessionLocal()
+    total = 0
+    try:
+        for page_number, page in enumerate(client.iter_product_pages(), start=1):
+            if not page:
+                continue
+            bulk_upsert_products(db, client.shop_domain, [(str(p["id"]), p) for p in page])
+            total += len(page)
+            print(f"Page {page_number}: ingested {len(page)} products ({total} total)")
+    finally:
+        db.close()
 
-#             product = ingest_product(
-#                 db=db,
-#                 merchant_domain=merchant_domain,
-#                 shop_product_id=shop_product_id,
-#                 raw_json=raw_json,
-#             )
-#             print(f"Ingested product {shop_product_id} -> {product.id}")
-#     finally:
-#         db.close()
+    print(f"✔ Imported {total} products from {client.shop_domain}")
+    return total
 
 
-# if __name__ == "__main__":
-#     import_products_from_shopify(limit=50)
+if __name__ == "__main__":
+    import_products_from_shopify()
@@ -0,0 +1,383 @@
+# app/streaming_import.py
+"""
+Streaming catalog import.
+
+Reads products incrementally from NDJSON (one product per line), a JSON
+array, or a Shopify-style {"products": [...]} export, and commits them in
+chunks through bulk_upsert_products. Memory stays at roughly one chunk no
+matter how big the catalog is, a bad row only costs that row, and progress
+can be checkpointed by the last imported shop_product_id so an interrupted
+import resumes where it stopped.
+
+CLI:
+    python -m app.streaming_import products.ndjson --shop my-store.myshopify.com
+    python -m app.streaming_import export.json --shop my-store.myshopify.com \\
+        --checkpoint import.ckpt --resume
+"""
+import argparse
+import codecs
+import json
+import re
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.services.product_services import bulk_upsert_products
+
+DEFAULT_CHUNK_SIZE = 500
+READ_SIZE = 64 * 1024
+# one array element larger than this is taken as a malformed stream (e.g. a
+# missing closing brace) rather than buffered until the body ends
+MAX_PRODUCT_SIZE = 8 * 1024 * 1024
+
+_WRAPPER_RE = re.compile(r'\{\s*"products"\s*:\s*\[')
+_WRAPPER_PREFIX = '{"products":['
+_STRUCTURAL_RE = re.compile(r'["{}\[\]]')
+_STRING_SPECIAL_RE = re.compile(r'["\\]')
+_SCALAR_END_RE = re.compile(r"[\s,\]]")
+
+
+class ProductStreamParser:
+    """
+    Push parser: feed() raw bytes/str as they arrive, get back the complete
+    product dicts parsed so far. Format is detected from the first bytes:
+    "[" -> JSON array, '{"products": [' -> export wrapper, anything else ->
+    NDJSON. Malformed NDJSON lines and array elements are counted in
+    bad_rows and skipped; an array element that never closes (or outgrows
+    max_product_size) and a truncated array raise ValueError with the byte
+    offset of the element.
+    """
+
+    def __init__(self, max_product_size: int = MAX_PRODUCT_SIZE) -> None:
+        self.max_product_size = max_product_size
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._offset = 0  # bytes of input before self._buf
+        self._mode: Optional[str] = None  # "array" | "ndjson"
+        self._array_done = False
+        # scan state of the array element at the start of self._buf
+        self._scanned = 0
+        self._depth = 0
+        self._in_string = False
+        self.bad_rows = 0
+
+    def feed(self, data: bytes | str) -> List[dict]:
+        if isinstance(data, bytes):
+            data = self._utf8.decode(data)
+        self._buf += data
+        return self._drain(final=False)
+
+    def close(self) -> List[dict]:
+        self._buf += self._utf8.decode(b"", final=True)
+        out = self._drain(final=True)
+        if self._mode == "array" and not self._array_done:
+            raise ValueError("JSON array ended before its closing bracket")
+        return out
+
+    def _detect(self, final: bool) -> bool:
+        stripped = self._buf.lstrip()
+        if not stripped:
+            return False
+        if stripped[0] == "[":
+            self._start_array(len(self._buf) - len(stripped) + 1)
+            return True
+        if stripped[0] == "{":
+            match = _WRAPPER_RE.match(stripped)
+            if match:
+                self._start_array(len(self._buf) - len(stripped) + match.end())
+                return True
+            compact = re.sub(r"\s+", "", stripped[:256])
+            if _WRAPPER_PREFIX.startswith(compact) and not final:
+                return False  # could still turn into '{"products": [' – wait for more bytes
+        self._mode = "ndjson"
+        return True
+
+    def _start_array(self, prefix: int) -> None:
+        self._mode = "array"
+        self._offset = len(self._buf[:prefix].encode("utf-8"))
+        self._buf = self._buf[prefix:]
+
+    def _drain(self, final: bool) -> List[dict]:
+        if self._mode is None and not self._detect(final):
+            return []
+        if self._mode == "ndjson":
+            return self._drain_ndjson(final)
+        return self._drain_array(final)
+
+    def _drain_ndjson(self, final: bool) -> List[dict]:
+        lines = self._buf.split("\n")
+        self._buf = "" if final else lines.pop()
+        out: List[dict] = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                self.bad_rows += 1
+                continue
+            if isinstance(item, dict):
+                out.append(item)
+            else:
+                self.bad_rows += 1
+        return out
+
+    def _element_end(self, buf: str, start: int) -> Optional[int]:
+        """
+        End of the array element starting at buf[start], or None if the
+        buffer ends first. Only brackets and strings are tracked, so a
+        malformed element still ends where its brackets balance; the scan
+        state is kept so each byte is scanned once across feeds.
+        """
+        if buf[start] not in '{["':
+            match = _SCALAR_END_RE.search(buf, start)
+            return match.start() if match else None
+        pos = start + self._scanned
+        while True:
+            pattern = _STRING_SPECIAL_RE if self._in_string else _STRUCTURAL_RE
+            match = pattern.search(buf, pos)
+            if match is None or (match.group() == "\\" and match.end() == len(buf)):
+                # rescan a trailing backslash once its escaped char arrives
+                self._scanned = (match.start() if match else len(buf)) - start
+                return None
+            pos = match.end()
+            char = match.group()
+            if char == "\\":
+                pos += 1
+            elif char == '"':
+                self._in_string = not self._in_string
+            elif char in "{[":
+                self._depth += 1
+            else:
+                self._depth -= 1
+            if self._depth <= 0 and not self._in_string:
+                self._scanned, self._depth = 0, 0
+                return pos
+
+    def _drain_array(self, final: bool) -> List[dict]:
+        out: List[dict] = []
+        buf = self._buf
+        pos = 0
+        while not self._array_done:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                self._array_done = True
+                pos = len(buf)  # anything after the array (e.g. "shop", "exported_at") is ignored
+                break
+            try:
+                item, end = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                item, end = None, self._element_end(buf, pos)
+            else:
+                self._scanned, self._depth, self._in_string = 0, 0, False
+            if end is None and final and buf[pos] not in '{["':
+                end = len(buf)
+            if end is None:
+                offset = self._offset + len(buf[:pos].encode("utf-8"))
+                if final:
+                    raise ValueError(f"Malformed product JSON at byte offset {offset}: element never closes")
+                if len(buf) - pos > self.max_product_size:
+                    raise ValueError(
+                        f"Malformed product JSON at byte offset {offset}: element exceeds {self.max_product_size} bytes"
+                    )
+                break  # element continues in the next chunk
+            # an element that failed to decode but whose brackets balance is
+            # malformed: skipping to its end resyncs at the next element
+            pos = end
+            if isinstance(item, dict):
+                out.append(item)
+            else:
+                self.bad_rows += 1
+        self._offset += len(buf[:pos].encode("utf-8"))
+        self._buf = buf[pos:]
+        return out
+
+
+def iter_products_from_chunks(chunks: Iterable[bytes | str], parser: Optional[ProductStreamParser] = None) -> Iterator[dict]:
+    parser = parser or ProductStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def read_file_chunks(path: str) -> Iterator[bytes]:
+    if path == "-":
+        stream = sys.stdin.buffer
+        while chunk := stream.read(READ_SIZE):
+            yield chunk
+        return
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_SIZE):
+            yield chunk
+
+
+@dataclass
+class ImportStats:
+    imported: int = 0
+    skipped: int = 0     # before the resume checkpoint
+    failed: int = 0      # unparseable / invalid rows, or rows the database rejected
+    chunks: int = 0
+    last_shop_product_id: Optional[str] = None
+
+
+class ProductStreamImporter:
+    """
+    Accumulates parsed products into chunks and upserts each chunk in its
+    own transaction. If a chunk is rejected, its rows are retried one by one
+    so only the offending rows are lost.
+    """
+
+    def __init__(
+        self,
+        db: Session,
+        merchant_domain: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        resume_after: Optional[str] = None,
+        on_chunk: Optional[Callable[[ImportStats], None]] = None,
+    ) -> None:
+        self.db = db
+        self.merchant_domain = merchant_domain
+        self.chunk_size = chunk_size
+        self.on_chunk = on_chunk
+        self.stats = ImportStats()
+        self._resume_after = resume_after
+        self._pending: List[tuple[str, dict]] = []
+
+    def add(self, product: dict) -> None:
+        product_id = product.get("id")
+        if product_id is None:
+            self.stats.failed += 1
+            return
+        shop_product_id = str(product_id)
+
+        if self._resume_after is not None:
+            self.stats.skipped += 1
+            if shop_product_id == self._resume_after:
+                self._resume_after = None
+            return
+
+        self._pending.append((shop_product_id, product))
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        chunk, self._pending = self._pending, []
+
+        try:
+            bulk_upsert_products(self.db, self.merchant_domain, chunk)
+            self.stats.imported += len(chunk)
+        except Exception as e:
+            print(f"Chunk of {len(chunk)} rejected ({e.__class__.__name__}: {e}); retrying row by row")
+            for shop_product_id, raw_json in chunk:
+                try:
+                    bulk_upsert_products(self.db, self.merchant_domain, [(shop_product_id, raw_json)])
+                    self.stats.imported += 1
+                except Exception as row_error:
+                    self.stats.failed += 1
+                    print(f"Skipping product {shop_product_id}: {row_error}")
+
+        self.stats.chunks += 1
+        self.stats.last_shop_product_id = chunk[-1][0]
+        if self.on_chunk:
+            self.on_chunk(self.stats)
+
+    def finish(self, bad_rows: int = 0) -> ImportStats:
+        self.flush()
+        if self._resume_after is not None:
+            print(f"Warning: checkpoint product {self._resume_after} never appeared in the input; nothing imported")
+        self.stats.failed += bad_rows
+        return self.stats
+
+
+def import_products_stream(
+    db: Session,
+    merchant_domain: str,
+    chunks: Iterable[bytes | str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    resume_after: Optional[str] = None,
+    on_chunk: Optional[Callable[[ImportStats], None]] = None,
+) -> ImportStats:
+    parser = ProductStreamParser()
+    importer = ProductStreamImporter(db, merchant_domain, chunk_size, resume_after, on_chunk)
+    for product in iter_products_from_chunks(chunks, parser):
+        importer.add(product)
+    return importer.finish(bad_rows=parser.bad_rows)
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints
+# ---------------------------------------------------------------------------
+
+def read_checkpoint(path: str, key: str = "last_shop_product_id") -> Optional[str]:
+    """
+    `key` from the stats saved by write_checkpoint, or None without a
+    checkpoint. Shared with app.pregenerate_overviews (key=last_product_id).
+    """
+    p = Path(path)
+    if not p.exists():
+        return None
+    return json.loads(p.read_text()).get(key)
+
+
+def write_checkpoint(path: str, stats: Any) -> None:
+    """
+    Saves a stats dataclass (ImportStats, PregenStats) as JSON.
+    """
+    # write-then-rename so a crash mid-write never leaves a torn checkpoint
+    tmp = Path(f"{path}.tmp")
+    tmp.write_text(json.dumps(asdict(stats)))
+    tmp.replace(path)
+
+
+def main() -> None:
+    from app.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Stream a product export (NDJSON / JSON) into products_raw.")
+    parser.add_argument("path", help="NDJSON or JSON file, or - for stdin")
+    parser.add_argument("--shop", required=True, help="merchant shop domain, e.g. my-store.myshopify.com")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", help="file recording the last imported shop_product_id")
+    parser.add_argument("--resume", action="store_true", help="skip products up to the checkpoint")
+    args = parser.parse_args()
+
+    resume_after = None
+    if args.resume:
+        if not args.checkpoint:
+            parser.error("--resume needs --checkpoint")
+        resume_after = read_checkpoint(args.checkpoint)
+        if resume_after:
+            print(f"Resuming after product {resume_after}")
+
+    def on_chunk(stats: ImportStats) -> None:
+        if args.checkpoint:
+            write_checkpoint(args.checkpoint, stats)
+        print(f"Committed chunk {stats.chunks}: {stats.imported} imported, {stats.failed} failed")
+
+    db = SessionLocal()
+    try:
+        stats = import_products_stream(
+            db,
+            args.shop,
+            read_file_chunks(args.path),
+            chunk_size=args.chunk_size,
+            resume_after=resume_after,
+            on_chunk=on_chunk,
+        )
+    finally:
+        db.close()
+
+    print(f"✔ Finished: {stats.imported} imported, {stats.skipped} skipped, {stats.failed} failed")
+
+
+if __name__ == "__main__":
+    main()
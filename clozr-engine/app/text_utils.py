@@ -0,0 +1,88 @@
+# app/text_utils.py
+import re
+from html import unescape
+from html.parser import HTMLParser
+from typing import List
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# BPE-ish pieces: words, runs of up to 3 digits, single punctuation marks
+_PIECE_RE = re.compile(r"[^\W\d_]+|\d{1,3}|[^\w\s]|_")
+
+# Block-level tags that should separate words once the markup is gone
+_BLOCK_TAGS = {"p", "br", "div", "li", "ul", "ol", "tr", "td", "th", "h1", "h2", "h3", "h4", "h5", "h6", "table"}
+
+
+class _TextCollector(HTMLParser):
+    def __init__(self, block_separator: str = " ") -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+        self._block_separator = block_separator
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append(self._block_separator)
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append(self._block_separator)
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def strip_html(html: str | None) -> str:
+    """
+    Shopify body_html -> plain text with collapsed whitespace.
+    """
+    if not html:
+        return ""
+    if "<" not in html:
+        return _WHITESPACE_RE.sub(" ", unescape(html)).strip()
+
+    parser = _TextCollector()
+    parser.feed(html)
+    parser.close()
+    return _WHITESPACE_RE.sub(" ", "".join(parser.parts)).strip()
+
+
+def html_blocks(html: str | None) -> List[str]:
+    """
+    Plain text of each block-level element (paragraph, list item, ...) of a
+    body_html, whitespace-collapsed, empty blocks dropped.
+    """
+    if not html:
+        return []
+    parser = _TextCollector(block_separator="\n")
+    parser.feed(html)
+    parser.close()
+    blocks = (_WHITESPACE_RE.sub(" ", block).strip() for block in "".join(parser.parts).split("\n"))
+    return [block for block in blocks if block]
+
+
+def tokenize(text: str | None) -> List[str]:
+    """
+    Lower-cased alphanumeric tokens, e.g. "T-Shirt (Organic)" -> ["t", "shirt", "organic"].
+    """
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.lower())
+
+
+def count_tokens(text: str | None) -> int:
+    """
+    Local estimate of how many model tokens `text` costs: one per
+    punctuation mark or 3-digit run, one per word plus one per extra 6
+    letters of long words. Errs slightly high compared with BPE tokenizers,
+    which is the safe side for budgets, and needs no dependency.
+    """
+    if not text:
+        return 0
+    return sum(1 + (len(piece) - 1) // 6 if piece[0].isalpha() else 1 for piece in _PIECE_RE.findall(text))
+
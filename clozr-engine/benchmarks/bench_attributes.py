@@ -0,0 +1,143 @@
+# benchmarks/bench_attributes.py
+"""
+Attribute inference microbenchmark: the old per-keyword substring scans
+(reproduced below) vs the compiled KeywordMatcher in app/attributes.py, per
+product and through extract_attributes_batch, over sample_products.json
+and a synthetic catalog. Also lists products whose
+attributes changed; those differences come from word-boundary matching
+("classic" is no longer "class", "steel" no longer "tee").
+
+The substring scans cost one pass over the text per keyword, the compiled
+matcher one pass in total; the last table shows both as the rule table
+grows beyond today's ~45 keywords.
+
+    python -m benchmarks.bench_attributes --products 20000
+"""
+import argparse
+import json
+import random
+import string
+import time
+from pathlib import Path
+
+from app.attributes import (
+    CATEGORY_RULES,
+    PRIMARY_USE_RULES,
+    KeywordMatcher,
+    extract_attributes_batch,
+    extract_product_attributes,
+)
+from benchmarks.bench_search import make_catalog
+
+SAMPLE = Path(__file__).resolve().parent.parent / "sample_products.json"
+
+
+def v0_extract(raw: dict) -> dict:
+    title = raw.get("title", "")
+    product_type = raw.get("product_type")
+    tags_raw = raw.get("tags") or ""
+    tags = [t.strip() for t in tags_raw.split(",") if t.strip()]
+
+    text = " ".join([title or "", product_type or "", " ".join(tags or [])]).lower()
+    category = None
+    for label, keywords in (
+        ("jacket", ["puffer", "parka", "jacket", "shell", "coat"]),
+        ("hoodie", ["hoodie", "hooded", "fleece", "pullover", "crewneck", "sweatshirt"]),
+        ("t-shirt", ["t-shirt", "t shirt", "tee", "graphic tee"]),
+        ("shirt", ["long sleeve", "flannel", "oxford", "button down", "shirt"]),
+        ("pants", ["pants", "trouser", "jogger", "chino", "jean"]),
+        ("sweater", ["sweater", "cardigan", "knit"]),
+    ):
+        if any(k in text for k in keywords):
+            category = label
+            break
+
+    primary_use = []
+    text = " ".join([title or "", raw.get("body_html") or "", tags_raw]).lower()
+    if any(k in text for k in ["winter", "snow", "cold", "fleece", "parka", "puffer"]):
+        primary_use.append("winter")
+    if any(k in text for k in ["campus", "class", "college", "everyday", "daily"]):
+        primary_use.append("campus")
+    if any(k in text for k in ["running", "jog", "training", "gym"]):
+        primary_use.append("training")
+    return {
+        "category": category,
+        "warmth_level": "high" if "winter" in primary_use else None,
+        "primary_use": primary_use or None,
+    }
+
+
+def _elapsed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _per_product_us(fn, catalog: list[dict], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for raw in catalog:
+            fn(raw)
+        best = min(best, time.perf_counter() - start)
+    return best / len(catalog) * 1e6
+
+
+def bench(label: str, catalog: list[dict], repeat: int, show_diffs: bool) -> None:
+    old = _per_product_us(v0_extract, catalog, repeat)
+    new = _per_product_us(extract_product_attributes, catalog, repeat)
+    batch = min(_elapsed(lambda: extract_attributes_batch(catalog)) for _ in range(repeat)) / len(catalog) * 1e6
+    keys = ("category", "warmth_level", "primary_use")
+    diffs = []
+    for raw in catalog:
+        before = v0_extract(raw)
+        after = {k: extract_product_attributes(raw)[k] for k in keys}
+        if before != after:
+            diffs.append((raw.get("title"), before, after))
+    print(
+        f"{label:<22}{len(catalog):>8} products {old:>8.1f}us -> {new:>6.1f}us per product, "
+        f"{batch:>6.1f}us batched ({1e6 / batch:,.0f} products/s), {len(diffs)} changed"
+    )
+    if show_diffs:
+        for title, before, after in diffs[:10]:
+            print(f"    {title}: {before} -> {after}")
+
+
+def bench_rule_table_size(catalog: list[dict], sizes: list[int]) -> None:
+    rng = random.Random(3)
+    base = [(label, tuple(k.rstrip("*") for k in keywords)) for label, keywords in CATEGORY_RULES + PRIMARY_USE_RULES]
+    texts = [" ".join([raw["title"], raw["tags"], raw["body_html"]]).lower() for raw in catalog]
+
+    print(f"{'keywords':>10}{'substring us':>16}{'matcher us':>14}")
+    for size in sizes:
+        rules = list(base)
+        extra = size - sum(len(keywords) for _, keywords in base)
+        for i in range(0, max(0, extra), 10):
+            words = tuple("".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 9))) for _ in range(10))
+            rules.append((f"extra-{i}", words))
+        matcher = KeywordMatcher({"label": tuple(rules)})
+
+        def scan(text):
+            return [label for label, keywords in rules if any(k in text for k in keywords)]
+
+        old = _per_product_us(scan, texts, 3)
+        new = _per_product_us(lambda text: matcher.match([(text, ("label",))]), texts, 3)
+        print(f"{size:>10}{old:>16.1f}{new:>14.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sample = json.loads(SAMPLE.read_text())["products"]
+    bench("sample_products.json", sample * max(1, 2000 // len(sample)), args.repeat * 10, show_diffs=False)
+    bench("  (distinct)", sample, 1, show_diffs=True)
+    catalog = make_catalog(args.products)
+    bench("synthetic", catalog, args.repeat, show_diffs=True)
+    bench_rule_table_size(catalog[:5000], [45, 100, 200, 400, 800])
+
+
+if __name__ == "__main__":
+    main()
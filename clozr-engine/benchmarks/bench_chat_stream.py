@@ -0,0 +1,68 @@
+# benchmarks/bench_chat_stream.py
+"""
+Time to first byte of a chat answer against the stub LLM
+(benchmarks/stub_llm.py): generate_chat_response (what /shopify/products/chat
+waits for) vs the first delta of stream_chat_response (what
+/shopify/products/chat/stream sends first).
+
+    python -m benchmarks.bench_chat_stream --questions 20 --delay 0.3 --token-delay 0.05
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.services import openai_overview
+from app.services.openai_overview import build_chat_context, generate_chat_response, stream_chat_response
+from benchmarks.stub_llm import StubLLMServer
+
+CONTEXT = build_chat_context({"id": 1, "title": "Zip Hoodie", "product_type": "Hoodie", "body_html": "<p>Midweight cotton fleece.</p>"}, {})
+
+
+def _report(label: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{label:<28}{len(latencies):>6} q {statistics.median(latencies) * 1000:>8.0f}ms p50 {p95 * 1000:>8.0f}ms p95")
+
+
+async def _main(args) -> None:
+    stub = StubLLMServer(delay=args.delay, token_delay=args.token_delay).start()
+    openai_overview.OPENAI_BASE_URL = stub.base_url
+    await openai_overview.close_async_client()
+
+    # warm-up: client pool + the SDK's stream event models
+    await generate_chat_response("1", "", "A hoodie.", "warm up", product_context=CONTEXT)
+    async for _ in stream_chat_response("A hoodie.", "warm up", CONTEXT):
+        pass
+
+    blocking, first_delta, full_stream = [], [], []
+    for i in range(args.questions):
+        start = time.perf_counter()
+        await generate_chat_response("1", "", "A hoodie.", f"Question {i}?", product_context=CONTEXT)
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        first = None
+        async for _ in stream_chat_response("A hoodie.", f"Question {i}?", CONTEXT):
+            first = first or time.perf_counter() - start
+        first_delta.append(first)
+        full_stream.append(time.perf_counter() - start)
+
+    _report("blocking (full answer)", blocking)
+    _report("stream first delta", first_delta)
+    _report("stream complete", full_stream)
+
+    await openai_overview.close_async_client()
+    stub.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.3, help="stub LLM time to first token (seconds)")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="stub LLM time between words (seconds)")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_ingest.py
+"""
+Catalog sync throughput against DATABASE_URL.
+
+Times a 10k-product sync three ways:
+  - per-product ingest_product() calls (what POST /products/ingest costs)
+  - bulk_upsert_products() first sync (all inserts)
+  - bulk_upsert_products() re-sync (all ON CONFLICT updates)
+
+    python -m benchmarks.bench_ingest --products 10000
+"""
+import argparse
+import time
+
+from app.db import SessionLocal
+from app import models
+from app.services.product_services import bulk_upsert_products, ingest_product
+from benchmarks.bench_search import make_catalog
+from benchmarks.dev_db import init_db
+
+
+def _clear(db, shop: str) -> None:
+    merchant = db.query(models.Merchant).filter_by(shop_domain=shop).first()
+    if merchant is None:
+        return
+    product_ids = db.query(models.ProductRaw.id).filter_by(merchant_id=merchant.id)
+    db.query(models.ProductAttributes).filter(models.ProductAttributes.product_id.in_(product_ids)).delete(synchronize_session=False)
+    db.query(models.ProductRaw).filter_by(merchant_id=merchant.id).delete(synchronize_session=False)
+    db.commit()
+
+
+def _report(label: str, n: int, seconds: float) -> None:
+    print(f"{label:<34}{n:>8} products {seconds:>8.2f}s {n / seconds:>10.0f} products/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--single", type=int, default=1_000, help="products to time through per-product ingest")
+    parser.add_argument("--batch", type=int, default=2_000, help="products per bulk call")
+    args = parser.parse_args()
+
+    init_db()
+    catalog = [(str(raw["id"]), raw) for raw in make_catalog(args.products)]
+    db = SessionLocal()
+    try:
+        shop = "bench-ingest.myshopify.com"
+        _clear(db, shop)
+
+        n = min(args.single, len(catalog))
+        start = time.perf_counter()
+        for shop_product_id, raw in catalog[:n]:
+            ingest_product(db, shop, shop_product_id, raw)
+        _report("per-product ingest", n, time.perf_counter() - start)
+        _clear(db, shop)
+
+        for label in ("bulk upsert (first sync)", "bulk upsert (re-sync)"):
+            start = time.perf_counter()
+            for i in range(0, len(catalog), args.batch):
+                bulk_upsert_products(db, shop, catalog[i : i + args.batch])
+            _report(label, len(catalog), time.perf_counter() - start)
+
+        _clear(db, shop)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
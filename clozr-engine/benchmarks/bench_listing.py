@@ -0,0 +1,103 @@
+# benchmarks/bench_listing.py
+"""
+GET /products and /products/search page reads against DATABASE_URL: the
+old (ProductRaw, ProductAttributes) join, which loads every row's raw
+Shopify JSON to read its title, vs the product_listings read model.
+
+Synthetic products carry --variants variants each so raw_json is about the
+size of a real Shopify payload.
+
+    python -m benchmarks.bench_listing --products 5000 --limit 100
+"""
+import argparse
+import statistics
+import time
+
+from app.db import SessionLocal
+from app.services.product_services import (
+    bulk_upsert_products,
+    list_listings_page,
+    list_products_page,
+    search_listings_page,
+    search_products_page,
+)
+from benchmarks.bench_search import make_catalog
+from benchmarks.dev_db import init_db
+
+SHOP = "bench-listing.myshopify.com"
+
+
+def _with_variants(raw: dict, n: int) -> dict:
+    variants = [
+        {"id": raw["id"] * 100 + i, "title": f"Size {i}", "price": raw["variants"][0]["price"], "sku": f"SKU-{raw['id']}-{i}",
+         "inventory_quantity": 10, "weight": 0.5, "option1": f"Size {i}"}
+        for i in range(n)
+    ]
+    return {**raw, "variants": variants, "images": [{"src": f"https://cdn.example.com/{raw['id']}/{i}.jpg"} for i in range(5)]}
+
+
+def _old_items(rows) -> list[tuple]:
+    # what the routes did before: title from raw_json
+    return [
+        (p.id, p.shop_product_id, (p.raw_json or {}).get("title", "Untitled product"),
+         a.category if a else None, a.primary_use if a else None)
+        for p, a in rows
+    ]
+
+
+def _new_items(listings) -> list[tuple]:
+    return [(x.id, x.shop_product_id, x.title or "Untitled product", x.category, x.primary_use) for x in listings]
+
+
+def _timed(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--variants", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    try:
+        catalog = [_with_variants(raw, args.variants) for raw in make_catalog(args.products)]
+        bulk_upsert_products(db, SHOP, ((str(raw["id"]), raw) for raw in catalog))
+        offset = args.products // 2
+
+        cases = [
+            ("list first page",
+             lambda: _old_items(list_products_page(db, limit=args.limit)[0]),
+             lambda: _new_items(list_listings_page(db, limit=args.limit)[0])),
+            (f"list offset {offset}",
+             lambda: _old_items(list_products_page(db, limit=args.limit, offset=offset)[0]),
+             lambda: _new_items(list_listings_page(db, limit=args.limit, offset=offset)[0])),
+            ("search category",
+             lambda: _old_items(search_products_page(db, category="hoodie", limit=args.limit)[0]),
+             lambda: _new_items(search_listings_page(db, category="hoodie", limit=args.limit)[0])),
+            ("search q",
+             lambda: _old_items(search_products_page(db, q="fleece", limit=args.limit)[0]),
+             lambda: _new_items(search_listings_page(db, q="fleece", limit=args.limit)[0])),
+        ]
+        print(f"{db.get_bind().dialect.name}, {args.products} products, {args.limit} per page")
+        print(f"{'':<22}{'raw+attrs ms':>14}{'listings ms':>14}")
+        for label, old, new in cases:
+            assert old() == new(), label
+            db.expunge_all()
+            old_ms = _timed(lambda: (old(), db.expunge_all()), args.repeat)
+            new_ms = _timed(lambda: (new(), db.expunge_all()), args.repeat)
+            print(f"{label:<22}{old_ms:>14.2f}{new_ms:>14.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_overview.py
+"""
+Cold-path latency of /shopify/products/{id}/summary generation against the
+stub LLM (benchmarks/stub_llm.py): the old sequential overview-then-questions
+calls vs get_or_generate_ai_overview, which runs both concurrently.
+
+Requests are issued one at a time so the numbers are per-request latency,
+not throughput.
+
+    python -m benchmarks.bench_overview --products 50 --delay 0.3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app import models
+from app.db import SessionLocal
+from app.services import openai_overview
+from app.services.ai_overview_services import get_or_generate_ai_overview
+from app.services.openai_overview import generate_short_overview, generate_suggested_questions
+from app.services.product_services import bulk_upsert_products
+from benchmarks.bench_search import make_catalog
+from benchmarks.dev_db import init_db
+from benchmarks.stub_llm import StubLLMServer
+
+SHOP = "bench-overview.myshopify.com"
+
+
+def _report(label: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{label:<28}{len(latencies):>6} cold {statistics.median(latencies) * 1000:>8.0f}ms p50 {p95 * 1000:>8.0f}ms p95")
+
+
+async def _sequential(db, product) -> None:
+    # what get_or_generate_ai_overview did before: two back-to-back round-trips
+    await generate_short_overview(product.raw_json or {}, {})
+    await generate_suggested_questions(product.raw_json or {}, {})
+
+
+async def _main(args) -> None:
+    stub = StubLLMServer(delay=args.delay).start()
+    openai_overview.OPENAI_BASE_URL = stub.base_url
+
+    init_db()
+    db = SessionLocal()
+    try:
+        ids = bulk_upsert_products(db, SHOP, [(str(raw["id"]), raw) for raw in make_catalog(args.products)])
+        products = db.query(models.ProductRaw).filter(models.ProductRaw.id.in_(list(ids.values()))).all()
+
+        for label, generate in (
+            ("sequential (before)", _sequential),
+            ("concurrent (after)", lambda db, product: get_or_generate_ai_overview(db, product, None)),
+        ):
+            db.query(models.ProductAIOverview).filter(
+                models.ProductAIOverview.product_id.in_(list(ids.values()))
+            ).delete(synchronize_session=False)
+            db.commit()
+
+            latencies = []
+            for product in products:
+                start = time.perf_counter()
+                await generate(db, product)
+                latencies.append(time.perf_counter() - start)
+            _report(label, latencies)
+    finally:
+        db.close()
+        await openai_overview.close_async_client()
+        stub.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.3, help="stub LLM latency per call (seconds)")
+    args = parser.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_prompt_tokens.py
+"""
+Prompt size before/after app/prompts/product_facts.py, per prompt kind, over
+the sample catalogs (the dev-store export, sample_products.json and a
+synthetic catalog). "before" rebuilds the facts the way the prompts did
+originally: raw body_html cut at 1200/900/800 characters, full Shopify
+options, null attributes, indented JSON / dict reprs. Counts are from
+text_utils.count_tokens and cover the user message, instructions included
+(the system prompts did not change); for chat, the product context block.
+
+    python -m benchmarks.bench_prompt_tokens --synthetic 1000
+"""
+import argparse
+import json
+from pathlib import Path
+
+from app.attributes import extract_attributes_from_raw
+from app.services.openai_overview import build_chat_context, build_overview_input, build_questions_input
+from app.text_utils import count_tokens
+from benchmarks.bench_search import make_catalog
+
+ROOT = Path(__file__).resolve().parents[1]
+CATALOGS = {
+    "dev-store export": ROOT.parent / "clozr-app/server/data/products_clozr_dev_store_myshopify_com.json",
+    "sample_products.json": ROOT / "sample_products.json",
+}
+
+
+def _legacy_facts(raw: dict, attrs: dict, body_chars: int, tags: bool = False, options: bool = False) -> dict:
+    variants = raw.get("variants") or []
+    v0 = variants[0] if variants else {}
+    facts = {
+        "title": raw.get("title", "") or "",
+        "vendor": raw.get("vendor", "") or "",
+        "product_type": raw.get("product_type", "") or "",
+    }
+    if tags:
+        facts["tags"] = raw.get("tags", "") or ""
+    facts["description"] = (raw.get("body_html", "") or "")[:body_chars]
+    if options:
+        facts["options"] = raw.get("options") or []
+    facts["example_variant"] = {"title": v0.get("title"), "price": v0.get("price")}
+    facts["inferred_attributes"] = attrs
+    return facts
+
+
+def _message_with_facts(message: str, facts: str) -> str:
+    # same instructions around the FACTS block, only the facts swapped
+    head, _, rest = message.partition("FACTS:\n")
+    return f"{head}FACTS:\n{facts}\n\n{rest.split(chr(10) + chr(10), 1)[1]}"
+
+
+def sizes(raw: dict, attrs: dict) -> tuple[dict, dict]:
+    overview = build_overview_input(raw, attrs)[1]["content"]
+    questions = build_questions_input(raw, attrs)[1]["content"]
+    chat = build_chat_context(raw, attrs)
+    legacy = {
+        "overview": _message_with_facts(overview, json.dumps(_legacy_facts(raw, attrs, 1200), indent=2)),
+        "questions": _message_with_facts(questions, str(_legacy_facts(raw, attrs, 900, tags=True, options=True))),
+        "chat": str(_legacy_facts(raw, attrs, 800, tags=True)),
+    }
+    current = {"overview": overview, "questions": questions, "chat": chat}
+    return (
+        {kind: count_tokens(text) for kind, text in legacy.items()},
+        {kind: count_tokens(text) for kind, text in current.items()},
+    )
+
+
+def _report(label: str, products: list[dict]) -> None:
+    before = {"overview": 0, "questions": 0, "chat": 0}
+    after = dict(before)
+    for raw in products:
+        attrs = extract_attributes_from_raw(raw)
+        legacy, current = sizes(raw, attrs)
+        for kind in before:
+            before[kind] += legacy[kind]
+            after[kind] += current[kind]
+
+    print(f"{label} ({len(products)} products)")
+    for kind in before:
+        change = after[kind] / before[kind] - 1 if before[kind] else 0.0
+        print(
+            f"  {kind:<10} before {before[kind] / len(products):>7.0f} tok/product "
+            f"after {after[kind] / len(products):>7.0f}  ({change:+.0%})"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=1000, help="synthetic catalog size (0 to skip)")
+    args = parser.parse_args()
+
+    for label, path in CATALOGS.items():
+        if path.exists():
+            data = json.loads(path.read_text())
+            _report(label, data["products"] if isinstance(data, dict) else data)
+    if args.synthetic:
+        _report("synthetic", make_catalog(args.synthetic))
+
+
+if __name__ == "__main__":
+    main()
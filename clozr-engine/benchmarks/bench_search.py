@@ -0,0 +1,141 @@
+# benchmarks/bench_search.py
+"""
+Search benchmark on a synthetic catalog.
+
+Compares the old V0 approach (Python substring scan over title/tags of every
+row) with the in-process inverted index used for SQLite runs. With --db it
+also seeds the configured DATABASE_URL and times the real
+search_products_with_attributes path (tsvector/pg_trgm on Postgres).
+
+    python -m benchmarks.bench_search --products 50000
+    DATABASE_URL=postgresql+psycopg://... python -m benchmarks.bench_search --db
+"""
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from app.services.product_services import product_columns_from_raw
+from app.services.search_services import InvertedIndex
+
+ADJECTIVES = ["classic", "heavyweight", "organic", "recycled", "relaxed", "cropped", "vintage", "waterproof", "thermal", "lightweight"]
+MATERIALS = ["cotton", "fleece", "wool", "denim", "nylon", "linen", "cashmere", "polyester"]
+PRODUCTS = ["hoodie", "tee", "jacket", "parka", "jogger", "chino", "cardigan", "sweater", "flannel", "crewneck"]
+VENDORS = ["Northbound", "Campus Co", "Field & Fog", "Urban Layer", "Peak Supply"]
+USES = ["winter", "campus", "training", "travel", "everyday", "hiking"]
+
+QUERIES = ["hoodie", "wool sweater", "waterproof jacket", "organic cotton tee", "campus", "cashmere", "jog", "northbound parka"]
+
+
+def make_catalog(n: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    catalog = []
+    for i in range(n):
+        product = rng.choice(PRODUCTS)
+        material = rng.choice(MATERIALS)
+        title = f"{rng.choice(ADJECTIVES).title()} {material.title()} {product.title()} {i}"
+        body = (
+            f"<p>A {rng.choice(ADJECTIVES)} {product} made from <strong>{material}</strong>.</p>"
+            f"<ul><li>Good for {rng.choice(USES)}</li><li>Machine wash cold</li></ul>"
+        )
+        catalog.append({
+            "id": 10_000_000 + i,
+            "title": title,
+            "tags": ", ".join(rng.sample(USES, 2) + [material]),
+            "product_type": product.title(),
+            "vendor": rng.choice(VENDORS),
+            "body_html": body,
+            "variants": [{"title": "M", "price": f"{rng.randint(20, 180)}.00"}],
+        })
+    return catalog
+
+
+def v0_scan(rows: list[dict], q: str, limit: int = 20) -> list:
+    q_lower = q.lower()
+    hits = []
+    for raw in rows:
+        title = (raw.get("title") or "").lower()
+        tags = (raw.get("tags") or "").lower()
+        if q_lower in title or q_lower in tags:
+            hits.append(raw)
+    return hits[:limit]
+
+
+def timed(fn, repeat: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def bench_in_process(catalog: list[dict], repeat: int) -> None:
+    start = time.perf_counter()
+    index = InvertedIndex()
+    for raw in catalog:
+        index.add(uuid.uuid4(), product_columns_from_raw(raw))
+    build_s = time.perf_counter() - start
+    print(f"inverted index build: {build_s:.2f}s for {len(catalog)} products ({len(index.postings)} terms)")
+
+    print(f"{'query':<22}{'v0 scan p50/p95 ms':>22}{'index p50/p95 ms':>22}{'hits':>8}")
+    for q in QUERIES:
+        scan_p50, scan_p95 = timed(lambda: v0_scan(catalog, q), repeat)
+        idx_p50, idx_p95 = timed(lambda: index.search(q, limit=20), repeat)
+        hits = len(index.search(q))
+        print(f"{q:<22}{scan_p50:>12.2f} / {scan_p95:<8.2f}{idx_p50:>12.2f} / {idx_p95:<8.2f}{hits:>8}")
+
+
+def bench_database(catalog: list[dict], repeat: int) -> None:
+    from app.db import SessionLocal
+    from app import models
+    from app.services.product_services import get_or_create_merchant, search_products_with_attributes
+    from benchmarks.dev_db import init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        merchant = get_or_create_merchant(db, "bench-store.myshopify.com")
+        existing = db.query(models.ProductRaw).filter(models.ProductRaw.merchant_id == merchant.id).count()
+        if existing < len(catalog):
+            print(f"seeding {len(catalog) - existing} products into {db.get_bind().dialect.name}...")
+            for start in range(existing, len(catalog), 5000):
+                db.add_all(
+                    models.ProductRaw(
+                        merchant_id=merchant.id,
+                        shop_product_id=str(raw["id"]),
+                        raw_json=raw,
+                        **product_columns_from_raw(raw),
+                    )
+                    for raw in catalog[start : start + 5000]
+                )
+                db.commit()
+
+        # warm-up (builds the in-process index on SQLite)
+        search_products_with_attributes(db, q=QUERIES[0])
+
+        print(f"{'query':<22}{'db search p50/p95 ms':>24}")
+        for q in QUERIES:
+            p50, p95 = timed(lambda: search_products_with_attributes(db, q=q, limit=20), repeat)
+            print(f"{q:<22}{p50:>14.2f} / {p95:<8.2f}")
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", action="store_true", help="also benchmark against DATABASE_URL")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.products)
+    bench_in_process(catalog, args.repeat)
+    if args.db:
+        bench_database(catalog, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/dev_db.py
+"""
+Database setup for benchmark and test runs against a local SQLite file.
+
+Production runs on PostgreSQL and never imports this module; SQLite lacks
+now(), which the models use as server_default, and gives columns declared
+"UUID" NUMERIC affinity. install_sqlite_shims patches both for one engine.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import functions
+
+_compiles_registered = False
+
+
+def _register_compiles() -> None:
+    global _compiles_registered
+    if _compiles_registered:
+        return
+    _compiles_registered = True
+
+    # func.now() would otherwise render as CURRENT_TIMESTAMP (whole seconds),
+    # which doesn't compare correctly against the microsecond now() UDF
+    @compiles(functions.now, "sqlite")
+    def _sqlite_now(element, compiler, **kw):
+        return "now()"
+
+    # a column declared "UUID" gets NUMERIC affinity, which turns the rare
+    # all-digit hex id (e.g. "1234...e56...") into a REAL
+    @compiles(UUID, "sqlite")
+    def _sqlite_uuid(element, compiler, **kw):
+        return "CHAR(32)"
+
+
+def install_sqlite_shims(engine) -> None:
+    """No-op unless engine is SQLite. Call before creating tables."""
+    if engine.dialect.name != "sqlite":
+        return
+    _register_compiles()
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_now_function(dbapi_conn, _record):
+        dbapi_conn.create_function(
+            "now", 0, lambda: datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+        )
+
+
+def init_db() -> None:
+    """app.create_db.init_db with the SQLite shims installed first."""
+    from app.create_db import init_db as _init_db
+    from app.db import engine
+
+    install_sqlite_shims(engine)
+    _init_db()
@@ -0,0 +1,124 @@
+# benchmarks/load_llm.py
+"""
+Storefront load test for the LLM-backed routes against a local stub LLM
+(benchmarks/stub_llm.py), so it needs no API key and costs nothing.
+
+Fires --requests concurrent calls at POST /shopify/products/chat and at cold
+GET /shopify/products/{id}/summary (products seeded into DATABASE_URL), then
+the same number of summary calls at a single cold product ("viral", which
+single-flight should serve with one generation), and reports throughput, p50/p95 latency and the peak number of LLM calls the
+stub saw in flight (capped by OPENAI_MAX_CONCURRENCY).
+
+    python -m benchmarks.load_llm --requests 200 --delay 0.3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app import models
+from app.db import SessionLocal
+from app.main import app
+from app.services import openai_overview
+from app.services.product_services import bulk_upsert_products
+from benchmarks.bench_search import make_catalog
+from benchmarks.dev_db import init_db
+from benchmarks.stub_llm import StubLLMServer
+
+SHOP = "bench-llm.myshopify.com"
+
+
+def _seed(n: int) -> list[str]:
+    catalog = [(str(raw["id"]), raw) for raw in make_catalog(n)]
+    db = SessionLocal()
+    try:
+        ids = bulk_upsert_products(db, SHOP, catalog)
+        # make every summary call cold
+        db.query(models.ProductAIOverview).filter(
+            models.ProductAIOverview.product_id.in_(list(ids.values()))
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return [shop_product_id for shop_product_id, _ in catalog]
+
+
+async def _run(label: str, n: int, call, stub: StubLLMServer) -> None:
+    stub.max_in_flight = 0
+    calls_before = stub.calls
+    latencies: list[float] = []
+
+    async def one(i: int) -> None:
+        start = time.perf_counter()
+        resp = await call(i)
+        resp.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(
+        f"{label:<10}{n:>6} req {elapsed:>7.2f}s {n / elapsed:>8.1f} req/s "
+        f"p50 {statistics.median(latencies) * 1000:>7.0f}ms p95 {p95 * 1000:>7.0f}ms "
+        f"llm calls {stub.calls - calls_before:>5} peak in flight {stub.max_in_flight:>3}"
+    )
+
+
+async def _main(args) -> None:
+    stub = StubLLMServer(delay=args.delay).start()
+    openai_overview.OPENAI_BASE_URL = stub.base_url
+    await openai_overview.close_async_client()
+
+    init_db()
+    product_ids = _seed(args.requests + 1)
+    viral_id = product_ids.pop()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://engine", timeout=None) as client:
+        await _run(
+            "chat",
+            args.requests,
+            lambda i: client.post(
+                "/shopify/products/chat",
+                json={
+                    "product_id": product_ids[i],
+                    "shop_domain": SHOP,
+                    "initial_overview": "A hoodie.",
+                    "question": "Does it run small?",
+                },
+            ),
+            stub,
+        )
+        await _run(
+            "summary",
+            args.requests,
+            lambda i: client.get(f"/shopify/products/{product_ids[i]}/summary", params={"shop": SHOP}),
+            stub,
+        )
+        await _run(
+            "viral",
+            args.requests,
+            lambda i: client.get(f"/shopify/products/{viral_id}/summary", params={"shop": SHOP}),
+            stub,
+        )
+
+    await openai_overview.close_async_client()
+    stub.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.3, help="stub LLM latency per call (seconds)")
+    args = parser.parse_args()
+    print(f"OPENAI_MAX_CONCURRENCY={openai_overview.LLM_MAX_CONCURRENCY}, stub latency {args.delay}s")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# benchmarks/stub_llm.py
+"""
+Local stand-in for the OpenAI Responses API: POST /v1/responses sleeps for a
+fixed latency (plus token_delay per extra word) and returns a canned answer (a JSON array of questions when the
+prompt asks for one, a sentence otherwise). With "stream": true the answer is
+sent as Responses API server-sent events, one word per delta, token_delay
+apart. It keeps connections alive and records how many requests were in
+flight at once, so load tests can check the client's pooling and concurrency
+limit without a network or an API key.
+
+    python -m benchmarks.stub_llm --port 8900 --delay 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 uvicorn app.main:app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_response(text: str) -> dict:
+    return {
+        "id": "resp_stub",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": "stub",
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": "msg_stub",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+    }
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so the client pool is actually exercised
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.calls += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            prompt = json.dumps(body.get("input", ""))
+            if "JSON array" in prompt:
+                text = json.dumps(["Does it run true to size?", "How should I wash it?"])
+            else:
+                text = "A midweight cotton hoodie with a relaxed fit."
+            if body.get("stream"):
+                self._stream(text)
+                return
+            # a blocking call returns once the last word would have been generated
+            time.sleep(server.token_delay * (len(text.split(" ")) - 1))
+            payload = json.dumps(make_response(text)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, text: str) -> None:
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(event: dict) -> None:
+            self._write_chunk(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+
+        send({"type": "response.created", "sequence_number": 0, "response": {**make_response(""), "status": "in_progress", "output": []}})
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            if server.stream_fail_after is not None and i >= server.stream_fail_after:
+                send({"type": "error", "code": "server_error", "message": "stub stream failure", "param": None, "sequence_number": i + 1})
+                break
+            if i:
+                time.sleep(server.token_delay)
+            send({
+                "type": "response.output_text.delta",
+                "item_id": "msg_stub",
+                "output_index": 0,
+                "content_index": 0,
+                "delta": word if i == 0 else f" {word}",
+                "logprobs": [],
+                "sequence_number": i + 1,
+            })
+        else:
+            send({"type": "response.completed", "sequence_number": len(words) + 1, "response": make_response(text)})
+        self._write_chunk(b"")  # zero-length chunk ends the body
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, delay: float = 0.2, token_delay: float = 0.01):
+        super().__init__(("127.0.0.1", port), StubLLMHandler)
+        self.delay = delay  # before the first token
+        self.token_delay = token_delay  # between streamed words
+        self.stream_fail_after: int | None = None  # streamed words before an error event
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self) -> "StubLLMServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub OpenAI Responses API for load tests.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--delay", type=float, default=0.5, help="seconds per completion")
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.port, args.delay)
+    print(f"Stub LLM on {server.base_url} ({args.delay}s per call)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# tests/conftest.py
+import os
+import tempfile
+
+import pytest
+
+# Tests run against a throwaway SQLite file unless DATABASE_URL is set
+_tmp_dir = tempfile.mkdtemp(prefix="clozr-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp_dir}/clozr_test.db")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+# LLM call counts in tests assume no background pre-answering; tests opt in
+os.environ.setdefault("PREANSWER_SUGGESTED_QUESTIONS", "0")
+
+from app.db import engine  # noqa: E402
+from benchmarks.dev_db import install_sqlite_shims  # noqa: E402
+
+install_sqlite_shims(engine)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """
+    Manually advanced stand-in for time.monotonic: set clock.now.
+    """
+    return FakeClock()
+
+
+@pytest.fixture
+def db():
+    from app.db import Base, SessionLocal, engine
+    from app.services.merchant_services import reset_merchant_cache
+    from app.services.response_cache import get_cache
+    from app.services.search_services import reset_search_index
+    import app.models  # noqa: F401
+
+    reset_search_index()
+    reset_merchant_cache()
+    get_cache().clear()
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    """
+    Local stand-in for the OpenAI Responses API (benchmarks/stub_llm.py),
+    with a fresh async client pointed at it.
+    """
+    from app.services import openai_overview
+    from benchmarks.stub_llm import StubLLMServer
+
+    server = StubLLMServer(delay=0.05).start()
+    monkeypatch.setattr(openai_overview, "OPENAI_BASE_URL", server.base_url)
+    monkeypatch.setattr(openai_overview, "_llm", openai_overview._AsyncLLMState())
+    try:
+        yield server
+    finally:
+        server.stop()
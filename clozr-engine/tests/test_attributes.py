@@ -0,0 +1,99 @@
+# tests/test_attributes.py
+from app.attributes import (
+    KeywordMatcher,
+    extract_attributes_batch,
+    extract_product_attributes,
+    infer_category,
+    min_variant_price,
+)
+
+
+def test_keywords_match_whole_words_only():
+    # "steel" is not a tee, "classic" is not a class
+    assert infer_category("Classic Steel-Blue Polo", None, []) is None
+    assert extract_product_attributes({"title": "Classic Polo", "body_html": "A classic."})["primary_use"] is None
+
+    assert infer_category("T-Shirt 3 pack", None, []) == "t-shirt"
+    assert infer_category("Slim Jeans", None, []) == "pants"
+    assert infer_category("Heavyweight Flannel Shirt", None, []) == "shirt"
+    assert infer_category("Cable Knitted Cardigan", None, []) == "sweater"
+
+
+def test_one_pass_extracts_category_use_and_warmth():
+    attrs = extract_product_attributes(
+        {
+            "title": "Fleece Joggers",
+            "product_type": "Parka",  # category evidence only
+            "tags": "Campus",
+            "body_html": '<p class="lead">Great for winter classes and the gym.</p>',
+        }
+    )
+    # jacket outranks hoodie (fleece) and pants (joggers)
+    assert attrs["category"] == "jacket"
+    assert attrs["primary_use"] == ["winter", "campus", "training"]
+    assert attrs["warmth_level"] == "high"
+
+    # markup and category words in the body don't count
+    attrs = extract_product_attributes({"title": "Beanie", "body_html": '<div class="x">Pairs with our jacket.</div>'})
+    assert (attrs["category"], attrs["primary_use"], attrs["warmth_level"]) == (None, None, None)
+
+
+def test_matcher_is_driven_by_the_rule_table():
+    matcher = KeywordMatcher({"color": (("blue", ("navy", "cobalt")), ("red", ("crimson", "burgund*")))})
+    assert matcher.match([("Burgundy and navy stripes", ("color",))]) == {"color": ["blue", "red"]}
+    assert matcher.match([("Navy", ())]) == {"color": []}
+
+
+def test_batch_is_column_wise_and_matches_single_extraction():
+    raws = [
+        {"title": "Zip Hoodie", "tags": "campus", "body_html": "<p>For winter.</p>"},
+        {"title": "Rain Shell", "body_html": "<p>Unclosed <b tag and a jog"},
+        {"title": "Gym Tee\x00", "body_html": "daily"},  # the batch separator inside a text
+        {},
+    ]
+    columns = extract_attributes_batch(raws)
+    assert columns["category"] == ["hoodie", "jacket", "t-shirt", None]
+    assert columns["primary_use"] == [["winter", "campus"], ["training"], ["campus", "training"], None]
+    for i, raw in enumerate(raws):
+        assert {field: values[i] for field, values in columns.items()} == extract_product_attributes(raw)
+
+    assert extract_attributes_batch([])["category"] == []
+
+
+def test_material_style_fit_and_sizes():
+    attrs = extract_product_attributes(
+        {
+            "title": "Oversized Graphic Tee",
+            "body_html": "<p>Heavyweight organic cotton with a relaxed drape.</p>",
+            "options": [
+                {"name": "Size", "values": ["S", "M", "L"]},
+                {"name": "Color", "values": ["Black"]},
+            ],
+        }
+    )
+    assert (attrs["material_main"], attrs["style"], attrs["fit"]) == ("organic cotton", "graphic", "oversized")
+    assert attrs["extra_metadata"] == {"sizes": ["S", "M", "L"]}
+
+    # the title's fabric beats the body's; a Fit option beats fit words
+    attrs = extract_product_attributes(
+        {
+            "title": "Merino Wool Crewneck",
+            "body_html": "Lined with cotton. Slim through the body.",
+            "options": [{"name": "Fit", "values": ["Relaxed"]}, {"name": "Title", "values": ["Default Title"]}],
+        }
+    )
+    assert (attrs["material_main"], attrs["fit"], attrs["extra_metadata"]) == ("merino wool", "relaxed", {})
+
+    # sold in several fits: no single fit, the choices go to extra_metadata
+    attrs = extract_product_attributes({"title": "Chinos", "options": [{"name": "fit", "values": ["Slim", "Regular"]}]})
+    assert (attrs["fit"], attrs["extra_metadata"]) == (None, {"fits": ["Slim", "Regular"]})
+
+
+def test_price_band_against_merchant_thresholds():
+    raw = {"variants": [{"price": "80.00"}, {"price": "45.00"}, {"price": None}]}
+    assert min_variant_price(raw) == 45.0
+    assert extract_product_attributes(raw)["price_band"] is None  # no thresholds
+    assert extract_product_attributes(raw, (30.0, 60.0))["price_band"] == "$$"
+    assert extract_product_attributes(raw, (45.0, 60.0))["price_band"] == "$"
+    assert extract_product_attributes(raw, (20.0, 40.0))["price_band"] == "$$$"
+    assert extract_product_attributes({}, (20.0, 40.0))["price_band"] is None
@@ -0,0 +1,114 @@
+# tests/test_chat_answers.py
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import models
+from app.main import app
+from app.pregenerate_overviews import pregenerate_overviews
+from app.services import chat_answer_services
+from app.services.chat_answer_services import embed_question, normalize_question, question_similarity
+from app.services.openai_overview import close_async_client
+from app.services.product_services import bulk_upsert_products
+
+SHOP = "test-shop.myshopify.com"
+
+
+def _similarity(a, b):
+    return question_similarity(normalize_question(a), normalize_question(b))
+
+
+def test_question_similarity():
+    threshold = chat_answer_services.CHAT_SIMILARITY_THRESHOLD
+    assert normalize_question("  How do I WASH it?? ") == "how do i wash it"
+    assert _similarity("What size should I get?", "Which size should I order?") >= threshold
+    assert _similarity("How do I wash it?", "how should I wash this") >= threshold
+    assert _similarity("Is it warm?", "Is it waterproof?") < threshold
+    assert _similarity("Does it run small?", "Does it run large?") < threshold
+    # negated questions never match, however close the wording
+    assert _similarity("Is the hood detachable?", "Is the hood not detachable?") < threshold
+    assert _similarity("Is it machine washable?", "Is it not machine washable?") < threshold
+    assert _similarity("Is it not machine washable?", "It's not machine washable, is it?") >= threshold
+    assert embed_question(normalize_question("what is it?")) == []
+
+
+# (stored question, new question): close wording, different answer
+DIFFERENT_QUESTIONS = [
+    ("Can I tumble dry this jacket on high heat?", "Can I tumble dry this jacket on low heat?"),
+    ("I am 6 feet tall and 200 pounds, what size should I get?", "I am 6 feet tall and 150 pounds, what size should I get?"),
+    ("Will this coat be warm enough in January?", "Will this coat be warm enough in July?"),
+]
+
+
+def test_questions_differing_in_a_number_or_word_never_match(db):
+    for stored, asked in DIFFERENT_QUESTIONS:
+        assert _similarity(stored, asked) == 0.0
+
+    product_id = bulk_upsert_products(db, SHOP, [("1", {"id": 1, "title": "Parka"})])["1"]
+    for stored, asked in DIFFERENT_QUESTIONS:
+        chat_answer_services.store_answer(db, product_id, "h", stored, f"answer to {stored}")
+        assert chat_answer_services.find_cached_answer(db, product_id, "h", asked) is None
+    # the wording of a stored question may still vary
+    assert chat_answer_services.find_cached_answer(
+        db, product_id, "h", "will this coat be warm enough in january"
+    ) == f"answer to {DIFFERENT_QUESTIONS[2][0]}"
+
+
+def test_chat_reuses_answers_for_similar_questions(stub_llm, db):
+    def ask(question):
+        return client.post(
+            "/shopify/products/chat",
+            json={"product_id": "4", "shop_domain": SHOP, "initial_overview": "A warm parka.", "question": question},
+        ).json()["response"]
+
+    def ingest(title):
+        client.post(
+            "/products/ingest/bulk",
+            json={"merchant_domain": SHOP, "products": [{"shop_product_id": "4", "raw_json": {"id": 4, "title": title}}]},
+        )
+
+    with TestClient(app) as client:
+        ingest("Parka")
+        first = ask("What size should I get?")
+        # different wording misses the response cache but hits the stored answer
+        assert ask("Which size should I order?") == first
+        assert stub_llm.calls == 1
+
+        ask("Is it waterproof?")
+        assert stub_llm.calls == 2
+        assert db.query(models.ProductChatAnswer).count() == 2
+
+        # new facts: old answers are not served, and are replaced on the next store
+        ingest("Down Parka")
+        ask("What size should I get?")
+        assert stub_llm.calls == 3
+        assert db.query(models.ProductChatAnswer).count() == 1
+
+
+def test_pregeneration_preanswers_suggested_questions(stub_llm, db, monkeypatch):
+    monkeypatch.setattr(chat_answer_services, "PREANSWER_SUGGESTED_QUESTIONS", True)
+    with TestClient(app) as client:
+        client.post(
+            "/products/ingest/bulk",
+            json={"merchant_domain": SHOP, "products": [{"shop_product_id": "8", "raw_json": {"id": 8, "title": "Tote"}}]},
+        )
+
+        async def run():
+            try:
+                return await pregenerate_overviews(SHOP)
+            finally:
+                await close_async_client()
+
+        assert asyncio.run(run()).generated == 1
+        # overview + questions + one answer per suggested question
+        assert stub_llm.calls == 4
+        answers = db.query(models.ProductChatAnswer).all()
+        assert {a.source for a in answers} == {"suggested"} and len(answers) == 2
+
+        summary = client.get("/shopify/products/8/summary", params={"shop": SHOP}).json()
+        resp = client.post(
+            "/shopify/products/chat",
+            json={"product_id": "8", "shop_domain": SHOP, "initial_overview": summary["overview"], "question": summary["suggested_questions"][0]},
+        )
+        assert resp.json()["response"] in {a.answer for a in answers}
+        assert stub_llm.calls == 4
@@ -0,0 +1,83 @@
+# tests/test_chat_streaming.py
+import asyncio
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import openai_overview
+
+SHOP = "test-shop.myshopify.com"
+
+
+def _events(client, question):
+    with client.stream(
+        "POST",
+        "/shopify/products/chat/stream",
+        json={"product_id": "4", "shop_domain": SHOP, "initial_overview": "A warm parka.", "question": question},
+    ) as resp:
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        events = []
+        for block in resp.read().decode().split("\n\n"):
+            if block.strip():
+                name, data = block.split("\n")
+                events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        return events
+
+
+def test_tokens_arrive_before_the_answer_is_complete(stub_llm):
+    stub_llm.token_delay = 0.05
+
+    async def run():
+        try:
+            # first stream pays the SDK's one-off event model setup
+            async for _ in openai_overview.stream_chat_response("A hoodie.", "Is it warm?", "{}"):
+                pass
+            started = time.perf_counter()
+            deltas = []
+            async for delta in openai_overview.stream_chat_response("A hoodie.", "Is it warm?", "{}"):
+                deltas.append((time.perf_counter() - started, delta))
+        finally:
+            await openai_overview.close_async_client()
+        return deltas
+
+    deltas = asyncio.run(run())
+    assert "".join(d for _, d in deltas) == "A midweight cotton hoodie with a relaxed fit."
+    first, last = deltas[0][0], deltas[-1][0]
+    assert last - first >= 0.05 * (len(deltas) - 1) * 0.8
+
+
+def test_stream_route_forwards_deltas_and_fills_the_chat_caches(stub_llm, db):
+    with TestClient(app) as client:
+        client.post(
+            "/products/ingest/bulk",
+            json={"merchant_domain": SHOP, "products": [{"shop_product_id": "4", "raw_json": {"id": 4, "title": "Parka"}}]},
+        )
+        events = _events(client, "Is it warm?")
+        deltas = [data["text"] for name, data in events if name == "delta"]
+        assert len(deltas) > 1
+        assert events[-1] == ("done", {"response": "".join(deltas)})
+
+        # the non-streaming route answers from what the stream stored
+        resp = client.post(
+            "/shopify/products/chat",
+            json={"product_id": "4", "shop_domain": SHOP, "initial_overview": "A warm parka.", "question": "Is it warm?"},
+        )
+        assert resp.json() == {"response": "".join(deltas)}
+        # a reworded question streams the stored answer in one piece
+        assert _events(client, "is it WARM")[0] == ("delta", {"text": "".join(deltas)})
+        assert stub_llm.calls == 1
+
+
+def test_stream_interrupted_mid_answer_reports_error_and_is_not_cached(stub_llm, db):
+    stub_llm.stream_fail_after = 3
+    with TestClient(app) as client:
+        events = _events(client, "Is it warm?")
+        assert [name for name, _ in events] == ["delta", "delta", "delta", "error"]
+
+        stub_llm.stream_fail_after = 0
+        # nothing streamed yet: the usual fallback answer, as /chat would give
+        events = _events(client, "Is it warm?")
+        assert events[-1] == ("done", {"response": openai_overview.CHAT_FALLBACK_RESPONSE})
+        assert stub_llm.calls == 2
@@ -0,0 +1,58 @@
+# tests/test_db_config.py
+import asyncio
+
+import pytest
+
+from app import db as app_db
+from app.config import settings
+from app.db import async_database_url, dispose_async_engine, engine_options, storefront_read
+from app.services.ai_overview_services import _get_overview
+from app.services.product_services import bulk_upsert_products, get_product_by_shop_id
+
+SHOP = "test-shop.myshopify.com"
+
+
+def test_pool_settings_apply_to_postgres_only():
+    options = engine_options("postgresql+psycopg://u:p@localhost/clozr")
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["pool_recycle"] == settings.DB_POOL_RECYCLE_SECONDS
+    assert options["pool_pre_ping"] is settings.DB_POOL_PRE_PING
+    assert "pool_size" not in engine_options("sqlite:///clozr.db")
+
+
+def test_async_url_swaps_driver():
+    assert async_database_url("postgresql+psycopg://u:p@localhost:5432/clozr") == "postgresql+asyncpg://u:p@localhost:5432/clozr"
+    assert async_database_url("sqlite:///clozr.db") == "sqlite+aiosqlite:///clozr.db"
+
+
+def test_storefront_reads_follow_use_async_db(monkeypatch, db):
+    async def fake_async_read(fn, *args, **kwargs):
+        return "async"
+
+    monkeypatch.setattr(app_db, "run_async_read", fake_async_read)
+    read = lambda session, value: value  # noqa: E731
+
+    assert asyncio.run(storefront_read(db, read, "threadpool")) == "threadpool"
+    monkeypatch.setattr(settings, "USE_ASYNC_DB", True)
+    assert asyncio.run(storefront_read(db, read, "threadpool")) == "async"
+
+
+def test_storefront_reads_on_a_real_async_session(monkeypatch, db):
+    pytest.importorskip("greenlet")
+    if db.get_bind().dialect.name == "postgresql":
+        pytest.importorskip("asyncpg")
+    else:
+        pytest.importorskip("aiosqlite")
+    ids = bulk_upsert_products(db, SHOP, [("1", {"id": 1, "title": "Zip Hoodie"})])
+    monkeypatch.setattr(settings, "USE_ASYNC_DB", True)
+
+    async def run():
+        try:
+            product, attrs = await storefront_read(None, get_product_by_shop_id, "1", shop_domain=SHOP)
+            overview = await storefront_read(None, _get_overview, product.id)
+            return product, attrs, overview
+        finally:
+            await dispose_async_engine()
+
+    product, attrs, overview = asyncio.run(run())
+    assert (product.id, product.title, attrs.category, overview) == (ids["1"], "Zip Hoodie", "hoodie", None)
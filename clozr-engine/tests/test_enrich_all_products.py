@@ -0,0 +1,65 @@
+# tests/test_enrich_all_products.py
+import pytest
+
+from app import models
+from app.attributes import extract_attributes_from_raw
+from app.enrich_all_products import enrich_all_products
+from app.services.product_services import bulk_upsert_products
+
+SHOP = "test-shop.myshopify.com"
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_reenriches_every_product_in_chunks(db, workers):
+    titles = ["Puffer Jacket", "Zip Hoodie", "Graphic Tee", "Wool Sweater", "Chino Pants"]
+    bulk_upsert_products(db, SHOP, [(str(i), {"id": i, "title": t}) for i, t in enumerate(titles)])
+    bulk_upsert_products(db, "other.myshopify.com", [("9", {"id": 9, "title": "Rain Shell"})])
+
+    # stale rows: attributes wiped, one missing entirely, contexts from an older render
+    db.query(models.ProductAttributes).update({"category": None})
+    first = db.query(models.ProductRaw).filter_by(shop_product_id="0").one()
+    db.query(models.ProductAttributes).filter_by(product_id=first.id).delete()
+    db.query(models.ProductPromptContext).update({"context_hash": "stale"})
+    db.commit()
+
+    stats = enrich_all_products(chunk_size=2, workers=workers)
+    assert (stats.products, stats.chunks) == (6, 3)
+    assert stats.products_per_second > 0
+
+    db.expire_all()
+    for raw in db.query(models.ProductRaw):
+        attrs = db.query(models.ProductAttributes).filter_by(product_id=raw.id).one()
+        assert attrs.category == extract_attributes_from_raw(raw.raw_json)["category"]
+    assert db.query(models.ProductPromptContext).filter_by(context_hash="stale").count() == 0
+
+
+def test_scoped_to_one_shop(db):
+    bulk_upsert_products(db, SHOP, [("1", {"id": 1, "title": "Zip Hoodie"})])
+    bulk_upsert_products(db, "other.myshopify.com", [("2", {"id": 2, "title": "Rain Shell"})])
+
+    assert enrich_all_products(shop_domain=SHOP).products == 1
+    assert enrich_all_products(shop_domain="missing.myshopify.com").products == 0
+
+
+def test_finished_chunks_survive_a_failure(db, monkeypatch):
+    from app import enrich_all_products as enrich_module
+
+    bulk_upsert_products(db, SHOP, [(str(i), {"id": i, "title": "Zip Hoodie"}) for i in range(4)])
+    db.query(models.ProductAttributes).update({"category": None})
+    db.commit()
+
+    calls = []
+
+    def upsert_listings(conn, rows):
+        calls.append(rows)
+        if len(calls) == 2:
+            raise RuntimeError("listing write failed")
+
+    monkeypatch.setattr(enrich_module, "upsert_listings", upsert_listings)
+    with pytest.raises(RuntimeError):
+        enrich_all_products(chunk_size=2)
+
+    db.expire_all()
+    categories = [category for (category,) in db.query(models.ProductAttributes.category)]
+    # the first chunk was committed before the second one failed
+    assert categories.count("hoodie") == 2 and categories.count(None) == 2
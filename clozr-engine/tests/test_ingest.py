@@ -0,0 +1,65 @@
+# tests/test_ingest.py
+from uuid import UUID
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.main import app
+from app.services import product_services
+
+client = TestClient(app)
+
+
+def _payload(titles):
+    return {
+        "merchant_domain": "test-shop.myshopify.com",
+        "products": [
+            {"shop_product_id": str(i), "raw_json": {"id": i, "title": title, "tags": "winter"}}
+            for i, title in enumerate(titles)
+        ],
+    }
+
+
+def test_bulk_ingest_is_idempotent(db):
+    resp = client.post("/products/ingest/bulk", json=_payload(["Zip Hoodie", "Puffer Jacket"]))
+    assert resp.status_code == 200
+    first_ids = resp.json()["product_ids"]
+    assert resp.json()["count"] == 2
+
+    resp = client.post("/products/ingest/bulk", json=_payload(["Zip Hoodie v2", "Puffer Jacket"]))
+    assert resp.json()["product_ids"] == first_ids
+
+    db.expire_all()
+    assert db.query(models.ProductRaw).count() == 2
+    assert db.query(models.ProductAttributes).count() == 2
+
+    hoodie = db.get(models.ProductRaw, UUID(first_ids["0"]))
+    assert hoodie.title == "Zip Hoodie v2"
+    assert hoodie.raw_json["title"] == "Zip Hoodie v2"
+
+    attrs = db.query(models.ProductAttributes).filter_by(product_id=hoodie.id).one()
+    assert attrs.category == "hoodie"
+    assert attrs.primary_use == ["winter"]
+
+
+def test_bulk_ingest_last_duplicate_wins(db):
+    payload = _payload(["Old Title"])
+    payload["products"].append({"shop_product_id": "0", "raw_json": {"title": "New Title"}})
+
+    resp = client.post("/products/ingest/bulk", json=payload)
+    assert resp.json()["count"] == 1
+    assert db.query(models.ProductRaw).one().title == "New Title"
+
+
+def test_failed_sync_leaves_nothing_behind(db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("listing write failed")
+
+    monkeypatch.setattr(product_services, "upsert_listings", fail)
+    with pytest.raises(RuntimeError):
+        product_services.bulk_upsert_products(db, "new-shop.myshopify.com", [("1", {"title": "Scarf"})])
+
+    # the new merchant row is rolled back with the products
+    assert db.query(models.Merchant).count() == 0
+    assert db.query(models.ProductRaw).count() == 0
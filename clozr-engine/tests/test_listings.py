@@ -0,0 +1,76 @@
+# tests/test_listings.py
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import main, models
+from app.db import engine
+from app.enrich_all_products import enrich_all_products
+from app.migrations import _0008_product_listings
+from app.services.product_services import bulk_upsert_products
+
+SHOP = "test-shop.myshopify.com"
+RAWS = [
+    ("1", {"id": 1, "title": "Zip Hoodie", "tags": "winter", "variants": [{"price": "60"}, {"price": "55"}]}),
+    ("2", {"id": 2, "title": "Puffer Jacket", "body_html": "For snow days."}),
+]
+
+client = TestClient(main.app)
+
+
+def _listings(db) -> dict:
+    db.expire_all()
+    return {
+        row.shop_product_id: (row.title, row.category, row.primary_use, row.price)
+        for row in db.query(models.ProductListing)
+    }
+
+
+def test_listing_maintained_on_ingest_and_enrich(db):
+    ids = bulk_upsert_products(db, SHOP, RAWS)
+    assert _listings(db) == {
+        "1": ("Zip Hoodie", "hoodie", ["winter"], 55.0),
+        "2": ("Puffer Jacket", "jacket", ["winter"], None),
+    }
+    product = db.get(models.ProductRaw, ids["1"])
+    assert db.get(models.ProductListing, ids["1"]).created_at == product.created_at
+
+    bulk_upsert_products(db, SHOP, [("1", {"id": 1, "title": "Zip Hoodie v2", "variants": [{"price": "40"}]})])
+    assert _listings(db)["1"] == ("Zip Hoodie v2", "hoodie", None, 40.0)
+
+    db.query(models.ProductListing).update({"category": None})
+    db.commit()
+    enrich_all_products()
+    assert _listings(db)["2"][1] == "jacket"
+
+
+def test_list_and_search_routes_never_read_raw_json(db):
+    bulk_upsert_products(db, SHOP, RAWS)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        listed = client.get("/products").json()
+        found = client.get("/products/search", params={"q": "hoodie", "primary_use": "winter"}).json()
+        filtered = client.get("/products/search", params={"category": "Jacket"}).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert [item["title"] for item in listed] == ["Zip Hoodie", "Puffer Jacket"]
+    assert [item["shop_product_id"] for item in found] == ["1"]
+    assert [item["category"] for item in filtered] == ["jacket"]
+    assert statements and not any("raw_json" in s for s in statements)
+
+
+def test_migration_backfills_missing_listings(db):
+    bulk_upsert_products(db, SHOP, RAWS)
+    expected = _listings(db)
+    db.query(models.ProductListing).delete()
+    db.commit()
+
+    with engine.begin() as conn:
+        _0008_product_listings(conn)
+
+    assert _listings(db) == expected
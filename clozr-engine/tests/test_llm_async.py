@@ -0,0 +1,165 @@
+# tests/test_llm_async.py
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.db import SessionLocal
+from app.main import app
+from app.services import ai_overview_services, openai_overview
+
+SHOP = "test-shop.myshopify.com"
+
+
+def test_concurrent_generation_respects_semaphore(stub_llm, monkeypatch):
+    monkeypatch.setattr(openai_overview, "LLM_MAX_CONCURRENCY", 3)
+
+    async def run():
+        try:
+            return await asyncio.gather(
+                *(openai_overview.generate_short_overview({"title": f"Hoodie {i}"}, {}) for i in range(9))
+            )
+        finally:
+            await openai_overview.close_async_client()
+
+    overviews = asyncio.run(run())
+
+    assert len(overviews) == 9 and all(overviews)
+    assert stub_llm.calls == 9
+    assert stub_llm.max_in_flight <= 3
+
+
+def test_summary_and_chat_routes(stub_llm, db):
+    with TestClient(app) as client:
+        client.post(
+            "/products/ingest/bulk",
+            json={"merchant_domain": SHOP, "products": [{"shop_product_id": "42", "raw_json": {"id": 42, "title": "Zip Hoodie"}}]},
+        )
+
+        resp = client.get("/shopify/products/42/summary", params={"shop": SHOP})
+        assert resp.status_code == 200
+        assert resp.json()["overview"]
+        assert len(resp.json()["suggested_questions"]) == 2
+        calls = stub_llm.calls
+
+        # second call is served from product_ai_overviews
+        assert client.get("/shopify/products/42/summary", params={"shop": SHOP}).status_code == 200
+        assert stub_llm.calls == calls
+
+        # the same Shopify id can exist in another shop: the shop is required
+        resp = client.get("/shopify/products/42/summary")
+        assert resp.status_code == 400
+        assert "shop" in resp.json()["detail"]
+
+        resp = client.post(
+            "/shopify/products/chat",
+            json={"product_id": "42", "shop_domain": SHOP, "initial_overview": "A hoodie.", "question": "Is it warm?"},
+        )
+        assert resp.status_code == 200
+        assert resp.json()["response"]
+
+
+def test_cold_summary_generates_overview_and_questions_concurrently(stub_llm, db):
+    with TestClient(app) as client:
+        client.post(
+            "/products/ingest/bulk",
+            json={"merchant_domain": SHOP, "products": [{"shop_product_id": "7", "raw_json": {"id": 7, "title": "Parka"}}]},
+        )
+        assert client.get("/shopify/products/7/summary", params={"shop": SHOP}).status_code == 200
+
+    assert stub_llm.calls == 2
+    assert stub_llm.max_in_flight == 2
+
+
+def test_concurrent_cold_misses_share_one_generation(stub_llm, db):
+    import httpx
+
+    TestClient(app).post(
+        "/products/ingest/bulk",
+        json={"merchant_domain": SHOP, "products": [{"shop_product_id": "9", "raw_json": {"id": 9, "title": "Viral Tee"}}]},
+    )
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://engine") as client:
+            try:
+                return await asyncio.gather(
+                    *(client.get("/shopify/products/9/summary", params={"shop": SHOP}) for _ in range(8))
+                )
+            finally:
+                await openai_overview.close_async_client()
+
+    responses = asyncio.run(run())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.json()["overview"] for r in responses}) == 1
+    # one overview + one questions call for all eight requests
+    assert stub_llm.calls == 2
+
+
+@pytest.mark.parametrize("expires_in, waits", [(60, True), (-1, False)])
+def test_generation_waits_on_another_workers_lease_row(stub_llm, db, monkeypatch, expires_in, waits):
+    monkeypatch.setattr(ai_overview_services, "LEASE_POLL_SECONDS", 0.01)
+    TestClient(app).post(
+        "/products/ingest/bulk",
+        json={"merchant_domain": SHOP, "products": [{"shop_product_id": "11", "raw_json": {"id": 11, "title": "Rain Shell"}}]},
+    )
+    product = db.query(models.ProductRaw).filter_by(shop_product_id="11").one()
+    db.add(models.ProductAIOverviewLease(
+        product_id=product.id,
+        holder="other-worker",
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+    ))
+    db.commit()
+
+    def other_worker_releases():
+        session = SessionLocal()
+        try:
+            session.query(models.ProductAIOverviewLease).filter_by(holder="other-worker").delete()
+            session.commit()
+        finally:
+            session.close()
+
+    async def run():
+        import httpx
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://engine") as client:
+            try:
+                request = asyncio.create_task(client.get("/shopify/products/11/summary", params={"shop": SHOP}))
+                await asyncio.sleep(0.3)
+                calls_while_held = stub_llm.calls
+                await asyncio.to_thread(other_worker_releases)
+                return calls_while_held, await request
+            finally:
+                await openai_overview.close_async_client()
+
+    calls_while_held, response = asyncio.run(run())
+
+    assert response.status_code == 200
+    # a live lease holds the caller off; an expired one is taken over
+    assert calls_while_held == (0 if waits else 2)
+    assert stub_llm.calls == 2
+    db.expire_all()
+    assert db.query(models.ProductAIOverviewLease).count() == 0
+
+
+def test_resync_regenerates_only_when_prompt_inputs_change(stub_llm, db):
+    def ingest(raw):
+        client.post("/products/ingest/bulk", json={"merchant_domain": SHOP, "products": [{"shop_product_id": "5", "raw_json": raw}]})
+
+    with TestClient(app) as client:
+        ingest({"id": 5, "title": "Fleece", "updated_at": "2024-01-01"})
+        first = client.get("/shopify/products/5/summary", params={"shop": SHOP}).json()
+        assert stub_llm.calls == 2
+
+        # re-sync with a field the prompts don't use -> cached row still current
+        ingest({"id": 5, "title": "Fleece", "updated_at": "2024-02-01"})
+        assert client.get("/shopify/products/5/summary", params={"shop": SHOP}).json() == first
+        assert stub_llm.calls == 2
+
+        ingest({"id": 5, "title": "Polar Fleece", "updated_at": "2024-03-01"})
+        client.get("/shopify/products/5/summary", params={"shop": SHOP})
+        assert stub_llm.calls == 4
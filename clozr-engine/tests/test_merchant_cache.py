@@ -0,0 +1,79 @@
+# tests/test_merchant_cache.py
+from sqlalchemy import event
+
+from app import models
+from app.db import engine
+from app.services.merchant_services import (
+    MerchantCache,
+    get_or_create_merchant_id,
+    merchant_cache,
+    resolve_merchant_id,
+)
+from app.services.product_services import bulk_upsert_products, get_product_by_shop_id
+
+SHOP = "test-shop.myshopify.com"
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self)
+
+
+def test_negative_entries_expire(clock):
+    cache = MerchantCache(negative_ttl_seconds=30, clock=clock)
+    assert cache.lookup(SHOP) == (False, None)
+    cache.store(SHOP, None)
+    assert cache.lookup(SHOP) == (True, None)
+
+    clock.now = 31
+    assert cache.lookup(SHOP) == (False, None)
+    assert cache.stats()["negative_hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_resolution_is_cached_and_creation_clears_negative(db):
+    with QueryCounter() as queries:
+        assert resolve_merchant_id(db, SHOP) is None
+        assert resolve_merchant_id(db, SHOP) is None
+    assert queries.count == 1
+
+    merchant_id = get_or_create_merchant_id(db, SHOP)
+    db.commit()
+    with QueryCounter() as queries:
+        assert resolve_merchant_id(db, SHOP) == merchant_id
+    assert queries.count == 0
+
+
+def test_creation_is_part_of_the_callers_transaction(db):
+    get_or_create_merchant_id(db, SHOP)
+    db.rollback()
+    assert db.query(models.Merchant).count() == 0
+    # the rolled-back id was never cached
+    assert merchant_cache.lookup(SHOP) == (False, None)
+
+
+def test_concurrent_creation_converges_on_one_row(db):
+    first = get_or_create_merchant_id(db, SHOP)
+    # another worker's process: nothing cached, the row already exists
+    merchant_cache.clear()
+    assert get_or_create_merchant_id(db, SHOP) == first
+    assert db.query(models.Merchant).count() == 1
+
+
+def test_storefront_lookup_uses_cached_merchant(db):
+    bulk_upsert_products(db, SHOP, [("7", {"id": 7, "title": "Scarf"})])
+    with QueryCounter() as queries:
+        raw, _ = get_product_by_shop_id(db, "7", shop_domain=SHOP)
+        assert get_product_by_shop_id(db, "7", shop_domain="other.myshopify.com") is None
+    assert raw.raw_json["title"] == "Scarf"
+    # one product query plus one merchant query for the unknown shop
+    assert queries.count == 2
@@ -0,0 +1,65 @@
+# tests/test_pagination.py
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from app import models
+from app.main import app
+from app.services import product_services
+from app.services.listing_services import listing_row, upsert_listings
+
+client = TestClient(app)
+
+
+def _seed(db, n, same_timestamp=False):
+    merchant = product_services.get_or_create_merchant(db, "test-shop.myshopify.com")
+    ts = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i in range(n):
+        raw = {"id": i, "title": f"Wool Sweater {i}", "tags": "winter"}
+        product = models.ProductRaw(
+            merchant_id=merchant.id,
+            shop_product_id=str(i),
+            raw_json=raw,
+            created_at=ts if same_timestamp else None,
+            **product_services.product_columns_from_raw(raw),
+        )
+        db.add(product)
+        db.flush()
+        # the list/search routes read the product_listings read model
+        upsert_listings(db, [listing_row(product.id, merchant.id, str(i), product.created_at, raw, {})])
+    db.commit()
+
+
+def _crawl(path, params):
+    seen = []
+    cursor = None
+    while True:
+        resp = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert resp.status_code == 200
+        seen += [item["shop_product_id"] for item in resp.json()]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            return seen
+
+
+def test_cursor_walks_whole_catalog_when_timestamps_tie(db):
+    _seed(db, 23, same_timestamp=True)
+
+    seen = _crawl("/products", {"limit": 5})
+    assert len(seen) == 23
+    assert len(set(seen)) == 23
+
+
+def test_search_cursor_walks_ranked_results(db):
+    _seed(db, 12)
+
+    seen = _crawl("/products/search", {"q": "sweater", "limit": 5})
+    assert sorted(seen, key=int) == [str(i) for i in range(12)]
+
+    rows, _ = product_services.search_products_page(db, q="sweater", limit=12)
+    assert seen == [p.shop_product_id for p, _ in rows]
+
+
+def test_invalid_cursor_is_rejected(db):
+    resp = client.get("/products", params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
@@ -0,0 +1,105 @@
+# tests/test_pregenerate_overviews.py
+import asyncio
+import json
+
+from app import models
+from app.pregenerate_overviews import apply_batch_results, pregenerate_overviews, write_batch_requests
+from app.services.ai_overview_services import attrs_to_dict
+from app.services.openai_overview import MODEL, close_async_client, overview_input_hash
+from app.services.product_services import bulk_upsert_products
+from app.services.response_cache import get_cache, product_tag
+from benchmarks.stub_llm import make_response
+
+SHOP = "test-shop.myshopify.com"
+
+
+def _seed(db, n):
+    return bulk_upsert_products(db, SHOP, [(str(i), {"id": i, "title": f"Hoodie {i}"}) for i in range(n)])
+
+
+def _run(**kwargs):
+    async def run():
+        try:
+            return await pregenerate_overviews(SHOP, **kwargs)
+        finally:
+            await close_async_client()
+
+    return asyncio.run(run())
+
+
+def test_generates_missing_and_stale_overviews_and_resumes(stub_llm, db):
+    ids = _seed(db, 5)
+    fresh, stale = ids["0"], ids["1"]
+    current = overview_input_hash({"id": 0, "title": "Hoodie 0"}, attrs_to_dict(db.query(models.ProductAttributes).filter_by(product_id=fresh).one()))
+    db.add(models.ProductAIOverview(product_id=fresh, overview="cached", suggested_questions=["a?", "b?"], model=MODEL, input_hash=current))
+    # generated before input hashes existed
+    db.add(models.ProductAIOverview(product_id=stale, overview="old", suggested_questions=["a?", "b?"], model=MODEL))
+    db.commit()
+
+    first = _run(page_size=2, limit=2, concurrency=2)
+    assert (first.generated, first.failed) == (2, 0)
+
+    rest = _run(page_size=2, resume_after=first.last_product_id)
+    assert rest.generated == 2
+
+    db.expire_all()
+    rows = {row.product_id: row for row in db.query(models.ProductAIOverview).all()}
+    assert len(rows) == 5
+    assert rows[fresh].overview == "cached"
+    assert rows[stale].overview != "old" and rows[stale].input_hash
+    assert all(len(row.suggested_questions) == 2 for row in rows.values())
+    # overview + questions per generated product, nothing for the fresh one
+    assert stub_llm.calls == 8
+
+    assert _run().generated == 0
+
+
+def test_batch_api_round_trip(db, tmp_path):
+    ids = _seed(db, 3)
+    batch_input = tmp_path / "batch_input.jsonl"
+    assert write_batch_requests(SHOP, str(batch_input)) == 3
+
+    requests = [json.loads(line) for line in batch_input.read_text().splitlines()]
+    assert len(requests) == 6
+    assert {r["url"] for r in requests} == {"/v1/responses"}
+
+    batch_output = tmp_path / "batch_output.jsonl"
+    with open(batch_output, "w") as f:
+        for r in requests:
+            text = '["Is it warm?", "Does it shrink?"]' if ":questions:" in r["custom_id"] else "A cotton hoodie."
+            status = 500 if r["custom_id"].startswith(f"{ids['0']}:overview") else 200
+            f.write(json.dumps({"custom_id": r["custom_id"], "response": {"status_code": status, "body": make_response(text)}}) + "\n")
+
+    # the third product changed after the batch was written: its results are stale
+    bulk_upsert_products(db, SHOP, [("2", {"id": 2, "title": "Hoodie 2 (renamed)"})])
+    # summaries cached before the results land must not outlive them
+    cache = get_cache()
+    cache.set("clozr:summary:1", b"old summary", 60, tags=[product_tag("1")])
+
+    stats = apply_batch_results(str(batch_output))
+    assert (stats.generated, stats.failed) == (1, 2)
+    rows = db.query(models.ProductAIOverview).all()
+    assert {row.overview for row in rows} == {"A cotton hoodie."}
+    assert rows[0].suggested_questions == ["Is it warm?", "Does it shrink?"]
+    assert cache.get("clozr:summary:1") is None
+
+
+def test_batch_apply_skips_malformed_lines(db, tmp_path):
+    ids = _seed(db, 1)
+    batch_input = tmp_path / "batch_input.jsonl"
+    write_batch_requests(SHOP, str(batch_input))
+
+    batch_output = tmp_path / "batch_output.jsonl"
+    with open(batch_output, "w") as f:
+        # an error line without a custom_id and one from someone else's batch
+        f.write(json.dumps({"error": {"message": "expired"}}) + "\n")
+        f.write(json.dumps({"custom_id": "request-1", "response": {"status_code": 200}}) + "\n")
+        f.write(json.dumps({"custom_id": "not-a-uuid:overview:abc", "response": {"status_code": 200}}) + "\n")
+        for line in batch_input.read_text().splitlines():
+            custom_id = json.loads(line)["custom_id"]
+            text = '["Is it warm?"]' if ":questions:" in custom_id else "A cotton hoodie."
+            f.write(json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": make_response(text)}}) + "\n")
+
+    stats = apply_batch_results(str(batch_output))
+    assert (stats.generated, stats.failed) == (1, 3)
+    assert db.get(models.ProductAIOverview, ids["0"]).overview == "A cotton hoodie."
@@ -0,0 +1,77 @@
+# tests/test_price_bands.py
+from app import models
+from app.enrich_all_products import enrich_all_products
+from app.migrations import _0007_product_min_price
+from app.db import engine
+from app.services import price_band_services
+from app.services.price_band_services import ensure_price_bands
+from app.services.product_services import bulk_upsert_products
+
+SHOP = "test-shop.myshopify.com"
+
+
+def _product(i: int, price: float) -> tuple[str, dict]:
+    return str(i), {"id": i, "title": f"Tee {i}", "variants": [{"price": f"{price:.2f}"}, {"price": "999"}]}
+
+
+def _bands(db) -> dict:
+    return {
+        raw.shop_product_id: attrs.price_band
+        for raw, attrs in db.query(models.ProductRaw, models.ProductAttributes).join(
+            models.ProductAttributes, models.ProductAttributes.product_id == models.ProductRaw.id
+        )
+    }
+
+
+def test_bands_are_merchant_percentiles_of_min_price(db):
+    bulk_upsert_products(db, SHOP, [_product(i, 10 * (i + 1)) for i in range(10)])  # 10..100
+    bulk_upsert_products(db, "other.myshopify.com", [_product(99, 500)])
+
+    row = db.query(models.MerchantPriceBands).join(models.Merchant).filter(models.Merchant.shop_domain == SHOP).one()
+    assert (row.low_max, row.high_min, row.product_count) == (39.7, 70.3, 10)
+    bands = _bands(db)
+    assert [bands[str(i)] for i in range(10)] == ["$"] * 3 + ["$$"] * 4 + ["$$$"] * 3
+    # a one-product shop is its own scale, not the first shop's
+    assert bands["99"] == "$"
+
+
+def test_first_sync_is_banded_against_the_whole_sync(db):
+    # chunks are not banded against only the rows written before them
+    bulk_upsert_products(db, SHOP, [_product(i, i + 1) for i in range(30)], chunk_size=10)
+    bands = list(_bands(db).values())
+    assert (bands.count("$"), bands.count("$$"), bands.count("$$$")) == (10, 10, 10)
+
+
+def test_recomputed_only_after_enough_writes(db, monkeypatch):
+    bulk_upsert_products(db, SHOP, [_product(i, 10 * (i + 1)) for i in range(10)])
+    merchant_id = db.query(models.Merchant.id).filter_by(shop_domain=SHOP).scalar()
+
+    def no_scan(*args):
+        raise AssertionError("bands should not be recomputed")
+
+    # +1 product (10%) keeps the stored thresholds without touching the catalog
+    monkeypatch.setattr(price_band_services, "compute_price_bands", no_scan)
+    bulk_upsert_products(db, SHOP, [_product(10, 1000)])
+    assert ensure_price_bands(db, merchant_id) == (39.7, 70.3)
+    monkeypatch.undo()
+
+    bulk_upsert_products(db, SHOP, [_product(i, 2000) for i in range(11, 20)])
+    assert ensure_price_bands(db, merchant_id) == (72.7, 999.0)
+    assert db.get(models.MerchantPriceBands, merchant_id).changes_since == 0
+
+
+def test_enrich_refreshes_bands_and_backfill_fills_min_price(db):
+    bulk_upsert_products(db, SHOP, [_product(i, 10 * (i + 1)) for i in range(3)])
+    # as if ingested before min_price existed
+    db.query(models.ProductRaw).update({"min_price": None})
+    db.query(models.MerchantPriceBands).delete()
+    db.query(models.ProductAttributes).update({"price_band": None})
+    db.commit()
+
+    with engine.begin() as conn:
+        _0007_product_min_price(conn)
+    enrich_all_products()
+
+    db.expire_all()
+    assert sorted(p for (p,) in db.query(models.ProductRaw.min_price)) == [10.0, 20.0, 30.0]
+    assert _bands(db) == {"0": "$", "1": "$$", "2": "$$$"}
@@ -0,0 +1,44 @@
+# tests/test_product_facts.py
+from app.prompts.product_facts import description_sentences, extract_product_facts, facts_json
+from app.text_utils import count_tokens
+
+RAW = {
+    "title": "Trail Fleece",
+    "vendor": "Northbound",
+    "product_type": "",
+    "body_html": (
+        "<p>Trail Fleece</p><p>Warm <b>grid</b> fleece for cold hikes. Machine wash cold.</p>"
+        "<ul><li>warm grid fleece for cold hikes!</li><li>Zip chest pocket.</li></ul>"
+    ),
+    "options": [
+        {"id": 1, "product_id": 9, "name": "Size", "position": 1, "values": ["S", "M"]},
+        {"id": 2, "product_id": 9, "name": "Title", "position": 2, "values": ["Default Title"]},
+    ],
+    "variants": [{"id": 5, "title": "S", "price": "89.00", "sku": "TF-S"}],
+}
+
+
+def test_facts_are_stripped_deduplicated_and_compact():
+    assert description_sentences(RAW["body_html"], skip=[RAW["title"]]) == [
+        "Warm grid fleece for cold hikes.",
+        "Machine wash cold.",
+        "Zip chest pocket.",
+    ]
+
+    facts = extract_product_facts(RAW, {"category": "fleece", "fit": None, "primary_use": []}, 500, include_options=True)
+    assert facts == {
+        "title": "Trail Fleece",
+        "vendor": "Northbound",
+        "description": "Warm grid fleece for cold hikes. Machine wash cold. Zip chest pocket.",
+        "options": [{"name": "Size", "values": ["S", "M"]}],
+        "example_variant": {"title": "S", "price": "89.00"},
+        "inferred_attributes": {"category": "fleece"},
+    }
+
+
+def test_description_is_packed_into_the_budget():
+    long_raw = {**RAW, "body_html": " ".join(f"<p>Feature number {i} is described in detail here.</p>" for i in range(200))}
+    for budget in (80, 150, 300):
+        facts = extract_product_facts(long_raw, {}, budget)
+        assert count_tokens(facts_json(facts)) <= budget * 1.1
+        assert facts["description"].startswith("Feature number 0 is")
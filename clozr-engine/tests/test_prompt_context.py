@@ -0,0 +1,72 @@
+# tests/test_prompt_context.py
+import json
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from app import main, models
+from app.db import engine
+from app.migrations import _0006_product_prompt_contexts
+from app.services.product_services import bulk_upsert_products
+from app.text_utils import count_tokens
+
+SHOP = "test-shop.myshopify.com"
+RAW = {"id": 11, "title": "Rain Jacket", "body_html": "<p>Fully <b>taped</b> seams.</p><script>x()</script>"}
+
+
+def test_context_rendered_on_ingest_and_used_by_chat(stub_llm, db, monkeypatch):
+    ids = bulk_upsert_products(db, SHOP, [("11", RAW)])
+    row = db.get(models.ProductPromptContext, ids["11"])
+    context = json.loads(row.context)
+    assert context["description"] == "Fully taped seams."
+    assert "<" not in row.context
+    assert row.token_count == count_tokens(row.context) > 0
+
+    def no_join(*args, **kwargs):
+        raise AssertionError("chat should read the stored prompt context")
+
+    monkeypatch.setattr(main, "get_product_by_shop_id", no_join)
+    with TestClient(main.app) as client:
+        resp = client.post(
+            "/shopify/products/chat",
+            json={"product_id": "11", "shop_domain": SHOP, "initial_overview": "A rain jacket.", "question": "Is it waterproof?"},
+        )
+    assert resp.status_code == 200 and resp.json()["response"]
+
+    # re-ingest refreshes the context in place
+    old_hash = row.context_hash
+    bulk_upsert_products(db, SHOP, [("11", {**RAW, "title": "Storm Jacket"})])
+    db.expire_all()
+    assert db.get(models.ProductPromptContext, ids["11"]).context_hash != old_hash
+
+
+def test_migration_backfills_missing_contexts(db):
+    ids = bulk_upsert_products(db, SHOP, [("11", RAW), ("12", {"id": 12, "title": "Beanie"})])
+    expected = {r.product_id: r.context_hash for r in db.query(models.ProductPromptContext)}
+    db.query(models.ProductPromptContext).delete()
+    db.commit()
+
+    with engine.begin() as conn:
+        _0006_product_prompt_contexts(conn)
+
+    assert {r.product_id: r.context_hash for r in db.query(models.ProductPromptContext)} == expected
+    assert set(expected) == set(ids.values())
+
+
+def test_ingest_modules_import_without_openai_key():
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.services.product_services, app.enrich_all_products, app.migrations"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_count_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens("Warm, soft hoodie.") == 5
+    assert count_tokens("Price: $129.99") == 6
@@ -0,0 +1,225 @@
+# tests/test_response_cache.py
+import asyncio
+import fnmatch
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from app import models
+from app.main import app
+from app.services.openai_overview import MODEL, PROMPT_VERSION
+from app.services.response_cache import (
+    ENTRY_OVERHEAD_BYTES,
+    CacheBackend,
+    LRUCache,
+    RedisCacheBackend,
+    get_cache,
+    get_or_compute,
+    set_cache,
+    versioned_key,
+)
+
+SHOP = "test-shop.myshopify.com"
+
+
+def test_evicts_least_recently_used_by_bytes():
+    entry = 100 + ENTRY_OVERHEAD_BYTES
+    cache = LRUCache(max_bytes=3 * entry, ttl_seconds=60)
+    for key in "abc":
+        cache.set(key, b"x" * 100)
+    cache.get("a")  # a is now most recent
+    cache.set("d", b"x" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["bytes"] == 3 * entry
+    assert stats["evictions"] == 1
+
+    # a payload bigger than the whole budget is simply not cached
+    cache.set("huge", b"x" * (4 * entry))
+    assert cache.get("huge") is None and cache.stats()["entries"] == 3
+
+
+def test_ttl_and_tag_invalidation(clock):
+    cache = LRUCache(max_bytes=10_000, ttl_seconds=10, clock=clock)
+    cache.set(("shop-a", "1"), b"one", tags=["1"])
+    cache.set((None, "1"), b"one", tags=["1"])
+    cache.set(("shop-a", "2"), b"two", tags=["2"])
+
+    assert cache.invalidate_tags(["1"]) == 2
+    assert cache.get(("shop-a", "1")) is None and cache.get((None, "1")) is None
+
+    clock.now = 11
+    assert cache.get(("shop-a", "2")) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_summary_served_from_cache_until_reingest(stub_llm, db):
+    def ingest(title):
+        client.post(
+            "/products/ingest/bulk",
+            json={"merchant_domain": SHOP, "products": [{"shop_product_id": "3", "raw_json": {"id": 3, "title": title}}]},
+        )
+
+    with TestClient(app) as client:
+        ingest("Beanie")
+        first = client.get("/shopify/products/3/summary", params={"shop": SHOP})
+        assert first.status_code == 200
+
+        # hits never reach the database
+        db.query(models.ProductAIOverview).delete()
+        db.commit()
+        assert client.get("/shopify/products/3/summary", params={"shop": SHOP}).json() == first.json()
+        assert get_cache().stats()["hits"] == 1
+
+        ingest("Wool Beanie")
+        resp = client.get("/shopify/products/3/summary", params={"shop": SHOP})
+        assert resp.json()["title"] == "Wool Beanie"
+
+        stats = client.get("/cache/stats").json()["responses"]
+        assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+class FakeRedis:
+    """
+    Just the commands RedisCacheBackend uses (no expiry).
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(k, None) is not None for k in keys)
+
+    def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(member)
+
+    def smembers(self, key):
+        return set(self.data.get(key, ()))
+
+    def pexpire(self, key, ms):
+        pass
+
+    def eval(self, script, numkeys, key, token):
+        # only the release-lock compare-and-delete script is used
+        if self.data.get(key) == token:
+            return self.delete(key)
+        return 0
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+            def execute(self):
+                redis.round_trips += 1
+                return [getattr(redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+        return Pipeline()
+
+    def keys(self, pattern):
+        return fnmatch.filter(self.data, pattern)
+
+
+def test_redis_backend_tags_and_locks():
+    redis = FakeRedis()
+    cache = RedisCacheBackend(client=redis)
+    cache.set("clozr:summary:a", b"one", 60, tags=["product:1"])
+    cache.set("clozr:chat:a", b"two", 60, tags=["product:1"])
+    cache.set("clozr:summary:b", b"three", 60, tags=["product:2"])
+
+    assert cache.get("clozr:summary:a") == b"one"
+    redis.round_trips = 0
+    assert cache.invalidate_tags(["product:1", "product:3"]) == 2
+    assert redis.round_trips == 2  # one SMEMBERS pipeline, one DEL pipeline
+    assert cache.get("clozr:chat:a") is None
+    assert sorted(redis.keys("clozr:*")) == ["clozr:summary:b", "clozr:tag:product:2"]
+
+    token = cache.acquire_lock("k:lock", 30)
+    assert token and cache.acquire_lock("k:lock", 30) is None
+    cache.release_lock("k:lock", token)
+    # our lock expired and another worker took it: releasing must not drop theirs
+    theirs = cache.acquire_lock("k:lock", 30)
+    cache.release_lock("k:lock", token)
+    assert redis.get("k:lock") == theirs
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_partial_backend_fails_at_construction():
+    class GetOnly(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+def test_versioned_keys_and_stampede_protection():
+    assert versioned_key("summary", None, "3") == f"clozr:summary:{PROMPT_VERSION}:{MODEL}::3"
+
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return b"body"
+
+    async def run():
+        return await asyncio.gather(*(get_or_compute("clozr:test:k", compute, 60) for _ in range(20)))
+
+    set_cache(RedisCacheBackend(client=FakeRedis()))
+    try:
+        assert asyncio.run(run()) == [b"body"] * 20
+        assert calls == 1
+        # a second process (the lock held elsewhere) waits for the result rather than computing
+        cache = get_cache()
+        cache.acquire_lock("clozr:test:other:lock", 30)
+
+        async def publish_later():
+            await asyncio.sleep(0.1)
+            cache.set("clozr:test:other", b"theirs", 60)
+
+        async def waiter():
+            _, value = await asyncio.gather(publish_later(), get_or_compute("clozr:test:other", compute, 60))
+            return value
+
+        assert asyncio.run(waiter()) == b"theirs" and calls == 1
+    finally:
+        set_cache(None)
+
+
+def test_chat_answers_cached_per_normalized_question(stub_llm, db):
+    with TestClient(app) as client:
+        client.post(
+            "/products/ingest/bulk",
+            json={"merchant_domain": SHOP, "products": [{"shop_product_id": "4", "raw_json": {"id": 4, "title": "Parka"}}]},
+        )
+        ask = lambda q: client.post(  # noqa: E731
+            "/shopify/products/chat",
+            json={"product_id": "4", "shop_domain": SHOP, "initial_overview": "A warm parka.", "question": q},
+        ).json()["response"]
+
+        first = ask("Is it warm?")
+        assert ask("  is it WARM? ") == first
+        assert stub_llm.calls == 1
+
+        ask("Is it waterproof?")
+        assert stub_llm.calls == 2
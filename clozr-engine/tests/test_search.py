@@ -0,0 +1,123 @@
+# tests/test_search.py
+import pytest
+
+from app.services import product_services
+
+
+def _ingest(db, shop_product_id, title, tags="", body=""):
+    return product_services.ingest_product(
+        db=db,
+        merchant_domain="test-shop.myshopify.com",
+        shop_product_id=shop_product_id,
+        raw_json={"id": shop_product_id, "title": title, "tags": tags, "body_html": body},
+    )
+
+
+def test_search_filters_in_sql(db):
+    _ingest(db, "1", "Campus Fleece Hoodie", tags="winter, cozy")
+    _ingest(db, "2", "Graphic Tee", tags="summer")
+    _ingest(db, "3", "Puffer Jacket", body="Warm for cold winter days")
+
+    rows = product_services.search_products_with_attributes(db, q="HOODIE")
+    assert [p.shop_product_id for p, _ in rows] == ["1"]
+
+    # tags outrank body text
+    rows = product_services.search_products_with_attributes(db, q="winter")
+    assert [p.shop_product_id for p, _ in rows] == ["1", "3"]
+
+    rows = product_services.search_products_with_attributes(db, category="Jacket")
+    assert [p.shop_product_id for p, _ in rows] == ["3"]
+
+    rows = product_services.search_products_with_attributes(db, primary_use="Winter")
+    assert sorted(p.shop_product_id for p, _ in rows) == ["1", "3"]
+
+
+def test_search_finds_rows_beyond_first_thousand(db):
+    merchant = product_services.get_or_create_merchant(db, "test-shop.myshopify.com")
+    db.add_all(
+        product_services.models.ProductRaw(
+            merchant_id=merchant.id,
+            shop_product_id=str(i),
+            raw_json={"title": f"Basic item {i}"},
+            title=f"Basic item {i}",
+        )
+        for i in range(1100)
+    )
+    db.commit()
+    _ingest(db, "needle", "Needle Cord Pants")
+
+    rows = product_services.search_products_with_attributes(db, q="needle")
+    assert [p.shop_product_id for p, _ in rows] == ["needle"]
+
+    rows = product_services.search_products_with_attributes(db, q="basic", limit=10, offset=1090)
+    assert len(rows) == 10
+
+
+def test_search_ranks_title_hits_and_matches_prefixes(db):
+    _ingest(db, "1", "Everyday Tee", body="<p>Pairs well with a <b>hoodie</b></p>")
+    _ingest(db, "2", "Zip Hoodie", tags="fleece")
+    _ingest(db, "3", "Canvas Tote")
+
+    rows = product_services.search_products_with_attributes(db, q="hood")
+    assert [p.shop_product_id for p, _ in rows] == ["2", "1"]
+
+    rows = product_services.search_products_with_attributes(db, q="zip fleece")
+    assert [p.shop_product_id for p, _ in rows] == ["2"]
+
+    # Products ingested after the index was built are picked up
+    _ingest(db, "4", "Pullover Hoodie")
+    rows = product_services.search_products_with_attributes(db, q="pullover")
+    assert [p.shop_product_id for p, _ in rows] == ["4"]
+
+
+def test_search_treats_like_wildcards_literally(db):
+    _ingest(db, "1", "100% Cotton Tee")
+    _ingest(db, "2", "Cotton Tee")
+
+    rows = product_services.search_products_with_attributes(db, q="100%")
+    assert [p.shop_product_id for p, _ in rows] == ["1"]
+
+
+def test_reingest_updates_existing_product(db):
+    first = _ingest(db, "1", "Zip Hoodie")
+    second = _ingest(db, "1", "Zip Hoodie v2", tags="winter")
+
+    assert first.id == second.id
+    assert db.query(product_services.models.ProductRaw).count() == 1
+    product, attrs = product_services.get_product_by_shop_id(db, "1", shop_domain="test-shop.myshopify.com")
+    assert product.title == "Zip Hoodie v2"
+    assert attrs.primary_use == ["winter"]
+
+
+def test_shop_lookup_is_scoped_to_merchant(db):
+    _ingest(db, "1", "Zip Hoodie")
+    product_services.ingest_product(db, "other-shop.myshopify.com", "1", {"title": "Other Hoodie"})
+
+    product, _ = product_services.get_product_by_shop_id(db, "1", shop_domain="other-shop.myshopify.com")
+    assert product.title == "Other Hoodie"
+    assert product_services.get_product_by_shop_id(db, "1", shop_domain="missing.myshopify.com") is None
+    # Shopify ids repeat across shops, so an unscoped lookup matches nothing
+    assert product_services.get_product_by_shop_id(db, "1") is None
+
+
+def test_postgres_cursor_keeps_rows_tied_on_score(db):
+    # the ts_rank_cd/similarity branch only runs on Postgres (DATABASE_URL)
+    if db.get_bind().dialect.name != "postgresql":
+        pytest.skip("needs DATABASE_URL pointing at Postgres")
+    from app.migrations import _0001_product_search_columns, _0002_product_full_text_search
+
+    with db.get_bind().begin() as conn:
+        _0001_product_search_columns(conn)
+        _0002_product_full_text_search(conn)
+    # identical titles: every row has the same score, only the id orders them
+    product_services.bulk_upsert_products(
+        db, "test-shop.myshopify.com", [(str(i), {"id": i, "title": "Wool Sweater"}) for i in range(7)]
+    )
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = product_services.search_products_page(db, q="sweater", limit=2, cursor=cursor)
+        seen += [p.shop_product_id for p, _ in rows]
+        if not cursor:
+            break
+    assert sorted(seen, key=int) == [str(i) for i in range(7)]
@@ -0,0 +1,104 @@
+# tests/test_shopify_client.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app import models
+from app.shopify_client import ShopifyClient, ShopifyClientError
+from app.shopify_import import import_products_from_shopify
+
+CATALOG = [{"id": 1000 + i, "title": f"Hoodie {i}"} for i in range(7)]
+
+
+class FakeShopify(BaseHTTPRequestHandler):
+    """
+    products.json with page_info cursors, a call-limit header that climbs
+    towards the bucket size, and one 429 on the second page.
+    """
+
+    calls = []
+    throttled_once = False
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        type(self).calls.append(self.path)
+        if self.headers.get("X-Shopify-Access-Token") != "token":
+            self.send_response(401)
+            self.end_headers()
+            return
+
+        query = parse_qs(urlparse(self.path).query)
+        limit = int(query["limit"][0])
+        offset = int(query.get("page_info", ["0"])[0])
+
+        if offset and not type(self).throttled_once:
+            type(self).throttled_once = True
+            self.send_response(429)
+            self.send_header("Retry-After", "2.0")
+            self.end_headers()
+            return
+
+        page = CATALOG[offset : offset + limit]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-Shopify-Shop-Api-Call-Limit", f"{36 + len(type(self).calls)}/40")
+        if offset + limit < len(CATALOG):
+            host = f"http://{self.headers['Host']}"
+            next_url = f"{host}/admin/api/2024-10/products.json?limit={limit}&page_info={offset + limit}"
+            self.send_header("Link", f'<{next_url}>; rel="next"')
+        body = json.dumps({"products": page}).encode()
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def fake_shopify():
+    FakeShopify.calls = []
+    FakeShopify.throttled_once = False
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeShopify)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+
+
+def _client(base_url, sleeps, token="token"):
+    return ShopifyClient(
+        "test-shop.myshopify.com", token, base_url=base_url, page_size=3, sleep=sleeps.append
+    )
+
+
+def test_follows_next_links_and_backs_off(fake_shopify):
+    sleeps = []
+    pages = list(_client(fake_shopify, sleeps).iter_product_pages())
+
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert [p["id"] for page in pages for p in page] == [p["id"] for p in CATALOG]
+    # Retry-After from the 429, plus throttling after every call near the 40-call bucket
+    assert 2.0 in sleeps
+    throttle_sleeps = [s for s in sleeps if s != 2.0]
+    assert len(throttle_sleeps) == 3
+    assert throttle_sleeps == sorted(throttle_sleeps)
+
+
+def test_auth_errors_are_not_retried(fake_shopify):
+    sleeps = []
+    with pytest.raises(ShopifyClientError):
+        list(_client(fake_shopify, sleeps, token="wrong").iter_product_pages())
+    assert sleeps == []
+    assert len(FakeShopify.calls) == 1
+
+
+def test_import_streams_pages_into_engine(fake_shopify, db):
+    total = import_products_from_shopify(_client(fake_shopify, []))
+
+    assert total == 7
+    assert db.query(models.ProductRaw).count() == 7
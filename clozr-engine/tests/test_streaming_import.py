@@ -0,0 +1,98 @@
+# tests/test_streaming_import.py
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.main import app
+from app.streaming_import import ProductStreamParser, import_products_stream
+
+client = TestClient(app)
+
+PRODUCTS = [{"id": i, "title": f"Hoodie {i}", "body_html": "<p>Fleece é</p>"} for i in range(7)]
+
+
+def _split(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "\n".join(json.dumps(p) for p in PRODUCTS),
+        json.dumps(PRODUCTS),
+        json.dumps({"products": PRODUCTS, "shop": "x", "exported_at": "now"}, indent=2),
+    ],
+)
+def test_parser_handles_formats_split_at_any_byte(body):
+    parser = ProductStreamParser()
+    out = []
+    for chunk in _split(body.encode(), 5):
+        out += parser.feed(chunk)
+    out += parser.close()
+    assert out == PRODUCTS
+
+
+def test_malformed_array_element_is_skipped():
+    tricky = {"id": 8, "title": 'Say "hi" \\ [sale] {new}'}
+    body = json.dumps(PRODUCTS[:2])[:-1] + ', {"id": 7, "title": oops}, ' + json.dumps([tricky, PRODUCTS[2]])[1:]
+    parser = ProductStreamParser()
+    out = []
+    for chunk in _split(body.encode(), 3):
+        out += parser.feed(chunk)
+    out += parser.close()
+    assert out == PRODUCTS[:2] + [tricky, PRODUCTS[2]]
+    assert parser.bad_rows == 1
+
+
+def test_unclosed_array_element_fails_fast_with_offset():
+    head = json.dumps(PRODUCTS[:2])[:-1] + ", "
+    body = head + '{"id": 7, "title": "no closing brace", ' + ", ".join(json.dumps(p) for p in PRODUCTS) + "]"
+    parser = ProductStreamParser(max_product_size=100)
+    out = []
+    with pytest.raises(ValueError, match=f"byte offset {len(head)}:"):
+        for chunk in _split(body.encode(), 16):
+            out += parser.feed(chunk)
+    assert out == PRODUCTS[:2]
+    assert len(parser._buf) < 100 + 16
+
+
+def test_bad_ndjson_line_is_skipped(db):
+    lines = [json.dumps(p) for p in PRODUCTS[:3]] + ["{not json"] + [json.dumps(PRODUCTS[3]), json.dumps({"title": "no id"})]
+    stats = import_products_stream(db, "test-shop.myshopify.com", ["\n".join(lines)], chunk_size=2)
+
+    assert stats.imported == 4
+    assert stats.failed == 2
+    assert stats.chunks == 2
+    assert db.query(models.ProductRaw).count() == 4
+
+
+def test_resume_skips_up_to_checkpoint(db):
+    body = "\n".join(json.dumps(p) for p in PRODUCTS)
+    stats = import_products_stream(db, "test-shop.myshopify.com", [body], chunk_size=3, resume_after="4")
+
+    assert stats.skipped == 5
+    assert stats.imported == 2
+    assert sorted(r.shop_product_id for r in db.query(models.ProductRaw)) == ["5", "6"]
+
+
+def test_stream_endpoint_commits_in_chunks(db):
+    body = "\n".join(json.dumps(p) for p in PRODUCTS).encode()
+    resp = client.post(
+        "/products/ingest/stream",
+        params={"merchant_domain": "test-shop.myshopify.com", "chunk_size": 3},
+        content=iter(_split(body, 40)),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["imported"] == 7
+    assert resp.json()["chunks"] == 3
+    assert resp.json()["last_shop_product_id"] == "6"
+
+
+def test_stream_endpoint_reports_truncated_array(db):
+    body = json.dumps(PRODUCTS)[:-40].encode()
+    resp = client.post("/products/ingest/stream", params={"merchant_domain": "test-shop.myshopify.com"}, content=body)
+    assert resp.status_code == 400
+    assert resp.json()["detail"]["imported"] > 0